@@ -4,23 +4,48 @@ Flask application factory
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import config
 from app.models import db
 from app.utils.cache import cache
+from app.utils.compression import compressor
+from app.utils.json_provider import JSONProvider
+from app.utils.profiling import profiler
+from app.utils.rate_limit import limiter
+from app.utils.revocation import revocations
+from app.utils.timing import timer
+from app.tasks import backend as task_backend
 
 
 def create_app(config_name='default'):
     """Create and configure the Flask application"""
     app = Flask(__name__)
+    app.json = JSONProvider(app)
     
     # Load configuration
     app.config.from_object(config[config_name])
     
-    # Initialize extensions
+    # Trust X-Forwarded-* only from the configured number of proxies, so
+    # request.remote_addr (rate limit keys) is the real client address
+    if app.config['PROXY_FIX_X_FOR'] or app.config['PROXY_FIX_X_PROTO']:
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app,
+            x_for=app.config['PROXY_FIX_X_FOR'],
+            x_proto=app.config['PROXY_FIX_X_PROTO']
+        )
+    
+    # Initialize extensions (the timer and the profiler first, so their hooks wrap everyone else's)
+    timer.init_app(app)
+    profiler.init_app(app)
     db.init_app(app)
     cache.init_app(app)
+    limiter.init_app(app)
+    compressor.init_app(app)
     CORS(app, origins=app.config['CORS_ORIGINS'])
-    JWTManager(app)
+    jwt = JWTManager(app)
+    revocations.init_app(app)
+    jwt.token_in_blocklist_loader(revocations.is_token_revoked)
+    task_backend.init_app(app)
     
     # Register blueprints
     from app.routes.auth import auth_bp
@@ -28,16 +53,21 @@ def create_app(config_name='default'):
     from app.routes.doctor import doctor_bp
     from app.routes.patient import patient_bp
     from app.routes.tasks import tasks_bp
+    from app.routes.calendar import calendar_bp
+    from app.routes.batch import batch_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(doctor_bp)
     app.register_blueprint(patient_bp)
     app.register_blueprint(tasks_bp)
+    app.register_blueprint(calendar_bp)
+    app.register_blueprint(batch_bp)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # CLI commands, including `flask init-db` to create the schema (importing
+    # them also registers the rollup session hooks)
+    from app.commands import register_commands
+    register_commands(app)
     
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
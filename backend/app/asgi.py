@@ -0,0 +1,480 @@
+"""
+ASGI serving mode - async read paths in front of the Flask app
+
+The hottest read routes are served here natively: SQL runs on an async
+SQLAlchemy engine and cache/result lookups on redis.asyncio, so a worker
+keeps serving other clients while a request waits on the database. Their
+bodies are built from the same fieldsets as ?fields= (see app.utils.fields),
+so they decode to exactly what the Flask views return.
+
+Everything else is handed to the Flask app through asgiref's WsgiToAsgi,
+on a pool of ASYNC_WSGI_THREADS threads per process. That covers other
+routes and writes, and also every case an async handler declines:
+missing, invalid, revoked or legacy tokens, the wrong role, bad
+parameters, rate-limited endpoints and finished tasks. Errors and edge
+cases therefore behave exactly as in the sync deployment. Token checks
+run on the same pool, since the revocation check may wait on Redis.
+ASYNC_ROUTES_ENABLED=false serves everything through Flask.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from celery.states import READY_STATES
+from flask_jwt_extended import decode_token, get_unverified_jwt_headers
+from flask_jwt_extended.config import config as jwt_config
+from flask_jwt_extended.internal_utils import (
+    custom_verification_for_token, verify_token_not_blocklisted, verify_token_type
+)
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header
+from app.models import User, Doctor, Appointment, Department
+from app.tasks.backend import get_celery
+from app.utils.auth import Principal
+from app.utils.compression import compressor
+from app.utils.exports import export_owned_by, export_status
+from app.utils.fields import APPOINTMENT_FIELDS, DOCTOR_FIELDS, PATIENT_FIELDS, format_value, requested_fields
+from app.utils.profiles import profile_cache_key
+from app.utils.progress import task_owner_key
+from app.utils.rate_limit import limiter
+from app.utils.timing import RequestTimings, timer
+
+logger = logging.getLogger(__name__)
+
+# Async driver used for each sync database backend unless ASYNC_DATABASE_URL is set
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql'
+}
+
+PROFILE_FIELDSETS = {
+    'doctor': DOCTOR_FIELDS,
+    'patient': PATIENT_FIELDS
+}
+
+DEPARTMENT_COLUMNS = ('id', 'name', 'icon', 'description')
+
+# Distinct Origin headers whose CORS headers are memoized
+CORS_CACHE_SIZE = 256
+
+# A task's state and result as read from the result backend; mirrors the
+# AsyncResult attributes the task status helpers use
+TaskMeta = namedtuple('TaskMeta', ['id', 'state', 'info', 'result'])
+
+
+def async_database_url(app):
+    """The async twin of SQLALCHEMY_DATABASE_URI, or None if there is none"""
+    if app.config.get('ASYNC_DATABASE_URL'):
+        return app.config['ASYNC_DATABASE_URL']
+    
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    return url.set(drivername=driver) if driver else None
+
+
+# The plain function behind asgiref's thread-sensitive run_wsgi_app
+_run_wsgi_app = WsgiToAsgiInstance.run_wsgi_app.__wrapped__
+
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    """
+    asgiref runs WSGI apps thread-sensitively, i.e. every request of the
+    process on one shared thread. Flask needs no such pinning, so requests
+    run on the given pool instead and slow ones no longer queue up the rest.
+    """
+    
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+    
+    async def run_wsgi_app(self, body):
+        await sync_to_async(_run_wsgi_app, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class AsyncRequest:
+    """The parts of an ASGI HTTP scope the async handlers read"""
+    
+    def __init__(self, scope, endpoint):
+        self.endpoint = endpoint
+        self.timings = RequestTimings()
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+class AsyncApp:
+    """ASGI app answering the async routes itself and the rest via Flask"""
+    
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.enabled = flask_app.config.get('ASYNC_ROUTES_ENABLED', True)
+        self._pid = None
+        self._executor = None
+        self._engine = None
+        self._cache = None
+        self._cache_retry_at = 0
+        self._results = None
+        self._cors = {}
+        
+        # (path pattern, Flask endpoint, handler); the endpoint is checked
+        # against the rate limits so limited routes stay on the Flask path
+        self.routes = [
+            (re.compile(r'/api/patient/doctors'), 'patient.get_doctors', self.patient_doctors),
+            (re.compile(r'/api/patient/departments'), 'patient.get_departments', self.patient_departments),
+            (re.compile(r'/api/patient/appointments'), 'patient.get_patient_appointments', self.patient_appointments),
+            (re.compile(r'/api/doctor/appointments'), 'doctor.get_doctor_appointments', self.doctor_appointments),
+            (re.compile(r'/api/auth/me'), 'auth.get_current_user', self.current_user),
+            (re.compile(r'/api/tasks/export-history/(?P<task_id>[^/]+)'), 'tasks.get_export_status', self.export_status)
+        ]
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        
+        self._connect()
+        if scope['type'] == 'http' and self.enabled and scope['method'] == 'GET':
+            for pattern, endpoint, handler in self.routes:
+                match = pattern.fullmatch(scope['path'])
+                if match is None:
+                    continue
+                if limiter.enabled and limiter.limit_for(endpoint):
+                    break
+                
+                request = AsyncRequest(scope, endpoint)
+                try:
+                    result = await handler(request, **match.groupdict())
+                except Exception as e:
+                    # Nothing was sent yet, so Flask can still answer (or fail) properly
+                    logger.warning(f'Async handler for {scope["path"]} failed, serving it sync: {e}')
+                    result = None
+                
+                if result is not None:
+                    return await self._respond(send, request, *result)
+                break
+        
+        await _WsgiInstance(self.flask_app, self._executor)(scope, receive, send)
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    # ----- Connections -----
+    
+    def _connect(self):
+        """Create this process's pool, engine and Redis clients on first use (and after a fork)"""
+        if self._pid == os.getpid():
+            return
+        
+        config = self.flask_app.config
+        self._pid = os.getpid()
+        self._engine = self._cache = self._results = None
+        self._executor = ThreadPoolExecutor(max_workers=config.get('ASYNC_WSGI_THREADS', 8), thread_name_prefix='wsgi')
+        
+        url = async_database_url(self.flask_app)
+        if url is not None:
+            try:
+                self._engine = create_async_engine(url)
+            except ImportError as e:
+                logger.warning(f'No async database driver ({e}); async routes are served sync')
+        
+        # Like the sync cache: connect on first use, back off while Redis is down
+        self._cache = aioredis.from_url(config['REDIS_URL'], decode_responses=True,
+                                        socket_connect_timeout=config.get('REDIS_CONNECT_TIMEOUT', 1))
+        self._cache_retry_at = 0
+        
+        result_backend = config.get('CELERY_RESULT_BACKEND') or ''
+        if config.get('TASK_BACKEND') == 'celery' and result_backend.startswith(('redis://', 'rediss://')):
+            self._results = aioredis.from_url(result_backend)
+    
+    async def close(self):
+        """Release this process's connections"""
+        if self._pid != os.getpid():
+            return
+        if self._engine is not None:
+            await self._engine.dispose()
+        for client in (self._cache, self._results):
+            if client is not None:
+                await client.aclose()
+        self._executor.shutdown(wait=False)
+        self._pid = None
+    
+    async def _rows(self, request, statement):
+        async with self._engine.connect() as connection:
+            started = time.perf_counter()
+            result = await connection.execute(statement)
+            rows = [[format_value(value) for value in row] for row in result]
+        request.timings.add_query(statement, time.perf_counter() - started)
+        return rows
+    
+    def _cache_available(self):
+        return self._cache is not None and time.monotonic() >= self._cache_retry_at
+    
+    def _cache_failed(self, e):
+        if isinstance(e, (aioredis.ConnectionError, aioredis.TimeoutError)):
+            self._cache_retry_at = time.monotonic() + self.flask_app.config.get('REDIS_RETRY_SECONDS', 30)
+    
+    async def _cache_get(self, request, key):
+        if not self._cache_available():
+            return None
+        try:
+            with request.timings.measure('cache'):
+                value = await self._cache.get(key)
+            return json.loads(value) if value else None
+        except Exception as e:
+            logger.error(f'Async cache get error: {e}')
+            self._cache_failed(e)
+            return None
+    
+    async def _cache_set(self, request, key, value, timeout):
+        if not self._cache_available():
+            return
+        try:
+            with request.timings.measure('cache'):
+                await self._cache.setex(key, timeout, json.dumps(value))
+        except Exception as e:
+            logger.error(f'Async cache set error: {e}')
+            self._cache_failed(e)
+    
+    # ----- Request helpers -----
+    
+    async def _principal(self, request, *roles):
+        """
+        The caller's Principal if the token passes every check the Flask
+        path makes and carries one of roles (any role if none given).
+        Otherwise None, which hands the request to Flask for its error.
+        """
+        authorization = request.headers.get('authorization', '')
+        if not authorization.startswith('Bearer '):
+            return None
+        
+        # The blocklist check is sync and may query Redis, so it runs on
+        # the thread pool rather than blocking the event loop
+        token = authorization[len('Bearer '):]
+        with request.timings.measure('auth'):
+            verified = await asyncio.get_running_loop().run_in_executor(self._executor, self._verify_token, token)
+        if verified is None:
+            return None
+        
+        identity, claims = verified
+        
+        role = claims.get('role')
+        if roles and role not in roles:
+            return None
+        # Tokens from before the profile_id claim need a lookup; Flask does it
+        if role in PROFILE_FIELDSETS and not claims.get('profile_id'):
+            return None
+        
+        return Principal(identity, role, claims.get('profile_id'))
+    
+    def _verify_token(self, token):
+        """(identity, claims) of an access token passing Flask-JWT-Extended's checks, otherwise None"""
+        with self.flask_app.app_context():
+            try:
+                claims = decode_token(token)
+                header = get_unverified_jwt_headers(token)
+                verify_token_type(claims, refresh=False)
+                verify_token_not_blocklisted(header, claims)
+                custom_verification_for_token(header, claims)
+            except Exception:
+                return None
+            return claims[jwt_config.identity_claim_key], claims
+    
+    @staticmethod
+    def _fields(request, fieldset):
+        """(names, columnar) for the request, or None to let Flask report a bad value"""
+        try:
+            names, columnar = requested_fields(fieldset, request.args)
+        except ValueError:
+            return None
+        return names or fieldset.names, columnar
+    
+    async def _list(self, request, statement, names, columnar):
+        rows = await self._rows(request, statement)
+        if columnar:
+            return 200, {'fields': names, 'rows': rows}
+        return 200, [dict(zip(names, row)) for row in rows]
+    
+    # ----- Handlers: return (status, payload), or None to defer to Flask -----
+    
+    async def patient_doctors(self, request):
+        fields = self._fields(request, DOCTOR_FIELDS)
+        if self._engine is None or fields is None or await self._principal(request, 'patient') is None:
+            return None
+        
+        statement = DOCTOR_FIELDS.select(fields[0])
+        specialization = request.args.get('specialization')
+        if specialization:
+            statement = statement.where(Doctor.specialization == specialization)
+        
+        return await self._list(request, statement, *fields)
+    
+    async def patient_departments(self, request):
+        if self._engine is None or await self._principal(request, 'patient') is None:
+            return None
+        
+        rows = await self._rows(request, select(*(getattr(Department, column) for column in DEPARTMENT_COLUMNS)))
+        if not rows:
+            return None  # the Flask view serves its default list
+        
+        return 200, [dict(zip(DEPARTMENT_COLUMNS, row)) for row in rows]
+    
+    async def patient_appointments(self, request):
+        fields = self._fields(request, APPOINTMENT_FIELDS)
+        principal = await self._principal(request, 'patient')
+        if self._engine is None or fields is None or principal is None:
+            return None
+        
+        statement = APPOINTMENT_FIELDS.select(fields[0]).where(Appointment.patient_id == principal.profile_id)
+        status = request.args.get('status')
+        if status:
+            statement = statement.where(Appointment.status == status)
+        
+        return await self._list(request, statement.order_by(Appointment.appointment_date.desc()), *fields)
+    
+    async def doctor_appointments(self, request):
+        fields = self._fields(request, APPOINTMENT_FIELDS)
+        principal = await self._principal(request, 'doctor')
+        if self._engine is None or fields is None or principal is None:
+            return None
+        
+        statement = APPOINTMENT_FIELDS.select(fields[0]).where(Appointment.doctor_id == principal.profile_id)
+        status = request.args.get('status')
+        if status:
+            statement = statement.where(Appointment.status == status)
+        
+        date = request.args.get('date')
+        if date:
+            try:
+                statement = statement.where(Appointment.appointment_date == datetime.fromisoformat(date).date())
+            except ValueError:
+                return None
+        
+        statement = statement.order_by(Appointment.appointment_date, Appointment.appointment_time)
+        return await self._list(request, statement, *fields)
+    
+    async def current_user(self, request):
+        """/api/auth/me, sharing the profile cache of app.utils.profiles"""
+        principal = await self._principal(request)
+        if self._engine is None or principal is None:
+            return None
+        
+        key = profile_cache_key(principal.user_id)
+        profile = await self._cache_get(request, key)
+        if profile is not None:
+            return 200, profile
+        
+        users = await self._rows(request, select(User.id, User.email, User.role).where(User.id == principal.user_id))
+        if not users:
+            return None
+        
+        user_id, email, role = users[0]
+        details = None
+        fieldset = PROFILE_FIELDSETS.get(role)
+        if fieldset is not None:
+            rows = await self._rows(request, fieldset.select(fieldset.names).where(fieldset.model.user_id == user_id))
+            details = dict(zip(fieldset.names, rows[0])) if rows else None
+        
+        profile = {'id': user_id, 'email': email, 'role': role, 'profile': details}
+        await self._cache_set(request, key, profile, self.flask_app.config.get('PROFILE_CACHE_TIMEOUT', 3600))
+        return 200, profile
+    
+    async def export_status(self, request, task_id):
+        """Export status while a task is pending or running; finished ones go to Flask"""
+        principal = await self._principal(request, 'patient')
+        if self._results is None or principal is None:
+            return None
+        
+        backend = get_celery(self.flask_app).backend
+        raw = await self._results.get(backend.get_key_for_task(task_id))
+        meta = backend.decode_result(raw) if raw else {'status': 'PENDING', 'result': None}
+        if meta['status'] in READY_STATES:
+            return None  # download links and errors are built by the Flask view
+        
+        task = TaskMeta(task_id, meta['status'], meta['result'], meta['result'])
+        owner = await self._cache_get(request, task_owner_key(task_id))
+        if not export_owned_by(task, owner, principal.user_id, principal.profile_id):
+            return None
+        
+        return 200, export_status(task)
+    
+    # ----- Responses -----
+    
+    def _cors_headers(self, origin):
+        """
+        The CORS headers flask-cors adds for an Origin, as (headers, vary_origin)
+        
+        Worked out by passing an empty response through the app's own
+        after_request hooks, once per distinct Origin.
+        """
+        if origin in self._cors:
+            return self._cors[origin]
+        
+        with self.flask_app.test_request_context('/api/health', headers={'Origin': origin} if origin else {}):
+            response = self.flask_app.process_response(self.flask_app.response_class())
+        
+        headers = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in response.headers.items()
+            if name.lower().startswith('access-control-')
+        ]
+        entry = (headers, 'Origin' in response.vary)
+        
+        if len(self._cors) >= CORS_CACHE_SIZE:
+            self._cors.clear()
+        self._cors[origin] = entry
+        return entry
+    
+    async def _respond(self, send, request, status, payload):
+        # Encoded by the app's provider as jsonify() would, so bodies match the Flask views
+        with request.timings.measure('json'):
+            body = self.flask_app.json.response(payload).get_data()
+        headers = [(b'content-type', b'application/json')]
+        vary = []
+        
+        if compressor.enabled and 'application/json' in compressor.mimetypes:
+            vary.append('Accept-Encoding')
+            with request.timings.measure('compress'):
+                body, encoding = compressor.encode(body, parse_accept_header(request.headers.get('accept-encoding')))
+            if encoding:
+                headers.append((b'content-encoding', encoding.encode('latin-1')))
+        
+        cors_headers, vary_origin = self._cors_headers(request.headers.get('origin'))
+        headers.extend(cors_headers)
+        if vary_origin:
+            vary.insert(0, 'Origin')
+        if vary:
+            headers.append((b'vary', ', '.join(vary).encode('latin-1')))
+        
+        if timer.enabled:
+            server_timing = timer.report(request.timings, method='GET', path=request.path,
+                                         endpoint=request.endpoint, status=status)
+            if server_timing:
+                headers.append((b'server-timing', server_timing.encode('latin-1')))
+        
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app(flask_app):
+    """Wrap a Flask app created by create_app() for ASGI servers"""
+    return AsyncApp(flask_app)
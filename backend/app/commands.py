@@ -0,0 +1,41 @@
+"""
+Flask CLI commands
+"""
+import click
+from flask.cli import with_appcontext
+from app.models import db
+from app.utils.rollups import rebuild_rollups
+from app.utils.schema import upgrade_schema
+
+
+def register_commands(app):
+    """Register CLI commands with the app"""
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(rebuild_rollups_command)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create any missing database tables (existing tables are left as they are)"""
+    db.create_all()
+    click.echo('Database tables created')
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Bring an existing database up to date (missing tables, columns and indexes)"""
+    changes = upgrade_schema()
+    for change in changes:
+        click.echo(change)
+    click.echo('Database is up to date' if not changes else f'{len(changes)} schema changes applied')
+
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    """Recompute doctor monthly activity rollups from raw data"""
+    count = rebuild_rollups()
+    click.echo(f'Rebuilt {count} doctor monthly rollups')
@@ -2,7 +2,9 @@
 Database models initialization
 """
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
 from datetime import datetime
+from app.utils.schedule import appointment_start
 
 db = SQLAlchemy()
 
@@ -16,6 +18,7 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # admin, doctor, patient
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    feed_token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped to revoke calendar feed URLs
     
     # Relationships
     doctor = db.relationship('Doctor', backref='user', uselist=False, cascade='all, delete-orphan')
@@ -37,10 +40,12 @@ class Doctor(db.Model):
     qualification = db.Column(db.String(50), nullable=False)
     experience = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     appointments = db.relationship('Appointment', backref='doctor', lazy=True)
     treatments = db.relationship('Treatment', backref='doctor', lazy=True)
+    monthly_stats = db.relationship('DoctorMonthlyStats', backref='doctor', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
         """Convert doctor to dictionary"""
@@ -72,6 +77,7 @@ class Patient(db.Model):
     phone = db.Column(db.String(20), nullable=False)
     registration_date = db.Column(db.Date, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     appointments = db.relationship('Appointment', backref='patient', lazy=True)
@@ -100,12 +106,15 @@ class Appointment(db.Model):
     __tablename__ = 'appointments'
     
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False, index=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False, index=True)
     appointment_date = db.Column(db.Date, nullable=False, index=True)
     appointment_time = db.Column(db.String(20), nullable=False)
     reason = db.Column(db.Text)
     status = db.Column(db.String(20), default='scheduled')  # scheduled, completed, cancelled
+    scheduled_at = db.Column(db.DateTime, index=True)  # appointment_date + appointment_time, kept in sync on save
+    reminder_queued_at = db.Column(db.DateTime)  # claimed by a reminder scan, so later scans skip it
+    reminder_sent_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -130,13 +139,111 @@ class Appointment(db.Model):
         return f'<Appointment {self.id} - {self.status}>'
 
 
+@event.listens_for(Appointment, 'before_insert')
+@event.listens_for(Appointment, 'before_update')
+def sync_appointment_schedule(mapper, connection, target):
+    """Keep scheduled_at in step with the date/time and re-arm reminders on reschedule"""
+    state = inspect(target)
+    rescheduled = (
+        state.attrs.appointment_date.history.has_changes() or
+        state.attrs.appointment_time.history.has_changes()
+    )
+    
+    if rescheduled or target.scheduled_at is None:
+        target.scheduled_at = appointment_start(target.appointment_date, target.appointment_time)
+        if state.persistent:
+            target.reminder_queued_at = None
+            target.reminder_sent_at = None
+
+
+class WaitlistEntry(db.Model):
+    """Waitlist entry for a doctor or a whole department"""
+    __tablename__ = 'waitlist_entries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False, index=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'))  # None means any doctor in the department
+    department = db.Column(db.String(50))
+    urgent = db.Column(db.Boolean, nullable=False, default=False)
+    reason = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='waiting')  # waiting, offered, booked, cancelled
+    requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Slot currently held for this entry while an offer is pending
+    offered_doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'))
+    offered_date = db.Column(db.Date)
+    offered_time = db.Column(db.String(20))
+    offer_expires_at = db.Column(db.DateTime)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'))
+    
+    patient = db.relationship('Patient', backref=db.backref('waitlist_entries', lazy=True))
+    doctor = db.relationship('Doctor', foreign_keys=[doctor_id])
+    offered_doctor = db.relationship('Doctor', foreign_keys=[offered_doctor_id])
+    
+    # Matching walks these indexes in priority order (urgent first, then oldest
+    # request) and stops at the first eligible row, so a freed slot never scans
+    # the whole waitlist. Doctor-specific entries carry a department too, so the
+    # department queue includes doctor_id to seek straight to department-only
+    # entries. A slot can be held by one offer at a time, and a patient can
+    # only be waiting once per doctor, and once per department (doctor_id
+    # is None there, which a plain unique index would treat as distinct).
+    __table_args__ = (
+        db.Index('ix_waitlist_doctor_queue', 'doctor_id', 'status', 'urgent', 'requested_at'),
+        db.Index('ix_waitlist_department_queue', 'department', 'doctor_id', 'status', 'urgent', 'requested_at'),
+        db.Index(
+            'ux_waitlist_patient_doctor', 'patient_id', 'doctor_id',
+            unique=True,
+            sqlite_where=db.and_(doctor_id.isnot(None), status.in_(['waiting', 'offered'])),
+            postgresql_where=db.and_(doctor_id.isnot(None), status.in_(['waiting', 'offered']))
+        ),
+        db.Index(
+            'ux_waitlist_patient_department', 'patient_id', 'department',
+            unique=True,
+            sqlite_where=db.and_(doctor_id.is_(None), status.in_(['waiting', 'offered'])),
+            postgresql_where=db.and_(doctor_id.is_(None), status.in_(['waiting', 'offered']))
+        ),
+        db.Index(
+            'ux_waitlist_offered_slot', 'offered_doctor_id', 'offered_date', 'offered_time',
+            unique=True,
+            sqlite_where=status == 'offered',
+            postgresql_where=status == 'offered'
+        ),
+    )
+    
+    def to_dict(self):
+        """Convert waitlist entry to dictionary"""
+        return {
+            'id': self.id,
+            'patient_id': self.patient_id,
+            'patient_name': self.patient.name if self.patient else None,
+            'doctor_id': self.doctor_id,
+            'doctor_name': self.doctor.name if self.doctor else None,
+            'department': self.department,
+            'urgent': self.urgent,
+            'reason': self.reason,
+            'status': self.status,
+            'requested_at': self.requested_at.isoformat() if self.requested_at else None,
+            'offer': {
+                'doctor_id': self.offered_doctor_id,
+                'doctor_name': self.offered_doctor.name if self.offered_doctor else None,
+                'appointment_date': self.offered_date.isoformat() if self.offered_date else None,
+                'appointment_time': self.offered_time,
+                'expires_at': self.offer_expires_at.isoformat() if self.offer_expires_at else None
+            } if self.status == 'offered' else None,
+            'appointment_id': self.appointment_id
+        }
+    
+    def __repr__(self):
+        return f'<WaitlistEntry {self.id} - {self.status}>'
+
+
 class Treatment(db.Model):
     """Treatment/Medical History model"""
     __tablename__ = 'treatments'
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False, index=True)
     visit_date = db.Column(db.Date, nullable=False, index=True)
     symptoms = db.Column(db.Text, nullable=False)
     diagnosis = db.Column(db.Text, nullable=False)
@@ -144,6 +251,7 @@ class Treatment(db.Model):
     follow_up_date = db.Column(db.Date)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
         """Convert treatment to dictionary"""
@@ -167,6 +275,43 @@ class Treatment(db.Model):
         return f'<Treatment {self.id}>'
 
 
+class DoctorMonthlyStats(db.Model):
+    """Per-doctor monthly activity rollup, kept current as appointments and treatments change"""
+    __tablename__ = 'doctor_monthly_stats'
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'month', name='uq_doctor_monthly_stats'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
+    month = db.Column(db.Date, nullable=False, index=True)  # first day of the month
+    total_appointments = db.Column(db.Integer, nullable=False, default=0)
+    scheduled_appointments = db.Column(db.Integer, nullable=False, default=0)
+    completed_appointments = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_appointments = db.Column(db.Integer, nullable=False, default=0)
+    treatment_records = db.Column(db.Integer, nullable=False, default=0)
+    unique_patients = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert rollup to dictionary"""
+        return {
+            'doctor_id': self.doctor_id,
+            'doctor_name': self.doctor.name if self.doctor else None,
+            'month': self.month.strftime('%Y-%m') if self.month else None,
+            'total_appointments': self.total_appointments,
+            'scheduled_appointments': self.scheduled_appointments,
+            'completed_appointments': self.completed_appointments,
+            'cancelled_appointments': self.cancelled_appointments,
+            'treatment_records': self.treatment_records,
+            'unique_patients': self.unique_patients,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<DoctorMonthlyStats {self.doctor_id} {self.month}>'
+
+
 class Department(db.Model):
     """Department/Specialization model"""
     __tablename__ = 'departments'
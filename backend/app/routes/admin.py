@@ -1,11 +1,21 @@
 """
 Admin routes - CRUD operations for doctors, patients, and appointments
 """
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Doctor, Patient, Appointment
-from app.utils.auth import admin_required, hash_password
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify, url_for
+from app.models import db, User, Doctor, DoctorMonthlyStats, Patient, Appointment, WaitlistEntry
+from app.tasks.backend import get_result, submit
+from app.utils.auth import admin_required
+from app.utils.bulk_export import EXPORT_ENTITIES, EXPORT_FORMATS, PARTITION_MODES
 from app.utils.cache import cache
+from app.utils.fields import APPOINTMENT_FIELDS, DOCTOR_FIELDS, PATIENT_FIELDS, sparse_detail, sparse_list
+from app.utils.passwords import hash_password
+from app.utils.profiles import invalidate_user_profile
+from app.utils.profiling import PROFILE_FORMATS, profiler
+from app.utils.results import load_result
+from app.utils.revocation import revocations
+from app.utils.storage import sign_download
+from app.utils.waitlist import notify_slot_freed
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -13,16 +23,18 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 # ===== Doctor Management =====
 
 @admin_bp.route('/doctors', methods=['GET'])
-@jwt_required()
 @admin_required
 def get_doctors():
     """Get all doctors"""
+    sparse = sparse_list(Doctor.query, DOCTOR_FIELDS)
+    if sparse is not None:
+        return sparse
+    
     doctors = Doctor.query.all()
     return jsonify([doctor.to_dict() for doctor in doctors]), 200
 
 
 @admin_bp.route('/doctors', methods=['POST'])
-@jwt_required()
 @admin_required
 def create_doctor():
     """Create a new doctor"""
@@ -74,10 +86,13 @@ def create_doctor():
 
 
 @admin_bp.route('/doctors/<int:doctor_id>', methods=['GET'])
-@jwt_required()
 @admin_required
 def get_doctor(doctor_id):
     """Get a specific doctor"""
+    sparse = sparse_detail(Doctor.query.filter(Doctor.id == doctor_id), DOCTOR_FIELDS, 'Doctor not found')
+    if sparse is not None:
+        return sparse
+    
     doctor = Doctor.query.get(doctor_id)
     if not doctor:
         return jsonify({'error': 'Doctor not found'}), 404
@@ -86,7 +101,6 @@ def get_doctor(doctor_id):
 
 
 @admin_bp.route('/doctors/<int:doctor_id>', methods=['PUT'])
-@jwt_required()
 @admin_required
 def update_doctor(doctor_id):
     """Update a doctor"""
@@ -119,6 +133,7 @@ def update_doctor(doctor_id):
         
         # Clear doctors cache
         cache.delete('view:get_all_doctors')
+        invalidate_user_profile(doctor.user_id)
         
         return jsonify({
             'message': 'Doctor updated successfully',
@@ -131,7 +146,6 @@ def update_doctor(doctor_id):
 
 
 @admin_bp.route('/doctors/<int:doctor_id>', methods=['DELETE'])
-@jwt_required()
 @admin_required
 def delete_doctor(doctor_id):
     """Delete a doctor"""
@@ -141,10 +155,15 @@ def delete_doctor(doctor_id):
     
     try:
         user = doctor.user
+        user_id = user.id
         db.session.delete(doctor)
         db.session.delete(user)
         db.session.commit()
         
+        # Outstanding access/refresh tokens must stop working now
+        revocations.revoke_user(user_id)
+        invalidate_user_profile(user_id)
+        
         # Clear doctors cache
         cache.delete('view:get_all_doctors')
         
@@ -158,19 +177,25 @@ def delete_doctor(doctor_id):
 # ===== Patient Management =====
 
 @admin_bp.route('/patients', methods=['GET'])
-@jwt_required()
 @admin_required
 def get_patients():
     """Get all patients"""
+    sparse = sparse_list(Patient.query, PATIENT_FIELDS)
+    if sparse is not None:
+        return sparse
+    
     patients = Patient.query.all()
     return jsonify([patient.to_dict() for patient in patients]), 200
 
 
 @admin_bp.route('/patients/<int:patient_id>', methods=['GET'])
-@jwt_required()
 @admin_required
 def get_patient(patient_id):
     """Get a specific patient"""
+    sparse = sparse_detail(Patient.query.filter(Patient.id == patient_id), PATIENT_FIELDS, 'Patient not found')
+    if sparse is not None:
+        return sparse
+    
     patient = Patient.query.get(patient_id)
     if not patient:
         return jsonify({'error': 'Patient not found'}), 404
@@ -179,7 +204,6 @@ def get_patient(patient_id):
 
 
 @admin_bp.route('/patients/<int:patient_id>', methods=['PUT'])
-@jwt_required()
 @admin_required
 def update_patient(patient_id):
     """Update a patient"""
@@ -210,6 +234,7 @@ def update_patient(patient_id):
             patient.user.email = data['email']
         
         db.session.commit()
+        invalidate_user_profile(patient.user_id)
         
         return jsonify({
             'message': 'Patient updated successfully',
@@ -222,7 +247,6 @@ def update_patient(patient_id):
 
 
 @admin_bp.route('/patients/<int:patient_id>', methods=['DELETE'])
-@jwt_required()
 @admin_required
 def delete_patient(patient_id):
     """Delete a patient"""
@@ -232,10 +256,15 @@ def delete_patient(patient_id):
     
     try:
         user = patient.user
+        user_id = user.id
         db.session.delete(patient)
         db.session.delete(user)
         db.session.commit()
         
+        # Outstanding access/refresh tokens must stop working now
+        revocations.revoke_user(user_id)
+        invalidate_user_profile(user_id)
+        
         return jsonify({'message': 'Patient deleted successfully'}), 200
     
     except Exception as e:
@@ -246,19 +275,29 @@ def delete_patient(patient_id):
 # ===== Appointment Management =====
 
 @admin_bp.route('/appointments', methods=['GET'])
-@jwt_required()
 @admin_required
 def get_appointments():
     """Get all appointments"""
-    appointments = Appointment.query.order_by(Appointment.appointment_date.desc()).all()
+    query = Appointment.query.order_by(Appointment.appointment_date.desc())
+    
+    sparse = sparse_list(query, APPOINTMENT_FIELDS)
+    if sparse is not None:
+        return sparse
+    
+    appointments = query.all()
     return jsonify([appointment.to_dict() for appointment in appointments]), 200
 
 
 @admin_bp.route('/appointments/<int:appointment_id>', methods=['GET'])
-@jwt_required()
 @admin_required
 def get_appointment(appointment_id):
     """Get a specific appointment"""
+    sparse = sparse_detail(
+        Appointment.query.filter(Appointment.id == appointment_id), APPOINTMENT_FIELDS, 'Appointment not found'
+    )
+    if sparse is not None:
+        return sparse
+    
     appointment = Appointment.query.get(appointment_id)
     if not appointment:
         return jsonify({'error': 'Appointment not found'}), 404
@@ -267,7 +306,6 @@ def get_appointment(appointment_id):
 
 
 @admin_bp.route('/appointments/<int:appointment_id>', methods=['PUT'])
-@jwt_required()
 @admin_required
 def update_appointment(appointment_id):
     """Update an appointment"""
@@ -278,11 +316,16 @@ def update_appointment(appointment_id):
     data = request.get_json()
     
     try:
+        was_scheduled = appointment.status == 'scheduled'
+        
         if 'status' in data:
             appointment.status = data['status']
         
         db.session.commit()
         
+        if was_scheduled and appointment.status == 'cancelled':
+            notify_slot_freed(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time, [appointment.patient_id])
+        
         return jsonify({
             'message': 'Appointment updated successfully',
             'appointment': appointment.to_dict()
@@ -294,7 +337,6 @@ def update_appointment(appointment_id):
 
 
 @admin_bp.route('/appointments/<int:appointment_id>', methods=['DELETE'])
-@jwt_required()
 @admin_required
 def delete_appointment(appointment_id):
     """Delete an appointment"""
@@ -311,3 +353,219 @@ def delete_appointment(appointment_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Failed to delete appointment: {str(e)}'}), 500
+
+
+# ===== Waitlist Management =====
+
+@admin_bp.route('/waitlist', methods=['GET'])
+@admin_required
+def get_waitlist():
+    """Get waitlist entries, optionally filtered by status, doctor or department"""
+    status = request.args.get('status')
+    doctor_id = request.args.get('doctor_id', type=int)
+    department = request.args.get('department')
+    
+    query = WaitlistEntry.query
+    
+    if status:
+        query = query.filter_by(status=status)
+    if doctor_id:
+        query = query.filter_by(doctor_id=doctor_id)
+    if department:
+        query = query.filter_by(department=department)
+    
+    entries = query.order_by(WaitlistEntry.urgent.desc(), WaitlistEntry.requested_at).all()
+    return jsonify([entry.to_dict() for entry in entries]), 200
+
+
+# ===== Doctor Performance =====
+
+@admin_bp.route('/doctor-stats', methods=['GET'])
+@admin_required
+def get_doctor_stats():
+    """Get monthly doctor activity rollups, optionally for one month (YYYY-MM) or doctor"""
+    month = request.args.get('month')
+    doctor_id = request.args.get('doctor_id', type=int)
+    
+    query = DoctorMonthlyStats.query
+    
+    if month:
+        try:
+            query = query.filter_by(month=datetime.strptime(month, '%Y-%m').date())
+        except ValueError:
+            return jsonify({'error': 'month must be in YYYY-MM format'}), 400
+    if doctor_id:
+        query = query.filter_by(doctor_id=doctor_id)
+    
+    stats = query.order_by(DoctorMonthlyStats.month.desc(), DoctorMonthlyStats.doctor_id).all()
+    return jsonify([row.to_dict() for row in stats]), 200
+
+
+# ===== Bulk Data Export =====
+
+@admin_bp.route('/exports', methods=['POST'])
+@admin_required
+def start_bulk_export():
+    """Start a partitioned export of appointments and/or treatments"""
+    data = request.get_json() or {}
+    
+    entities = data.get('entities', list(EXPORT_ENTITIES))
+    fmt = data.get('format', 'csv')
+    partition_by = data.get('partition_by', 'id')
+    default_size = 100000 if partition_by == 'id' else 30
+    partition_size = data.get('partition_size', default_size)
+    
+    if not entities or any(entity not in EXPORT_ENTITIES for entity in entities):
+        return jsonify({'error': f'entities must be a subset of {list(EXPORT_ENTITIES)}'}), 400
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {list(EXPORT_FORMATS)}'}), 400
+    if partition_by not in PARTITION_MODES:
+        return jsonify({'error': f'partition_by must be one of {list(PARTITION_MODES)}'}), 400
+    if not isinstance(partition_size, int) or partition_size <= 0:
+        return jsonify({'error': 'partition_size must be a positive integer'}), 400
+    
+    try:
+        from app.tasks.celery_tasks import export_hospital_data
+        
+        task = submit(export_hospital_data, args=[entities, fmt, partition_by, partition_size])
+        
+        return jsonify({
+            'message': 'Bulk export started',
+            'task_id': task.id,
+            'status': 'processing'
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': f'Failed to start export: {str(e)}'}), 500
+
+
+@admin_bp.route('/exports/<task_id>', methods=['GET'])
+@admin_required
+def get_bulk_export_status(task_id):
+    """Get per-shard progress of a bulk export"""
+    try:
+        task = get_result(task_id)
+        
+        if task.state != 'SUCCESS':
+            return jsonify({
+                'state': task.state,
+                'error': str(task.info) if task.state == 'FAILURE' else None
+            }), 200
+        
+        result = load_result(task.result) or {}
+        if result.get('status') != 'success':
+            return jsonify({'state': 'FAILURE', 'error': result.get('error')}), 200
+        
+        shards = []
+        for shard in result.get('shards', []):
+            shard_task = get_result(shard['task_id'])
+            info = load_result(shard_task.info)
+            info = info if isinstance(info, dict) else {}
+            shards.append({
+                'entity': shard['entity'],
+                'index': shard['index'],
+                'state': shard_task.state,
+                'rows': info.get('row_count', info.get('processed', 0)),
+                'file': info.get('file')
+            })
+        
+        response = {
+            'state': 'PROGRESS',
+            'export': result['export'],
+            'shards_total': len(shards),
+            'shards_done': sum(1 for shard in shards if shard['state'] == 'SUCCESS'),
+            'rows': sum(shard['rows'] for shard in shards),
+            'shards': shards
+        }
+        
+        manifest_task = get_result(result['manifest_task_id']) \
+            if result.get('manifest_task_id') else None
+        
+        if manifest_task is None or manifest_task.state == 'SUCCESS':
+            manifest_name = f'{result["export"]}/manifest.json'
+            response['state'] = 'SUCCESS'
+            response['manifest_url'] = url_for(
+                'tasks.download_export', token=sign_download(manifest_name, None), _external=True
+            )
+            for shard in shards:
+                if shard['file']:
+                    shard['download_url'] = url_for(
+                        'tasks.download_export', token=sign_download(shard['file'], None), _external=True
+                    )
+        elif manifest_task.state == 'FAILURE':
+            response['state'] = 'FAILURE'
+            response['error'] = str(manifest_task.info)
+        
+        return jsonify(response), 200
+    
+    except Exception as e:
+        return jsonify({'error': f'Failed to get export status: {str(e)}'}), 500
+
+
+# ===== Request Profiles =====
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def get_profiles():
+    """List the stored request profiles, per endpoint"""
+    try:
+        return jsonify({
+            'enabled': profiler.enabled,
+            'mode': profiler.mode,
+            'sample_rates': profiler.rates,
+            'profiles': profiler.list_profiles()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': f'Failed to list profiles: {str(e)}'}), 500
+
+
+@admin_bp.route('/profiles/<endpoint>', methods=['GET'])
+@admin_required
+def download_profile(endpoint):
+    """
+    Download an endpoint's profile, added up over every process
+    
+    ?format=collapsed (sampler mode; for flamegraph.pl or speedscope),
+    pstats (cprofile mode; for python -m pstats or snakeviz) or text
+    (cprofile mode; the slowest functions by cumulative time).
+    """
+    default_format = 'collapsed' if profiler.mode == 'sampler' else 'pstats'
+    fmt = request.args.get('format', default_format)
+    
+    if fmt not in PROFILE_FORMATS:
+        return jsonify({'error': f'format must be one of {list(PROFILE_FORMATS)}'}), 400
+    if endpoint not in current_app.view_functions:
+        return jsonify({'error': 'Unknown endpoint'}), 404
+    
+    try:
+        body = profiler.export(endpoint, fmt)
+    except Exception as e:
+        return jsonify({'error': f'Failed to load profile: {str(e)}'}), 500
+    
+    if body is None:
+        return jsonify({'error': f'No {PROFILE_FORMATS[fmt]} profile recorded for {endpoint}'}), 404
+    
+    if fmt == 'pstats':
+        response = Response(body, mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = f'attachment; filename="{endpoint}.prof"'
+    else:
+        response = Response(body, mimetype='text/plain')
+        response.headers['Content-Disposition'] = f'inline; filename="{endpoint}.{fmt}.txt"'
+    return response
+
+
+@admin_bp.route('/profiles', methods=['DELETE'])
+@admin_bp.route('/profiles/<endpoint>', methods=['DELETE'])
+@admin_required
+def delete_profiles(endpoint=None):
+    """Delete the stored profiles of an endpoint, or all of them"""
+    if endpoint is not None and endpoint not in current_app.view_functions:
+        return jsonify({'error': 'Unknown endpoint'}), 404
+    
+    try:
+        removed = profiler.reset(endpoint)
+        return jsonify({'message': 'Profiles deleted', 'files': removed}), 200
+    
+    except Exception as e:
+        return jsonify({'error': f'Failed to delete profiles: {str(e)}'}), 500
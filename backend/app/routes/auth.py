@@ -1,15 +1,27 @@
 """
 Authentication routes
 """
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from app.models import db, User, Doctor, Patient
-from app.utils.auth import hash_password, verify_password
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token, jwt_required, get_jwt, get_jwt_identity
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from app.models import db, User, Patient
+from app.utils.auth import get_principal, login_required, profile_id_for, token_claims
+from app.utils.passwords import PasswordHashBusy, check_login_password, hash_password_bounded
+from app.utils.profiles import get_user_profile
+from app.utils.revocation import revocations
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 
+def _hashing_busy():
+    """503 response for when the password hashing pool is saturated"""
+    response = jsonify({'error': 'Too many sign-ins in progress, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """User login"""
@@ -20,23 +32,35 @@ def login():
     
     user = User.query.filter_by(email=data['email']).first()
     
-    if not user or not verify_password(user.password_hash, data['password']):
+    if not user:
         return jsonify({'error': 'Invalid email or password'}), 401
     
-    # Create tokens
-    additional_claims = {'role': user.role}
+    try:
+        verified, new_hash = check_login_password(user.password_hash, data['password'])
+    except PasswordHashBusy:
+        return _hashing_busy()
+    
+    if not verified:
+        return jsonify({'error': 'Invalid email or password'}), 401
+    
+    if new_hash:
+        # Hashing parameters changed since this hash was made: upgrade it
+        try:
+            user.password_hash = new_hash
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f'Failed to rehash password for user {user.id}: {e}')
+    
+    # Get user profile data (cached, shared with /me)
+    account = get_user_profile(user.id)
+    profile = account['profile'] if account else None
+    
+    # Create tokens (the profile id saves a lookup on every later request)
+    additional_claims = token_claims(user.role, profile['id'] if profile else None)
     access_token = create_access_token(identity=user.id, additional_claims=additional_claims)
     refresh_token = create_refresh_token(identity=user.id, additional_claims=additional_claims)
     
-    # Get user profile data
-    profile = None
-    if user.role == 'doctor':
-        doctor = Doctor.query.filter_by(user_id=user.id).first()
-        profile = doctor.to_dict() if doctor else None
-    elif user.role == 'patient':
-        patient = Patient.query.filter_by(user_id=user.id).first()
-        profile = patient.to_dict() if patient else None
-    
     return jsonify({
         'access_token': access_token,
         'refresh_token': refresh_token,
@@ -64,11 +88,16 @@ def register():
     if User.query.filter_by(email=data['email']).first():
         return jsonify({'error': 'Email already registered'}), 409
     
+    try:
+        password_hash = hash_password_bounded(data['password'])
+    except PasswordHashBusy:
+        return _hashing_busy()
+    
     try:
         # Create user
         user = User(
             email=data['email'],
-            password_hash=hash_password(data['password']),
+            password_hash=password_hash,
             role='patient'
         )
         db.session.add(user)
@@ -110,33 +139,43 @@ def refresh():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    additional_claims = {'role': user.role}
+    additional_claims = token_claims(user.role, profile_id_for(user.id, user.role))
     access_token = create_access_token(identity=current_user_id, additional_claims=additional_claims)
     
     return jsonify({'access_token': access_token}), 200
 
 
+@auth_bp.route('/logout', methods=['POST'])
+@login_required
+def logout():
+    """Revoke the current access token, and the refresh token if one is sent"""
+    claims = get_jwt()
+    data = request.get_json(silent=True) or {}
+    
+    refresh_claims = None
+    if data.get('refresh_token'):
+        try:
+            refresh_claims = decode_token(data['refresh_token'])
+        except (JWTExtendedException, PyJWTError):
+            return jsonify({'error': 'Invalid refresh token'}), 400
+        
+        if refresh_claims.get('type') != 'refresh' or refresh_claims['sub'] != claims['sub']:
+            return jsonify({'error': 'Invalid refresh token'}), 400
+    
+    revocations.revoke_token(claims['jti'], claims['exp'])
+    if refresh_claims:
+        revocations.revoke_token(refresh_claims['jti'], refresh_claims['exp'])
+    
+    return jsonify({'message': 'Logged out successfully'}), 200
+
+
 @auth_bp.route('/me', methods=['GET'])
-@jwt_required()
+@login_required
 def get_current_user():
     """Get current user info"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    account = get_user_profile(get_principal().user_id)
     
-    if not user:
+    if not account:
         return jsonify({'error': 'User not found'}), 404
     
-    profile = None
-    if user.role == 'doctor':
-        doctor = Doctor.query.filter_by(user_id=user.id).first()
-        profile = doctor.to_dict() if doctor else None
-    elif user.role == 'patient':
-        patient = Patient.query.filter_by(user_id=user.id).first()
-        profile = patient.to_dict() if patient else None
-    
-    return jsonify({
-        'id': user.id,
-        'email': user.email,
-        'role': user.role,
-        'profile': profile
-    }), 200
+    return jsonify(account), 200
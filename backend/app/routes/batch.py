@@ -0,0 +1,30 @@
+"""
+Batch routes - several API calls in one round trip
+"""
+from flask import Blueprint, request, jsonify
+from app.utils.auth import get_principal, login_required
+from app.utils.batch import parse_batch, run_batch
+
+batch_bp = Blueprint('batch', __name__, url_prefix='/api')
+
+
+@batch_bp.route('/batch', methods=['POST'])
+@login_required
+def batch():
+    """
+    Dispatch a list of sub-requests with the caller's token
+    
+    Body: {"requests": [{"id": ..., "method": "GET", "path": "/api/...",
+    "body": {...}}, ...], "parallel": false}. Responds with
+    {"responses": [{"id": ..., "status": ..., "body": ...}, ...]} in request
+    order; a failing sub-request does not fail the batch.
+    """
+    data = request.get_json(silent=True)
+    
+    try:
+        subrequests = parse_batch(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    responses = run_batch(subrequests, get_principal(), parallel=bool(data.get('parallel')))
+    return jsonify({'responses': responses}), 200
@@ -0,0 +1,230 @@
+"""
+Calendar routes - iCalendar feeds of doctor and patient schedules
+"""
+import hashlib
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import func
+from app.models import db, User, Doctor, Patient, Appointment
+from app.utils.auth import get_principal, role_required
+from app.utils.cache import cache
+from app.utils.ical import calendar_header, calendar_footer, render_event
+
+calendar_bp = Blueprint('calendar', __name__, url_prefix='/api/calendar')
+
+# Rows fetched per round trip while streaming a feed
+FEED_CHUNK_SIZE = 500
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendar-feed')
+
+
+def _feed_token(user):
+    """
+    Sign a feed token for a user
+    
+    The token carries the user's feed_token_version, so bumping the version
+    revokes every URL issued before.
+    """
+    return _serializer().dumps({'user_id': user.id, 'v': user.feed_token_version})
+
+
+def _resolve_owner(payload):
+    """Return (role, profile) for the doctor or patient user a feed token was issued to"""
+    user = User.query.get(payload.get('user_id'))
+    # Tokens issued before versioning carry no version and count as version 0
+    if not user or payload.get('v', 0) != user.feed_token_version:
+        return None, None
+    
+    if user.role == 'doctor':
+        return user.role, Doctor.query.filter_by(user_id=user.id).first()
+    if user.role == 'patient':
+        return user.role, Patient.query.filter_by(user_id=user.id).first()
+    
+    return user.role, None
+
+
+def _owner_filter(role, profile_id):
+    if role == 'doctor':
+        return Appointment.doctor_id == profile_id
+    return Appointment.patient_id == profile_id
+
+
+def _feed_version(role, profile):
+    """
+    Compute the feed ETag from the owner's appointment set.
+    
+    Every create, update and status change touches updated_at and every
+    delete changes the count. The feed also shows the owner's name and the
+    doctors' and patients' names, so their profiles' updated_at count too.
+    Together these change exactly when the rendered feed would.
+    """
+    count, last_updated, doctors_updated, patients_updated = db.session.query(
+        func.count(Appointment.id),
+        func.max(Appointment.updated_at),
+        func.max(Doctor.updated_at),
+        func.max(Patient.updated_at)
+    ).join(
+        Doctor, Appointment.doctor_id == Doctor.id
+    ).join(
+        Patient, Appointment.patient_id == Patient.id
+    ).filter(_owner_filter(role, profile.id)).one()
+    
+    version = f'{role}:{profile.id}:{profile.updated_at}:{count}:{last_updated}:{doctors_updated}:{patients_updated}'
+    digest = hashlib.sha1(version.encode()).hexdigest()
+    return digest, last_updated
+
+
+def _feed_rows(role, profile_id):
+    """Stream the owner's appointments as a lightweight projection"""
+    return db.session.query(
+        Appointment.id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Appointment.reason,
+        Appointment.status,
+        Appointment.updated_at,
+        Doctor.name.label('doctor_name'),
+        Doctor.specialization,
+        Patient.name.label('patient_name')
+    ).join(
+        Doctor, Appointment.doctor_id == Doctor.id
+    ).join(
+        Patient, Appointment.patient_id == Patient.id
+    ).filter(
+        _owner_filter(role, profile_id)
+    ).order_by(
+        Appointment.appointment_date, Appointment.id
+    ).yield_per(FEED_CHUNK_SIZE)
+
+
+def _render_feed(role, profile, cache_key, etag):
+    """Yield the feed in chunks and cache the full body once rendered"""
+    duration = current_app.config.get('APPOINTMENT_DURATION_MINUTES', 30)
+    host = request.host.split(':')[0]
+    parts = []
+    
+    header = calendar_header(f'{profile.name} - Appointments')
+    parts.append(header)
+    yield header
+    
+    batch = []
+    for row in _feed_rows(role, profile.id):
+        if role == 'doctor':
+            summary = f'Appointment: {row.patient_name}'
+        else:
+            summary = f'Appointment with {row.doctor_name}'
+        
+        description = f'Department: {row.specialization}'
+        if row.reason:
+            description += f'\nReason: {row.reason}'
+        
+        batch.append(render_event(
+            uid=f'appointment-{row.id}@{host}',
+            appointment_date=row.appointment_date,
+            appointment_time=row.appointment_time,
+            summary=summary,
+            description=description,
+            status=row.status,
+            updated_at=row.updated_at,
+            duration_minutes=duration
+        ))
+        
+        if len(batch) >= FEED_CHUNK_SIZE:
+            chunk = ''.join(batch)
+            parts.append(chunk)
+            batch = []
+            yield chunk
+    
+    if batch:
+        chunk = ''.join(batch)
+        parts.append(chunk)
+        yield chunk
+    
+    footer = calendar_footer()
+    parts.append(footer)
+    yield footer
+    
+    cache.set(cache_key, {'etag': etag, 'body': ''.join(parts)},
+              current_app.config.get('CALENDAR_FEED_CACHE_TIMEOUT', 86400))
+
+
+@calendar_bp.route('/feed-url', methods=['GET'])
+@role_required('doctor', 'patient')
+def get_feed_url():
+    """Get the private iCalendar subscription URL for the logged-in user"""
+    user = User.query.get(get_principal().user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    return jsonify({
+        'url': url_for('calendar.get_feed', token=_feed_token(user), _external=True)
+    }), 200
+
+
+@calendar_bp.route('/feed-url', methods=['POST'])
+@role_required('doctor', 'patient')
+def rotate_feed_url():
+    """Issue a new subscription URL, revoking every URL issued before"""
+    user = User.query.get(get_principal().user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    try:
+        user.feed_token_version += 1
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Calendar feed URL rotated',
+            'url': url_for('calendar.get_feed', token=_feed_token(user), _external=True)
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to rotate feed URL: {str(e)}'}), 500
+
+
+@calendar_bp.route('/feeds/<token>.ics', methods=['GET'])
+def get_feed(token):
+    """
+    Serve a user's schedule as an iCalendar feed.
+    
+    Calendar clients cannot send JWTs, so the feed is authorised by the signed
+    token in its URL. Polls are answered from the ETag alone (304) or from the
+    cached body until the owner's appointments change.
+    """
+    try:
+        payload = _serializer().loads(token)
+    except BadSignature:
+        return jsonify({'error': 'Invalid calendar feed token'}), 404
+    
+    role, profile = _resolve_owner(payload)
+    if not profile:
+        return jsonify({'error': 'Calendar feed not found'}), 404
+    
+    etag, last_updated = _feed_version(role, profile)
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    cache_key = f'ical:{role}:{profile.id}'
+    cached_feed = cache.get(cache_key)
+    
+    if cached_feed and cached_feed.get('etag') == etag:
+        response = Response(cached_feed['body'], mimetype='text/calendar')
+    else:
+        response = Response(
+            stream_with_context(_render_feed(role, profile, cache_key, etag)),
+            mimetype='text/calendar'
+        )
+    
+    response.set_etag(etag)
+    if last_updated:
+        response.last_modified = last_updated
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Content-Disposition'] = 'inline; filename="appointments.ics"'
+    
+    return response
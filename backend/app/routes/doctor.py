@@ -2,30 +2,30 @@
 Doctor routes - Appointment management and patient treatment
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Doctor, Patient, Appointment, Treatment
-from app.utils.auth import doctor_required
+from app.models import db, User, Patient, Appointment, Treatment
+from app.utils.auth import current_profile, doctor_required, get_principal
+from app.utils.fields import APPOINTMENT_FIELDS, PATIENT_FIELDS, TREATMENT_FIELDS, sparse_detail, sparse_list
+from app.utils.profiles import invalidate_user_profile
+from app.utils.waitlist import notify_slot_freed
 from datetime import datetime
 
 doctor_bp = Blueprint('doctor', __name__, url_prefix='/api/doctor')
 
 
 @doctor_bp.route('/appointments', methods=['GET'])
-@jwt_required()
 @doctor_required
 def get_doctor_appointments():
     """Get all appointments for the logged-in doctor"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor_id = get_principal().profile_id
     
-    if not doctor:
+    if not doctor_id:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
     # Get query parameters for filtering
     status = request.args.get('status')
     date = request.args.get('date')
     
-    query = Appointment.query.filter_by(doctor_id=doctor.id)
+    query = Appointment.query.filter_by(doctor_id=doctor_id)
     
     if status:
         query = query.filter_by(status=status)
@@ -33,23 +33,33 @@ def get_doctor_appointments():
     if date:
         query = query.filter_by(appointment_date=datetime.fromisoformat(date).date())
     
-    appointments = query.order_by(Appointment.appointment_date, Appointment.appointment_time).all()
+    query = query.order_by(Appointment.appointment_date, Appointment.appointment_time)
+    
+    sparse = sparse_list(query, APPOINTMENT_FIELDS)
+    if sparse is not None:
+        return sparse
+    
+    appointments = query.all()
     
     return jsonify([appointment.to_dict() for appointment in appointments]), 200
 
 
 @doctor_bp.route('/appointments/<int:appointment_id>', methods=['GET'])
-@jwt_required()
 @doctor_required
 def get_appointment(appointment_id):
     """Get a specific appointment"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor_id = get_principal().profile_id
     
-    if not doctor:
+    if not doctor_id:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
-    appointment = Appointment.query.filter_by(id=appointment_id, doctor_id=doctor.id).first()
+    query = Appointment.query.filter_by(id=appointment_id, doctor_id=doctor_id)
+    
+    sparse = sparse_detail(query, APPOINTMENT_FIELDS, 'Appointment not found')
+    if sparse is not None:
+        return sparse
+    
+    appointment = query.first()
     if not appointment:
         return jsonify({'error': 'Appointment not found'}), 404
     
@@ -57,17 +67,15 @@ def get_appointment(appointment_id):
 
 
 @doctor_bp.route('/appointments/<int:appointment_id>/status', methods=['PUT'])
-@jwt_required()
 @doctor_required
 def update_appointment_status(appointment_id):
     """Update appointment status"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor_id = get_principal().profile_id
     
-    if not doctor:
+    if not doctor_id:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
-    appointment = Appointment.query.filter_by(id=appointment_id, doctor_id=doctor.id).first()
+    appointment = Appointment.query.filter_by(id=appointment_id, doctor_id=doctor_id).first()
     if not appointment:
         return jsonify({'error': 'Appointment not found'}), 404
     
@@ -77,9 +85,13 @@ def update_appointment_status(appointment_id):
         return jsonify({'error': 'Status is required'}), 400
     
     try:
+        was_scheduled = appointment.status == 'scheduled'
         appointment.status = data['status']
         db.session.commit()
         
+        if was_scheduled and appointment.status == 'cancelled':
+            notify_slot_freed(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time, [appointment.patient_id])
+        
         return jsonify({
             'message': 'Appointment status updated successfully',
             'appointment': appointment.to_dict()
@@ -91,33 +103,37 @@ def update_appointment_status(appointment_id):
 
 
 @doctor_bp.route('/patients', methods=['GET'])
-@jwt_required()
 @doctor_required
 def get_assigned_patients():
     """Get all patients assigned to the logged-in doctor"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor_id = get_principal().profile_id
     
-    if not doctor:
+    if not doctor_id:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
-    # Get unique patients who have appointments with this doctor
-    patients = db.session.query(Patient).join(Appointment).filter(
-        Appointment.doctor_id == doctor.id
-    ).distinct().all()
+    # Get unique patients who have appointments with this doctor. A
+    # semi-join rather than DISTINCT, so a projection of non-unique fields
+    # (e.g. only names) still returns one row per patient
+    query = Patient.query.filter(Patient.id.in_(
+        db.session.query(Appointment.patient_id).filter(Appointment.doctor_id == doctor_id)
+    ))
+    
+    sparse = sparse_list(query, PATIENT_FIELDS)
+    if sparse is not None:
+        return sparse
+    
+    patients = query.all()
     
     return jsonify([patient.to_dict() for patient in patients]), 200
 
 
 @doctor_bp.route('/patients/<int:patient_id>/history', methods=['GET'])
-@jwt_required()
 @doctor_required
 def get_patient_history(patient_id):
     """Get treatment history for a specific patient"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor_id = get_principal().profile_id
     
-    if not doctor:
+    if not doctor_id:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
     patient = Patient.query.get(patient_id)
@@ -125,22 +141,24 @@ def get_patient_history(patient_id):
         return jsonify({'error': 'Patient not found'}), 404
     
     # Get all treatments for this patient
-    treatments = Treatment.query.filter_by(patient_id=patient_id).order_by(
-        Treatment.visit_date.desc()
-    ).all()
+    query = Treatment.query.filter_by(patient_id=patient_id).order_by(Treatment.visit_date.desc())
+    
+    sparse = sparse_list(query, TREATMENT_FIELDS)
+    if sparse is not None:
+        return sparse
+    
+    treatments = query.all()
     
     return jsonify([treatment.to_dict() for treatment in treatments]), 200
 
 
 @doctor_bp.route('/treatments', methods=['POST'])
-@jwt_required()
 @doctor_required
 def create_treatment():
     """Create a new treatment record"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor_id = get_principal().profile_id
     
-    if not doctor:
+    if not doctor_id:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
     data = request.get_json()
@@ -159,7 +177,7 @@ def create_treatment():
     try:
         treatment = Treatment(
             patient_id=data['patient_id'],
-            doctor_id=doctor.id,
+            doctor_id=doctor_id,
             visit_date=datetime.fromisoformat(data['visit_date']).date(),
             symptoms=data['symptoms'],
             diagnosis=data['diagnosis'],
@@ -182,17 +200,15 @@ def create_treatment():
 
 
 @doctor_bp.route('/treatments/<int:treatment_id>', methods=['PUT'])
-@jwt_required()
 @doctor_required
 def update_treatment(treatment_id):
     """Update a treatment record"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor_id = get_principal().profile_id
     
-    if not doctor:
+    if not doctor_id:
         return jsonify({'error': 'Doctor profile not found'}), 404
     
-    treatment = Treatment.query.filter_by(id=treatment_id, doctor_id=doctor.id).first()
+    treatment = Treatment.query.filter_by(id=treatment_id, doctor_id=doctor_id).first()
     if not treatment:
         return jsonify({'error': 'Treatment record not found'}), 404
     
@@ -225,12 +241,10 @@ def update_treatment(treatment_id):
 
 
 @doctor_bp.route('/profile', methods=['GET'])
-@jwt_required()
 @doctor_required
 def get_doctor_profile():
     """Get the logged-in doctor's profile"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor = current_profile()
     
     if not doctor:
         return jsonify({'error': 'Doctor profile not found'}), 404
@@ -239,12 +253,10 @@ def get_doctor_profile():
 
 
 @doctor_bp.route('/profile', methods=['PUT'])
-@jwt_required()
 @doctor_required
 def update_doctor_profile():
     """Update the logged-in doctor's profile"""
-    current_user_id = get_jwt_identity()
-    doctor = Doctor.query.filter_by(user_id=current_user_id).first()
+    doctor = current_profile()
     
     if not doctor:
         return jsonify({'error': 'Doctor profile not found'}), 404
@@ -264,6 +276,7 @@ def update_doctor_profile():
             doctor.experience = data['experience']
         
         db.session.commit()
+        invalidate_user_profile(doctor.user_id)
         
         return jsonify({
             'message': 'Profile updated successfully',
@@ -2,17 +2,19 @@
 Patient routes - Doctor search, appointment booking, and medical history
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Doctor, Patient, Appointment, Treatment, Department
-from app.utils.auth import patient_required
+from sqlalchemy.exc import IntegrityError
+from app.models import db, User, Doctor, Appointment, Treatment, Department, WaitlistEntry
+from app.utils.auth import current_profile, get_principal, patient_required
 from app.utils.cache import cached
+from app.utils.fields import APPOINTMENT_FIELDS, DOCTOR_FIELDS, TREATMENT_FIELDS, sparse_detail, sparse_list
+from app.utils.profiles import invalidate_user_profile
+from app.utils.waitlist import slot_is_held, slot_is_taken, clear_offer, notify_slot_freed
 from datetime import datetime
 
 patient_bp = Blueprint('patient', __name__, url_prefix='/api/patient')
 
 
 @patient_bp.route('/doctors', methods=['GET'])
-@jwt_required()
 @patient_required
 def get_doctors():
     """Get all doctors with optional filtering"""
@@ -23,15 +25,22 @@ def get_doctors():
     if specialization:
         query = query.filter_by(specialization=specialization)
     
+    sparse = sparse_list(query, DOCTOR_FIELDS)
+    if sparse is not None:
+        return sparse
+    
     doctors = query.all()
     return jsonify([doctor.to_dict() for doctor in doctors]), 200
 
 
 @patient_bp.route('/doctors/<int:doctor_id>', methods=['GET'])
-@jwt_required()
 @patient_required
 def get_doctor(doctor_id):
     """Get a specific doctor"""
+    sparse = sparse_detail(Doctor.query.filter(Doctor.id == doctor_id), DOCTOR_FIELDS, 'Doctor not found')
+    if sparse is not None:
+        return sparse
+    
     doctor = Doctor.query.get(doctor_id)
     if not doctor:
         return jsonify({'error': 'Doctor not found'}), 404
@@ -40,7 +49,6 @@ def get_doctor(doctor_id):
 
 
 @patient_bp.route('/departments', methods=['GET'])
-@jwt_required()
 @patient_required
 def get_departments():
     """Get all departments"""
@@ -62,38 +70,40 @@ def get_departments():
 
 
 @patient_bp.route('/appointments', methods=['GET'])
-@jwt_required()
 @patient_required
 def get_patient_appointments():
     """Get all appointments for the logged-in patient"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    patient_id = get_principal().profile_id
     
-    if not patient:
+    if not patient_id:
         return jsonify({'error': 'Patient profile not found'}), 404
     
     # Get query parameters for filtering
     status = request.args.get('status')
     
-    query = Appointment.query.filter_by(patient_id=patient.id)
+    query = Appointment.query.filter_by(patient_id=patient_id)
     
     if status:
         query = query.filter_by(status=status)
     
-    appointments = query.order_by(Appointment.appointment_date.desc()).all()
+    query = query.order_by(Appointment.appointment_date.desc())
+    
+    sparse = sparse_list(query, APPOINTMENT_FIELDS)
+    if sparse is not None:
+        return sparse
+    
+    appointments = query.all()
     
     return jsonify([appointment.to_dict() for appointment in appointments]), 200
 
 
 @patient_bp.route('/appointments', methods=['POST'])
-@jwt_required()
 @patient_required
 def book_appointment():
     """Book a new appointment"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    patient_id = get_principal().profile_id
     
-    if not patient:
+    if not patient_id:
         return jsonify({'error': 'Patient profile not found'}), 404
     
     data = request.get_json()
@@ -110,10 +120,16 @@ def book_appointment():
         return jsonify({'error': 'Doctor not found'}), 404
     
     try:
+        appointment_date = datetime.fromisoformat(data['appointment_date']).date()
+        
+        # A slot on offer to a waitlisted patient stays theirs until the offer ends
+        if slot_is_held(doctor.id, appointment_date, data['appointment_time']):
+            return jsonify({'error': 'Slot is held for a waitlisted patient'}), 409
+        
         appointment = Appointment(
-            patient_id=patient.id,
+            patient_id=patient_id,
             doctor_id=data['doctor_id'],
-            appointment_date=datetime.fromisoformat(data['appointment_date']).date(),
+            appointment_date=appointment_date,
             appointment_time=data['appointment_time'],
             reason=data.get('reason', ''),
             status='scheduled'
@@ -133,23 +149,23 @@ def book_appointment():
 
 
 @patient_bp.route('/appointments/<int:appointment_id>', methods=['PUT'])
-@jwt_required()
 @patient_required
 def reschedule_appointment(appointment_id):
     """Reschedule an appointment"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    patient_id = get_principal().profile_id
     
-    if not patient:
+    if not patient_id:
         return jsonify({'error': 'Patient profile not found'}), 404
     
-    appointment = Appointment.query.filter_by(id=appointment_id, patient_id=patient.id).first()
+    appointment = Appointment.query.filter_by(id=appointment_id, patient_id=patient_id).first()
     if not appointment:
         return jsonify({'error': 'Appointment not found'}), 404
     
     data = request.get_json()
     
     try:
+        old_slot = (appointment.appointment_date, appointment.appointment_time)
+        
         if 'appointment_date' in data:
             appointment.appointment_date = datetime.fromisoformat(data['appointment_date']).date()
         if 'appointment_time' in data:
@@ -157,8 +173,17 @@ def reschedule_appointment(appointment_id):
         if 'reason' in data:
             appointment.reason = data['reason']
         
+        new_slot = (appointment.appointment_date, appointment.appointment_time)
+        if new_slot != old_slot and slot_is_held(appointment.doctor_id, *new_slot):
+            db.session.rollback()
+            return jsonify({'error': 'Slot is held for a waitlisted patient'}), 409
+        
         db.session.commit()
         
+        # The old slot is free again for the waitlist
+        if appointment.status == 'scheduled' and old_slot != (appointment.appointment_date, appointment.appointment_time):
+            notify_slot_freed(appointment.doctor_id, old_slot[0], old_slot[1], [patient_id])
+        
         return jsonify({
             'message': 'Appointment rescheduled successfully',
             'appointment': appointment.to_dict()
@@ -170,25 +195,28 @@ def reschedule_appointment(appointment_id):
 
 
 @patient_bp.route('/appointments/<int:appointment_id>', methods=['DELETE'])
-@jwt_required()
 @patient_required
 def cancel_appointment(appointment_id):
     """Cancel an appointment"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    patient_id = get_principal().profile_id
     
-    if not patient:
+    if not patient_id:
         return jsonify({'error': 'Patient profile not found'}), 404
     
-    appointment = Appointment.query.filter_by(id=appointment_id, patient_id=patient.id).first()
+    appointment = Appointment.query.filter_by(id=appointment_id, patient_id=patient_id).first()
     if not appointment:
         return jsonify({'error': 'Appointment not found'}), 404
     
     try:
+        was_scheduled = appointment.status == 'scheduled'
+        
         # Option 1: Soft delete by changing status
         appointment.status = 'cancelled'
         db.session.commit()
         
+        if was_scheduled:
+            notify_slot_freed(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time, [patient_id])
+        
         return jsonify({'message': 'Appointment cancelled successfully'}), 200
     
     except Exception as e:
@@ -196,31 +224,216 @@ def cancel_appointment(appointment_id):
         return jsonify({'error': f'Failed to cancel appointment: {str(e)}'}), 500
 
 
+# ===== Waitlist =====
+
+@patient_bp.route('/waitlist', methods=['GET'])
+@patient_required
+def get_waitlist_entries():
+    """Get the logged-in patient's waitlist entries"""
+    patient_id = get_principal().profile_id
+    
+    if not patient_id:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    
+    entries = WaitlistEntry.query.filter_by(patient_id=patient_id).order_by(
+        WaitlistEntry.requested_at.desc()
+    ).all()
+    
+    return jsonify([entry.to_dict() for entry in entries]), 200
+
+
+@patient_bp.route('/waitlist', methods=['POST'])
+@patient_required
+def join_waitlist():
+    """Join the waitlist for a doctor or a department"""
+    patient_id = get_principal().profile_id
+    
+    if not patient_id:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    
+    data = request.get_json()
+    
+    if not data.get('doctor_id') and not data.get('department'):
+        return jsonify({'error': 'doctor_id or department is required'}), 400
+    
+    department = data.get('department')
+    if data.get('doctor_id'):
+        doctor = Doctor.query.get(data['doctor_id'])
+        if not doctor:
+            return jsonify({'error': 'Doctor not found'}), 404
+        department = doctor.specialization
+    
+    # One active entry per doctor (or department): each entry is offered
+    # its own slot, so duplicates would hand one patient several holds
+    active = WaitlistEntry.query.filter(
+        WaitlistEntry.patient_id == patient_id,
+        WaitlistEntry.status.in_(['waiting', 'offered'])
+    )
+    if data.get('doctor_id'):
+        active = active.filter(WaitlistEntry.doctor_id == data['doctor_id'])
+    else:
+        active = active.filter(WaitlistEntry.doctor_id.is_(None), WaitlistEntry.department == department)
+    if active.first():
+        return jsonify({'error': 'Already on the waitlist for this doctor or department'}), 409
+    
+    try:
+        entry = WaitlistEntry(
+            patient_id=patient_id,
+            doctor_id=data.get('doctor_id'),
+            department=department,
+            urgent=bool(data.get('urgent', False)),
+            reason=data.get('reason', ''),
+            status='waiting'
+        )
+        
+        db.session.add(entry)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Added to waitlist successfully',
+            'waitlist_entry': entry.to_dict()
+        }), 201
+    
+    except IntegrityError:
+        db.session.rollback()  # a concurrent join got in first
+        return jsonify({'error': 'Already on the waitlist for this doctor or department'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to join waitlist: {str(e)}'}), 500
+
+
+@patient_bp.route('/waitlist/<int:entry_id>/accept', methods=['POST'])
+@patient_required
+def accept_waitlist_offer(entry_id):
+    """Accept a held slot and turn it into an appointment"""
+    patient_id = get_principal().profile_id
+    
+    if not patient_id:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    
+    entry = WaitlistEntry.query.filter_by(id=entry_id, patient_id=patient_id).first()
+    if not entry:
+        return jsonify({'error': 'Waitlist entry not found'}), 404
+    
+    if entry.status != 'offered' or entry.offer_expires_at < datetime.utcnow():
+        return jsonify({'error': 'No active offer for this waitlist entry'}), 409
+    
+    if slot_is_taken(entry.offered_doctor_id, entry.offered_date, entry.offered_time, ignore_entry_id=entry.id):
+        return jsonify({'error': 'Slot is no longer available'}), 409
+    
+    try:
+        appointment = Appointment(
+            patient_id=patient_id,
+            doctor_id=entry.offered_doctor_id,
+            appointment_date=entry.offered_date,
+            appointment_time=entry.offered_time,
+            reason=entry.reason or '',
+            status='scheduled'
+        )
+        db.session.add(appointment)
+        db.session.flush()
+        
+        clear_offer(entry, 'booked')
+        entry.appointment_id = appointment.id
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Appointment booked successfully',
+            'appointment': appointment.to_dict()
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to accept offer: {str(e)}'}), 500
+
+
+@patient_bp.route('/waitlist/<int:entry_id>/decline', methods=['POST'])
+@patient_required
+def decline_waitlist_offer(entry_id):
+    """Decline a held slot and stay on the waitlist"""
+    patient_id = get_principal().profile_id
+    
+    if not patient_id:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    
+    entry = WaitlistEntry.query.filter_by(id=entry_id, patient_id=patient_id).first()
+    if not entry:
+        return jsonify({'error': 'Waitlist entry not found'}), 404
+    
+    if entry.status != 'offered':
+        return jsonify({'error': 'No active offer for this waitlist entry'}), 409
+    
+    try:
+        slot = (entry.offered_doctor_id, entry.offered_date, entry.offered_time)
+        clear_offer(entry, 'waiting')
+        db.session.commit()
+        
+        notify_slot_freed(*slot, [patient_id])
+        
+        return jsonify({
+            'message': 'Offer declined',
+            'waitlist_entry': entry.to_dict()
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to decline offer: {str(e)}'}), 500
+
+
+@patient_bp.route('/waitlist/<int:entry_id>', methods=['DELETE'])
+@patient_required
+def leave_waitlist(entry_id):
+    """Leave the waitlist"""
+    patient_id = get_principal().profile_id
+    
+    if not patient_id:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    
+    entry = WaitlistEntry.query.filter_by(id=entry_id, patient_id=patient_id).first()
+    if not entry:
+        return jsonify({'error': 'Waitlist entry not found'}), 404
+    
+    try:
+        slot = (entry.offered_doctor_id, entry.offered_date, entry.offered_time)
+        was_offered = entry.status == 'offered'
+        clear_offer(entry, 'cancelled')
+        db.session.commit()
+        
+        if was_offered:
+            notify_slot_freed(*slot, [patient_id])
+        
+        return jsonify({'message': 'Removed from waitlist successfully'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to leave waitlist: {str(e)}'}), 500
+
+
 @patient_bp.route('/history', methods=['GET'])
-@jwt_required()
 @patient_required
 def get_medical_history():
     """Get medical history for the logged-in patient"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    patient_id = get_principal().profile_id
     
-    if not patient:
+    if not patient_id:
         return jsonify({'error': 'Patient profile not found'}), 404
     
-    treatments = Treatment.query.filter_by(patient_id=patient.id).order_by(
-        Treatment.visit_date.desc()
-    ).all()
+    query = Treatment.query.filter_by(patient_id=patient_id).order_by(Treatment.visit_date.desc())
+    
+    sparse = sparse_list(query, TREATMENT_FIELDS)
+    if sparse is not None:
+        return sparse
+    
+    treatments = query.all()
     
     return jsonify([treatment.to_dict() for treatment in treatments]), 200
 
 
 @patient_bp.route('/profile', methods=['GET'])
-@jwt_required()
 @patient_required
 def get_patient_profile():
     """Get the logged-in patient's profile"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    patient = current_profile()
     
     if not patient:
         return jsonify({'error': 'Patient profile not found'}), 404
@@ -229,12 +442,10 @@ def get_patient_profile():
 
 
 @patient_bp.route('/profile', methods=['PUT'])
-@jwt_required()
 @patient_required
 def update_patient_profile():
     """Update the logged-in patient's profile"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    patient = current_profile()
     
     if not patient:
         return jsonify({'error': 'Patient profile not found'}), 404
@@ -252,6 +463,7 @@ def update_patient_profile():
             patient.phone = data['phone']
         
         db.session.commit()
+        invalidate_user_profile(patient.user_id)
         
         return jsonify({
             'message': 'Profile updated successfully',
@@ -1,34 +1,88 @@
 """
 Task routes for triggering async operations
 """
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Patient
-from app.utils.auth import patient_required
+import json
+import os
+import time
+import uuid
+from celery.states import READY_STATES
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, stream_with_context
+from itsdangerous import BadSignature, SignatureExpired
+from app.tasks.backend import get_result, submit
+from app.utils.auth import get_principal, patient_required
+from app.utils.cache import cache
+from app.utils.exports import (
+    export_owned_by, export_status, owns_export, sign_stream_ticket, verify_stream_ticket
+)
+from app.utils.progress import progress_channel, record_task_owner, task_owner
+from app.utils.results import load_result
+from app.utils.storage import verify_download, storage_path
 
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/api/tasks')
 
+# How long an export dedupe key may stay reserved without its task being submitted
+EXPORT_RESERVATION_SECONDS = 60
+
 
 @tasks_bp.route('/export-history', methods=['POST'])
-@jwt_required()
 @patient_required
 def export_history():
     """Trigger CSV export of patient's medical history"""
-    current_user_id = get_jwt_identity()
-    patient = Patient.query.filter_by(user_id=current_user_id).first()
+    principal = get_principal()
     
-    if not patient:
+    if not principal.profile_id:
         return jsonify({'error': 'Patient profile not found'}), 404
     
     try:
         # Import here to avoid circular imports
-        from app.tasks.celery_tasks import export_patient_history
+        from app.tasks.celery_tasks import export_patient_history, patient_history_version
+        
+        # Exports are keyed by the patient's treatment-set version, so a
+        # repeat request for unchanged data reuses the existing task/file.
+        version = patient_history_version(principal.profile_id)
+        cache_key = f'export:patient:{principal.profile_id}:{version}'
+        # Never reuse a task for longer than its result is kept
+        timeout = min(
+            current_app.config.get('EXPORT_CACHE_TIMEOUT', 86400),
+            current_app.config.get('CELERY_RESULT_EXPIRES', 86400)
+        )
+        
+        existing = cache.get(cache_key)
+        if existing and not _export_reusable(get_result(existing['task_id']), existing):
+            cache.delete(cache_key)
+            existing = None
         
-        # Trigger async task
-        task = export_patient_history.delay(patient.id)
+        if not existing:
+            task_id = str(uuid.uuid4())
+            # SET NX: of several concurrent requests only one queues the task.
+            # The key is a reservation until submitted_at is set.
+            if cache.add(cache_key, {'task_id': task_id, 'reserved_at': time.time(), 'submitted_at': None}, timeout):
+                try:
+                    record_task_owner(task_id, principal.user_id)
+                    submit(export_patient_history, args=[principal.profile_id, version], task_id=task_id)
+                except Exception:
+                    cache.delete(cache_key)
+                    raise
+                
+                cache.set(cache_key, {'task_id': task_id, 'submitted_at': time.time()}, timeout)
+                return jsonify({
+                    'message': 'Export task started',
+                    'task_id': task_id,
+                    'status': 'processing'
+                }), 202
+            
+            existing = cache.get(cache_key) or {'task_id': task_id}
+        
+        task = get_result(existing['task_id'])
+        if task.state == 'SUCCESS':
+            return jsonify({
+                'message': 'Export already available',
+                'task_id': task.id,
+                'status': 'completed'
+            }), 200
         
         return jsonify({
-            'message': 'Export task started',
+            'message': 'Export already in progress',
             'task_id': task.id,
             'status': 'processing'
         }), 202
@@ -37,40 +91,187 @@ def export_history():
         return jsonify({'error': f'Failed to start export: {str(e)}'}), 500
 
 
+def _export_reusable(task, entry):
+    """
+    Whether a previous export task can answer a new request for the same data
+    
+    entry is the dedupe record ({'task_id', 'submitted_at'}). Celery reports
+    unknown and expired task ids as PENDING too, so a task still pending
+    EXPORT_PENDING_TIMEOUT seconds after it was submitted (or a reservation
+    never followed by a submit) is treated as lost.
+    """
+    if task.state == 'FAILURE':
+        return False
+    
+    if task.state == 'PENDING':
+        submitted_at = entry.get('submitted_at')
+        if submitted_at is None:
+            return time.time() - entry.get('reserved_at', 0) < EXPORT_RESERVATION_SECONDS
+        return time.time() - submitted_at < current_app.config.get('EXPORT_PENDING_TIMEOUT', 600)
+    
+    if task.state == 'SUCCESS':
+        result = load_result(task.result) or {}
+        if result.get('status') != 'success':
+            return False
+        try:
+            return os.path.isfile(storage_path(result['file']['name']))
+        except (KeyError, ValueError):
+            return False
+    
+    return True
+
+
 @tasks_bp.route('/export-history/<task_id>', methods=['GET'])
-@jwt_required()
 @patient_required
 def get_export_status(task_id):
     """Get the status of a CSV export task"""
+    principal = get_principal()
+    
+    if not principal.profile_id:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    
     try:
-        from app.tasks.celery_tasks import export_patient_history
+        task = get_result(task_id)
         
-        task = export_patient_history.AsyncResult(task_id)
+        if not owns_export(task, principal.user_id, principal.profile_id):
+            return jsonify({'error': 'Task not found'}), 404
         
-        if task.state == 'PENDING':
-            response = {
-                'state': task.state,
-                'status': 'Task is waiting to be processed'
-            }
-        elif task.state == 'SUCCESS':
-            response = {
-                'state': task.state,
-                'result': task.result,
-                'status': 'Task completed successfully'
-            }
-        elif task.state == 'FAILURE':
-            response = {
-                'state': task.state,
-                'error': str(task.info),
-                'status': 'Task failed'
-            }
-        else:
-            response = {
-                'state': task.state,
-                'status': 'Task is being processed'
-            }
-        
-        return jsonify(response), 200
+        return jsonify(export_status(task)), 200
     
     except Exception as e:
         return jsonify({'error': f'Failed to get task status: {str(e)}'}), 500
+
+
+@tasks_bp.route('/export-history/<task_id>/events-ticket', methods=['POST'])
+@patient_required
+def issue_stream_ticket(task_id):
+    """
+    Issue a single-use ticket for opening the export's event stream.
+    
+    The ticket replaces the access token in the stream URL, which would
+    otherwise end up in access logs; it expires after SSE_TICKET_EXPIRES
+    seconds.
+    """
+    principal = get_principal()
+    
+    if not principal.profile_id:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    
+    if not owns_export(get_result(task_id), principal.user_id, principal.profile_id):
+        return jsonify({'error': 'Task not found'}), 404
+    
+    return jsonify({
+        'ticket': sign_stream_ticket(task_id, principal.user_id, principal.profile_id),
+        'expires_in': current_app.config.get('SSE_TICKET_EXPIRES', 60)
+    }), 200
+
+
+@tasks_bp.route('/export-history/<task_id>/events', methods=['GET'])
+def stream_export_status(task_id):
+    """
+    Push export status changes as Server-Sent Events.
+    
+    EventSource cannot set headers, so the stream is opened with a ticket
+    from the events-ticket endpoint (?ticket=). Each change is sent as a
+    'status' event; the stream ends once the task finishes or after
+    SSE_MAX_SECONDS (clients then fetch a new ticket and reconnect), or
+    with an 'error' event if the task turns out to be another patient's.
+    """
+    try:
+        ticket = verify_stream_ticket(request.args.get('ticket', ''), task_id)
+    except SignatureExpired:
+        return jsonify({'error': 'Stream ticket has expired'}), 401
+    except BadSignature:
+        return jsonify({'error': 'Invalid stream ticket'}), 401
+    
+    # Single use; with the cache down a ticket stays replayable until it expires
+    if not cache.add(f'stream-ticket:{ticket["nonce"]}', True, current_app.config.get('SSE_TICKET_EXPIRES', 60)):
+        return jsonify({'error': 'Stream ticket has already been used'}), 401
+    
+    user_id, patient_id = ticket['user_id'], ticket['patient_id']
+    task = get_result(task_id)
+    owner = task_owner(task_id)
+    if not export_owned_by(task, owner, user_id, patient_id):
+        return jsonify({'error': 'Task not found'}), 404
+    
+    max_seconds = current_app.config.get('SSE_MAX_SECONDS', 300)
+    heartbeat = current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    
+    def events():
+        pubsub = None
+        if cache.redis_client:
+            pubsub = cache.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(progress_channel(task_id))
+        
+        try:
+            deadline = time.monotonic() + max_seconds
+            last_payload = None
+            last_sent = time.monotonic()
+            
+            while time.monotonic() < deadline:
+                task = get_result(task_id)
+                # Without an owner record a pending task was let through on
+                # trust; once it has meta, check it belongs to this patient
+                if owner is None and task.state != 'PENDING' and \
+                        not export_owned_by(task, None, user_id, patient_id):
+                    yield f"event: error\ndata: {json.dumps({'error': 'Task not found'})}\n\n"
+                    return
+                
+                payload = json.dumps(export_status(task))
+                if payload != last_payload:
+                    yield f'event: status\ndata: {payload}\n\n'
+                    last_payload = payload
+                    last_sent = time.monotonic()
+                    if json.loads(payload)['state'] in READY_STATES:
+                        return
+                elif time.monotonic() - last_sent >= heartbeat:
+                    yield ': keep-alive\n\n'
+                    last_sent = time.monotonic()
+                
+                # Wake on a published update, or re-check after a second
+                if pubsub:
+                    pubsub.get_message(timeout=1.0)
+                else:
+                    time.sleep(1.0)
+        finally:
+            if pubsub:
+                pubsub.close()
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@tasks_bp.route('/downloads/<token>', methods=['GET'])
+def download_export(token):
+    """
+    Download a generated export file.
+    
+    Access is granted by the signed, expiring token from the status
+    endpoint, so plain browser links work. Supports range requests and
+    X-Sendfile (USE_X_SENDFILE) for offloading to the front-end server.
+    """
+    try:
+        payload = verify_download(token)
+    except SignatureExpired:
+        return jsonify({'error': 'Download link has expired'}), 410
+    except BadSignature:
+        return jsonify({'error': 'Invalid download link'}), 404
+    
+    try:
+        path = storage_path(payload['name'])
+    except ValueError:
+        return jsonify({'error': 'Invalid download link'}), 404
+    
+    if not os.path.isfile(path):
+        return jsonify({'error': 'Export file not found'}), 404
+    
+    return send_file(
+        path,
+        mimetype='application/gzip' if path.endswith('.gz') else None,
+        as_attachment=True,
+        download_name=os.path.basename(payload['name']),
+        conditional=True,
+        max_age=0
+    )
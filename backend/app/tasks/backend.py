@@ -0,0 +1,97 @@
+"""
+Task backend - where async tasks run
+
+TASK_BACKEND selects how tasks are executed:
+    celery - tasks are sent to the broker and run by Celery workers
+    local  - no broker; tasks run on a bounded thread pool inside the web
+             process and results go to a SQLite result store, so the same
+             status endpoints work in development, CI and single-node setups
+
+Routes should submit and look up tasks through submit()/get_result()
+rather than calling .delay()/.AsyncResult() directly.
+
+The Celery app is built (and celery imported) on first use rather than at
+startup, so processes that never touch a task do not pay for it.
+"""
+import os
+import socket
+import threading
+from flask import current_app
+
+TASK_BACKENDS = ('celery', 'local')
+
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_celery_lock = threading.Lock()
+
+
+def init_app(app):
+    """Check the configured task backend; the Celery app is created by get_celery()"""
+    if app.config['TASK_BACKEND'] not in TASK_BACKENDS:
+        raise ValueError(f'TASK_BACKEND must be one of {list(TASK_BACKENDS)}')
+
+
+def get_celery(app=None):
+    """Return the Celery app of a Flask app (default: the current one), creating it on first use"""
+    app = app or current_app._get_current_object()
+    celery = app.extensions.get('celery')
+    if celery is None:
+        with _celery_lock:
+            celery = app.extensions.get('celery')
+            if celery is None:
+                from app.tasks.celery_config import make_celery
+                celery = app.extensions['celery'] = make_celery(app)
+    
+    return celery
+
+
+def _start_local_worker(celery, concurrency):
+    """Run a Celery worker with a thread pool in a background thread"""
+    from app.tasks.celery_config import TASK_QUEUES
+    
+    worker = celery.WorkController(
+        pool_cls='threads',
+        concurrency=concurrency,
+        queues=list(TASK_QUEUES),
+        hostname=f'local-{os.getpid()}@{socket.gethostname()}',
+        without_heartbeat=True,
+        without_mingle=True,
+        without_gossip=True,
+        loglevel='INFO'
+    )
+    threading.Thread(target=worker.start, name='local-task-worker', daemon=True).start()
+    return worker
+
+
+def _ensure_local_worker():
+    """Start this process's in-process worker on first use (and after a fork)"""
+    global _worker, _worker_pid
+    
+    if _worker is not None and _worker_pid == os.getpid():
+        return
+    
+    with _worker_lock:
+        if _worker is None or _worker_pid != os.getpid():
+            _worker = _start_local_worker(get_celery(), current_app.config['TASK_LOCAL_CONCURRENCY'])
+            _worker_pid = os.getpid()
+
+
+def submit(task, args=None, kwargs=None, **options):
+    """
+    Queue a task and return its AsyncResult.
+    
+    Never waits for the task to run: with the local backend the message is
+    handed to the in-process worker's queue and picked up by its thread pool.
+    """
+    # Shared tasks send through the default app, which get_celery() sets up
+    get_celery()
+    if current_app.config['TASK_BACKEND'] == 'local':
+        _ensure_local_worker()
+    
+    return task.apply_async(args=args, kwargs=kwargs, **options)
+
+
+def get_result(task_id):
+    """Look up a task's state and result by id"""
+    return get_celery().AsyncResult(task_id)
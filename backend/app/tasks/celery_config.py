@@ -1,35 +1,152 @@
 """
 Celery configuration
 """
+from datetime import timedelta
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
+from app.utils.results import spill_result
+
+# Queues, highest priority work first:
+#   interactive - user-facing work someone is waiting on (exports, waitlist offers)
+#   scheduled   - periodic jobs and their fan-out (reminders, monthly reports)
+#   bulk        - large admin jobs that may saturate their workers (full exports)
+TASK_QUEUES = ('interactive', 'scheduled', 'bulk')
+
+# Priorities use AMQP's scale, 9 the most urgent; make_celery() flips
+# them for Redis, where 0 is served first.
+TASK_ROUTES = {
+    'app.tasks.celery_tasks.export_patient_history': {'queue': 'interactive', 'priority': 9},
+    'app.tasks.celery_tasks.offer_freed_slot': {'queue': 'interactive', 'priority': 8},
+    'app.tasks.celery_tasks.expire_waitlist_offer': {'queue': 'interactive', 'priority': 8},
+    'app.tasks.celery_tasks.send_daily_reminders': {'queue': 'scheduled', 'priority': 5},
+    'app.tasks.celery_tasks.send_upcoming_reminders': {'queue': 'scheduled', 'priority': 5},
+    'app.tasks.celery_tasks.deliver_reminder_batch': {'queue': 'scheduled', 'priority': 5},
+    'app.tasks.celery_tasks.send_monthly_reports': {'queue': 'scheduled', 'priority': 3},
+    'app.tasks.celery_tasks.deliver_monthly_reports': {'queue': 'scheduled', 'priority': 3},
+    'app.tasks.celery_tasks.summarize_monthly_reports': {'queue': 'scheduled', 'priority': 3},
+    'app.tasks.celery_tasks.refresh_doctor_rollups': {'queue': 'scheduled', 'priority': 5},
+    'app.tasks.celery_tasks.clean_task_results': {'queue': 'scheduled', 'priority': 1},
+    'app.tasks.celery_tasks.export_hospital_data': {'queue': 'bulk', 'priority': 0},
+    'app.tasks.celery_tasks.export_data_shard': {'queue': 'bulk', 'priority': 0},
+    'app.tasks.celery_tasks.write_export_manifest': {'queue': 'bulk', 'priority': 0},
+}
+
+DEFAULT_PRIORITY = 5
+
+# Seconds added to the longest hard time limit (or ETA wait) for Redis's
+# visibility timeout, after which an unacknowledged task is redelivered
+VISIBILITY_TIMEOUT_MARGIN = 300
+
+
+def redis_priority(priority):
+    """The Redis transport's equivalent of an AMQP priority (0 highest there)"""
+    return 9 - priority
 
 
 def make_celery(app):
     """Create Celery instance"""
-    celery = Celery(
-        app.import_name,
-        broker=app.config['CELERY_BROKER_URL'],
-        backend=app.config['CELERY_RESULT_BACKEND']
+    if app.config.get('TASK_BACKEND') == 'local':
+        # No broker: messages stay in process for the embedded worker
+        # (see app.tasks.backend) and results go to a SQLite store.
+        celery = Celery(
+            app.import_name,
+            broker='memory://',
+            backend=app.config['TASK_LOCAL_RESULT_BACKEND']
+        )
+    else:
+        celery = Celery(
+            app.import_name,
+            broker=app.config['CELERY_BROKER_URL'],
+            backend=app.config['CELERY_RESULT_BACKEND']
+        )
+    
+    # Shared tasks resolve the default app, also from worker threads
+    celery.set_default()
+    
+    limits = app.config['CELERY_TIME_LIMITS']
+    
+    routes = TASK_ROUTES
+    default_priority = DEFAULT_PRIORITY
+    if celery.conf.broker_url.startswith(('redis://', 'rediss://', 'redis+socket://')):
+        routes = {
+            task_name: dict(route, priority=redis_priority(route['priority']))
+            for task_name, route in TASK_ROUTES.items()
+        }
+        default_priority = redis_priority(DEFAULT_PRIORITY)
+    
+    # With acks_late a task stays unacknowledged while it runs or waits for
+    # its ETA; Redis redelivers it once the visibility timeout passes, so the
+    # timeout must outlast the longest of both.
+    longest_wait = max(
+        max(hard for _, hard in limits.values()),
+        app.config.get('WAITLIST_HOLD_MINUTES', 30) * 60
+    )
+    
+    celery.conf.update(
+        # Routing
+        task_queues=[
+            Queue(name, routing_key=name, queue_arguments={'x-max-priority': 10})
+            for name in TASK_QUEUES
+        ],
+        task_default_queue='interactive',
+        task_routes=routes,
+        task_default_priority=default_priority,
+        # Redis emulates priorities with one list per priority step
+        broker_transport_options={
+            'priority_steps': list(range(10)),
+            'sep': ':',
+            'queue_order_strategy': 'priority',
+            'visibility_timeout': longest_wait + VISIBILITY_TIMEOUT_MARGIN,
+        },
+        # Reliability: acknowledge after the task ran so a killed worker's
+        # task is redelivered, and hand out one task at a time so a long
+        # job never sits in front of short ones in a worker's buffer.
+        task_acks_late=app.config['CELERY_ACKS_LATE'],
+        task_reject_on_worker_lost=app.config['CELERY_ACKS_LATE'],
+        worker_prefetch_multiplier=app.config['CELERY_PREFETCH_MULTIPLIER'],
+        task_soft_time_limit=limits['scheduled'][0],
+        task_time_limit=limits['scheduled'][1],
+        task_track_started=True,
+        # Results are only needed until the client has polled them
+        result_expires=app.config['CELERY_RESULT_EXPIRES'],
     )
-    celery.conf.update(app.config)
     
     # Configure periodic tasks
     celery.conf.beat_schedule = {
-        'send-daily-reminders': {
-            'task': 'app.tasks.celery_tasks.send_daily_reminders',
-            'schedule': crontab(hour=9, minute=0),  # Run daily at 9 AM
-        },
         'send-monthly-reports': {
             'task': 'app.tasks.celery_tasks.send_monthly_reports',
             'schedule': crontab(day_of_month=1, hour=0, minute=0),  # Run on 1st of each month
         },
+        'clean-task-results': {
+            'task': 'app.tasks.celery_tasks.clean_task_results',
+            'schedule': timedelta(minutes=app.config['JANITOR_INTERVAL_MINUTES']),
+        },
     }
     
+    if app.config.get('REMINDER_HOURS_BEFORE'):
+        celery.conf.beat_schedule['send-upcoming-reminders'] = {
+            'task': 'app.tasks.celery_tasks.send_upcoming_reminders',
+            'schedule': timedelta(minutes=app.config['REMINDER_SCAN_MINUTES']),
+        }
+    else:
+        celery.conf.beat_schedule['send-daily-reminders'] = {
+            'task': 'app.tasks.celery_tasks.send_daily_reminders',
+            'schedule': crontab(hour=9, minute=0),  # Run daily at 9 AM
+        }
+    
+    # Per-task soft/hard time limits by queue, plus notifier throttling
+    annotations = {}
+    for task_name, route in TASK_ROUTES.items():
+        soft, hard = limits[route['queue']]
+        annotations[task_name] = {'soft_time_limit': soft, 'time_limit': hard}
+    annotations['app.tasks.celery_tasks.deliver_reminder_batch']['rate_limit'] = app.config.get('REMINDER_RATE_LIMIT')
+    celery.conf.task_annotations = annotations
+    
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
             with app.app_context():
-                return self.run(*args, **kwargs)
+                return spill_result(self.request.id, self.run(*args, **kwargs))
     
     celery.Task = ContextTask
     return celery
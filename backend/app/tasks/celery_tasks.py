@@ -1,18 +1,81 @@
 """
 Celery tasks for async operations
 """
-from celery import shared_task
-from app.models import db, Appointment, Treatment, Doctor, Patient
-from datetime import datetime, date
-import csv
-import io
+from celery import shared_task, chord
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import func, or_
+from app.models import db, User, Appointment, Treatment, Doctor, DoctorMonthlyStats, Patient, WaitlistEntry
+from app.utils.notifications import NotificationError, get_notifier
+from app.utils.progress import ProgressReporter
+from app.utils.results import load_result, reclaim_results, reclaim_files
+from app.utils.rollups import refresh_doctor_months
+from app.utils.bulk_export import plan_partitions, export_shard, build_manifest
+from app.utils.storage import write_csv_gz, write_json
+from app.utils.waitlist import offer_slot, clear_offer, notify_slot_freed
+from datetime import datetime, date, timedelta
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(name='app.tasks.celery_tasks.export_patient_history')
-def export_patient_history(patient_id):
+EXPORT_HEADER = [
+    'Date', 'Doctor', 'Department', 'Symptoms',
+    'Diagnosis', 'Prescription', 'Follow-up Date', 'Notes'
+]
+
+
+def treatment_history_rows(patient_id):
+    """Stream a patient's treatment history as CSV rows"""
+    query = db.session.query(
+        Treatment.visit_date,
+        Doctor.name,
+        Doctor.specialization,
+        Treatment.symptoms,
+        Treatment.diagnosis,
+        Treatment.prescription,
+        Treatment.follow_up_date,
+        Treatment.notes
+    ).outerjoin(
+        Doctor, Treatment.doctor_id == Doctor.id
+    ).filter(
+        Treatment.patient_id == patient_id
+    ).order_by(
+        Treatment.visit_date.desc()
+    ).yield_per(current_app.config.get('EXPORT_CHUNK_SIZE', 1000))
+    
+    for row in query:
+        yield [
+            row.visit_date.isoformat() if row.visit_date else '',
+            row.name or '',
+            row.specialization or '',
+            row.symptoms,
+            row.diagnosis,
+            row.prescription,
+            row.follow_up_date.isoformat() if row.follow_up_date else '',
+            row.notes or ''
+        ]
+
+
+def patient_history_version(patient_id):
+    """
+    Fingerprint a patient's treatment set
+    
+    Any insert, update or delete changes the row count or max(updated_at),
+    so identical fingerprints mean an identical export.
+    """
+    count, last_updated = db.session.query(
+        func.count(Treatment.id),
+        func.max(Treatment.updated_at)
+    ).filter(Treatment.patient_id == patient_id).one()
+    
+    return hashlib.sha1(f'{patient_id}:{count}:{last_updated}'.encode()).hexdigest()[:16]
+
+
+@shared_task(bind=True, name='app.tasks.celery_tasks.export_patient_history')
+def export_patient_history(self, patient_id, version=None):
     """
     Export patient's treatment history to CSV
     Task 1: User-triggered CSV export
@@ -20,48 +83,24 @@ def export_patient_history(patient_id):
     try:
         logger.info(f'Exporting history for patient {patient_id}')
         
-        # Query patient treatments
-        treatments = Treatment.query.filter_by(patient_id=patient_id).order_by(
-            Treatment.visit_date.desc()
-        ).all()
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
+        # Stream rows into a gzip file; only the file metadata goes into
+        # the result backend. Files are named by data version, so an
+        # unchanged history maps to the same file.
+        total = Treatment.query.filter_by(patient_id=patient_id).count()
+        progress = ProgressReporter(self, total, patient_id=patient_id)
         
-        # Write header
-        writer.writerow([
-            'Date', 'Doctor', 'Department', 'Symptoms', 
-            'Diagnosis', 'Prescription', 'Follow-up Date', 'Notes'
-        ])
+        file_info = write_csv_gz(
+            f'patient-{patient_id}-{version or self.request.id}.csv.gz',
+            EXPORT_HEADER,
+            progress.track(treatment_history_rows(patient_id))
+        )
         
-        # Write data
-        for treatment in treatments:
-            writer.writerow([
-                treatment.visit_date.isoformat() if treatment.visit_date else '',
-                treatment.doctor.name if treatment.doctor else '',
-                treatment.doctor.specialization if treatment.doctor else '',
-                treatment.symptoms,
-                treatment.diagnosis,
-                treatment.prescription,
-                treatment.follow_up_date.isoformat() if treatment.follow_up_date else '',
-                treatment.notes or ''
-            ])
-        
-        csv_content = output.getvalue()
-        output.close()
-        
-        logger.info(f'Successfully exported history for patient {patient_id}')
-        
-        # In a real application, you would:
-        # 1. Save the CSV to a file storage (S3, local storage, etc.)
-        # 2. Send an email to the patient with the download link
-        # 3. Or use a notification system (Google Chat webhook, etc.)
+        logger.info(f'Successfully exported {file_info["row_count"]} rows for patient {patient_id}')
         
         return {
             'status': 'success',
             'patient_id': patient_id,
-            'csv_content': csv_content,
+            'file': file_info,
             'message': 'CSV export completed successfully'
         }
     
@@ -74,6 +113,132 @@ def export_patient_history(patient_id):
         }
 
 
+def reminder_rows(*criteria):
+    """
+    Query reminder recipients as a single joined projection, in id order
+    
+    Patient email and doctor name come from the join, so no per-row lazy
+    loads are issued.
+    """
+    return db.session.query(
+        Appointment.id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Patient.name.label('patient_name'),
+        User.email.label('patient_email'),
+        Doctor.name.label('doctor_name')
+    ).join(
+        Patient, Appointment.patient_id == Patient.id
+    ).join(
+        User, Patient.user_id == User.id
+    ).join(
+        Doctor, Appointment.doctor_id == Doctor.id
+    ).filter(
+        Appointment.status == 'scheduled',
+        *criteria
+    ).order_by(Appointment.id)
+
+
+def reminder_unclaimed():
+    """
+    Criterion for reminders that are not queued and not sent
+    
+    A claim older than REMINDER_CLAIM_TIMEOUT_MINUTES counts as unclaimed:
+    its batch was lost (e.g. the broker dropped it or a worker died) before
+    the reminder was sent or released.
+    """
+    timeout = timedelta(minutes=current_app.config.get('REMINDER_CLAIM_TIMEOUT_MINUTES', 60))
+    return db.and_(
+        or_(
+            Appointment.reminder_queued_at.is_(None),
+            Appointment.reminder_queued_at < datetime.utcnow() - timeout
+        ),
+        Appointment.reminder_sent_at.is_(None)
+    )
+
+
+def claim_reminders(appointment_ids):
+    """
+    Mark appointments as queued for a reminder; returns the ids this call claimed
+    
+    The conditional update skips rows another scan has already claimed, so
+    overlapping scans never queue the same reminder twice.
+    """
+    stamp = datetime.utcnow()
+    Appointment.query.filter(
+        Appointment.id.in_(appointment_ids),
+        reminder_unclaimed()
+    ).update({Appointment.reminder_queued_at: stamp}, synchronize_session=False)
+    db.session.commit()
+    
+    return {
+        appointment_id for (appointment_id,) in db.session.query(Appointment.id).filter(
+            Appointment.id.in_(appointment_ids),
+            Appointment.reminder_queued_at == stamp
+        )
+    }
+
+
+def release_reminders(appointment_ids):
+    """Undo claim_reminders() for a batch that could not be queued"""
+    Appointment.query.filter(
+        Appointment.id.in_(appointment_ids),
+        Appointment.reminder_sent_at.is_(None)
+    ).update({Appointment.reminder_queued_at: None}, synchronize_session=False)
+    db.session.commit()
+
+
+def queue_reminder_batch(batch):
+    """Claim a batch of reminders and queue the claimed ones for delivery"""
+    claimed = claim_reminders([reminder['appointment_id'] for reminder in batch])
+    batch = [reminder for reminder in batch if reminder['appointment_id'] in claimed]
+    if not batch:
+        return 0
+    
+    try:
+        deliver_reminder_batch.delay(batch)
+    except Exception:
+        release_reminders(list(claimed))
+        raise
+    return len(batch)
+
+
+def dispatch_reminders(query):
+    """
+    Page through reminder rows and queue one delivery sub-task per batch
+    
+    Pages are read by id (keyset) rather than from one streamed cursor,
+    because claiming each batch commits.
+    """
+    batch_size = current_app.config.get('REMINDER_BATCH_SIZE', 100)
+    last_id = 0
+    total = 0
+    batches = 0
+    
+    while True:
+        rows = query.filter(Appointment.id > last_id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        queued = queue_reminder_batch([
+            {
+                'appointment_id': row.id,
+                'appointment_date': row.appointment_date.isoformat(),
+                'appointment_time': row.appointment_time,
+                'patient_name': row.patient_name,
+                'patient_email': row.patient_email,
+                'doctor_name': row.doctor_name
+            }
+            for row in rows
+        ])
+        if queued:
+            total += queued
+            batches += 1
+    
+    return total, batches
+
+
 @shared_task(name='app.tasks.celery_tasks.send_daily_reminders')
 def send_daily_reminders():
     """
@@ -83,41 +248,19 @@ def send_daily_reminders():
     try:
         logger.info('Running daily appointment reminders')
         
-        # Get today's appointments
         today = date.today()
-        appointments = Appointment.query.filter_by(
-            appointment_date=today,
-            status='scheduled'
-        ).all()
-        
-        reminder_count = 0
-        
-        for appointment in appointments:
-            try:
-                patient_email = appointment.patient.user.email if appointment.patient and appointment.patient.user else None
-                doctor_name = appointment.doctor.name if appointment.doctor else 'Doctor'
-                
-                if patient_email:
-                    # In a real application, send email/SMS/notification here
-                    logger.info(
-                        f'Reminder sent to {patient_email} for appointment with '
-                        f'{doctor_name} at {appointment.appointment_time}'
-                    )
-                    reminder_count += 1
-                    
-                    # Example: Send via Google Chat webhook
-                    # send_chat_notification(patient_email, appointment)
-                    
-            except Exception as e:
-                logger.error(f'Error sending reminder for appointment {appointment.id}: {str(e)}')
-        
-        logger.info(f'Sent {reminder_count} reminders for {len(appointments)} appointments')
+        total, batches = dispatch_reminders(reminder_rows(
+            Appointment.appointment_date == today,
+            reminder_unclaimed()
+        ))
+        
+        logger.info(f'Queued reminders for {total} appointments in {batches} batches')
         
         return {
             'status': 'success',
             'date': today.isoformat(),
-            'total_appointments': len(appointments),
-            'reminders_sent': reminder_count
+            'total_appointments': total,
+            'batches': batches
         }
     
     except Exception as e:
@@ -128,78 +271,207 @@ def send_daily_reminders():
         }
 
 
-@shared_task(name='app.tasks.celery_tasks.send_monthly_reports')
-def send_monthly_reports():
+@shared_task(name='app.tasks.celery_tasks.send_upcoming_reminders')
+def send_upcoming_reminders():
+    """
+    Send reminders for appointments starting within REMINDER_HOURS_BEFORE hours
+    Task 2b: Scheduled task - runs every REMINDER_SCAN_MINUTES when enabled
+    """
+    try:
+        hours_before = current_app.config.get('REMINDER_HOURS_BEFORE', 0)
+        now = datetime.now()
+        horizon = now + timedelta(hours=hours_before)
+        
+        # Range scan on the scheduled_at index; rows are claimed (reminder_queued_at)
+        # before their batch is queued, so overlapping scans never send twice.
+        total, batches = dispatch_reminders(reminder_rows(
+            Appointment.scheduled_at > now,
+            Appointment.scheduled_at <= horizon,
+            reminder_unclaimed()
+        ))
+        
+        logger.info(f'Queued reminders for {total} appointments before {horizon.isoformat()}')
+        
+        return {
+            'status': 'success',
+            'until': horizon.isoformat(),
+            'total_appointments': total,
+            'batches': batches
+        }
+    
+    except Exception as e:
+        logger.error(f'Error in upcoming reminders task: {str(e)}')
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+
+@shared_task(bind=True, name='app.tasks.celery_tasks.deliver_reminder_batch', max_retries=5)
+def deliver_reminder_batch(self, reminders):
+    """
+    Deliver one batch of reminders through the configured notifier
+    
+    Delivered reminders are marked immediately; only the ones failing with
+    a NotificationError are retried, with exponential backoff. Any other
+    error is logged for that recipient and its claim released, so the next
+    scan picks it up again without affecting the rest.
+    """
+    notifier = get_notifier()
+    delivered = []
+    failed = []
+    errors = []
+    
+    for reminder in reminders:
+        try:
+            notifier.send(
+                reminder['patient_email'],
+                'Appointment Reminder',
+                f'Hi {reminder["patient_name"]}, this is a reminder of your appointment with '
+                f'{reminder["doctor_name"]} on {reminder["appointment_date"]} at {reminder["appointment_time"]}.'
+            )
+            delivered.append(reminder['appointment_id'])
+        except NotificationError as e:
+            logger.warning(f'Reminder for appointment {reminder["appointment_id"]} failed: {e}')
+            failed.append(reminder)
+        except Exception as e:
+            logger.error(f'Reminder for appointment {reminder["appointment_id"]} failed unexpectedly: {e}')
+            errors.append(reminder['appointment_id'])
+    
+    if delivered:
+        Appointment.query.filter(Appointment.id.in_(delivered)).update(
+            {Appointment.reminder_sent_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+    
+    if errors:
+        release_reminders(errors)
+    
+    if failed:
+        if self.request.retries >= self.max_retries:
+            logger.error(f'Giving up on {len(failed)} reminders after {self.request.retries} retries')
+        else:
+            countdown = min(30 * 2 ** self.request.retries, 600)
+            raise self.retry(args=[failed], countdown=countdown)
+    
+    return {
+        'delivered': len(delivered),
+        'failed': len(failed),
+        'errors': len(errors)
+    }
+
+
+def last_month_bounds(today=None):
+    """Return the first and last day of the previous calendar month"""
+    today = today or date.today()
+    first_day_this_month = today.replace(day=1)
+    last_day_last_month = first_day_this_month - timedelta(days=1)
+    first_day_last_month = last_day_last_month.replace(day=1)
+    return first_day_last_month, last_day_last_month
+
+
+def collect_monthly_reports(month):
+    """
+    Build every doctor's monthly report from the doctor_monthly_stats rollup
+    
+    The rollup is kept current on every appointment/treatment change, so
+    this reads one row per doctor instead of aggregating a month of data.
+    """
+    rows = db.session.query(
+        Doctor.id, Doctor.name, Doctor.specialization, User.email,
+        DoctorMonthlyStats.total_appointments,
+        DoctorMonthlyStats.completed_appointments,
+        DoctorMonthlyStats.cancelled_appointments,
+        DoctorMonthlyStats.treatment_records,
+        DoctorMonthlyStats.unique_patients
+    ).outerjoin(
+        User, Doctor.user_id == User.id
+    ).outerjoin(
+        DoctorMonthlyStats,
+        (DoctorMonthlyStats.doctor_id == Doctor.id) & (DoctorMonthlyStats.month == month)
+    ).order_by(Doctor.id).all()
+    
+    label = month.strftime('%B %Y')
+    
+    return [
+        {
+            'doctor_id': row.id,
+            'doctor_name': row.name,
+            'doctor_email': row.email,
+            'month': label,
+            'total_appointments': row.total_appointments or 0,
+            'completed_appointments': row.completed_appointments or 0,
+            'cancelled_appointments': row.cancelled_appointments or 0,
+            'treatment_records': row.treatment_records or 0,
+            'unique_patients': row.unique_patients or 0,
+            'specialization': row.specialization
+        }
+        for row in rows
+    ]
+
+
+def render_monthly_report(report):
+    """Render a doctor's monthly report as HTML"""
+    return (
+        f'<h2>Monthly Activity Report - {escape(report["month"])}</h2>'
+        f'<p>{escape(report["doctor_name"])} ({escape(report["specialization"])})</p>'
+        '<table>'
+        f'<tr><td>Total appointments</td><td>{report["total_appointments"]}</td></tr>'
+        f'<tr><td>Completed</td><td>{report["completed_appointments"]}</td></tr>'
+        f'<tr><td>Cancelled</td><td>{report["cancelled_appointments"]}</td></tr>'
+        f'<tr><td>Treatment records</td><td>{report["treatment_records"]}</td></tr>'
+        f'<tr><td>Unique patients</td><td>{report["unique_patients"]}</td></tr>'
+        '</table>'
+    )
+
+
+@shared_task(bind=True, name='app.tasks.celery_tasks.send_monthly_reports')
+def send_monthly_reports(self):
     """
     Send monthly activity reports to doctors
     Task 3: Scheduled task - runs on 1st of each month
     """
     try:
         logger.info('Running monthly doctor reports')
+        timings = {}
+        ProgressReporter(self, phase='aggregate').update(0, force=True)
+        
+        started = time.perf_counter()
+        first_day, last_day = last_month_bounds()
+        reports = collect_monthly_reports(first_day)
+        timings['aggregate_seconds'] = round(time.perf_counter() - started, 4)
+        
+        progress = ProgressReporter(self, len(reports), phase='dispatch')
+        progress.update(0, force=True)
         
-        # Get all doctors
-        doctors = Doctor.query.all()
-        
-        reports_sent = 0
-        
-        for doctor in doctors:
-            try:
-                # Get doctor's appointments from last month
-                from datetime import timedelta
-                from dateutil.relativedelta import relativedelta
-                
-                today = date.today()
-                first_day_this_month = today.replace(day=1)
-                last_day_last_month = first_day_this_month - timedelta(days=1)
-                first_day_last_month = last_day_last_month.replace(day=1)
-                
-                appointments = Appointment.query.filter(
-                    Appointment.doctor_id == doctor.id,
-                    Appointment.appointment_date >= first_day_last_month,
-                    Appointment.appointment_date <= last_day_last_month
-                ).all()
-                
-                completed = sum(1 for apt in appointments if apt.status == 'completed')
-                cancelled = sum(1 for apt in appointments if apt.status == 'cancelled')
-                
-                # Get treatments created
-                treatments = Treatment.query.filter(
-                    Treatment.doctor_id == doctor.id,
-                    Treatment.visit_date >= first_day_last_month,
-                    Treatment.visit_date <= last_day_last_month
-                ).count()
-                
-                # Generate report
-                report = {
-                    'doctor_name': doctor.name,
-                    'month': last_day_last_month.strftime('%B %Y'),
-                    'total_appointments': len(appointments),
-                    'completed_appointments': completed,
-                    'cancelled_appointments': cancelled,
-                    'treatment_records': treatments,
-                    'specialization': doctor.specialization
-                }
-                
-                doctor_email = doctor.user.email if doctor.user else None
-                
-                if doctor_email:
-                    # In a real application, send HTML/PDF report via email
-                    logger.info(f'Monthly report sent to {doctor_email}')
-                    reports_sent += 1
-                    
-                    # Example: Generate HTML report and email it
-                    # html_report = generate_html_report(report)
-                    # send_email(doctor_email, 'Monthly Activity Report', html_report)
-                    
-            except Exception as e:
-                logger.error(f'Error generating report for doctor {doctor.id}: {str(e)}')
-        
-        logger.info(f'Sent {reports_sent} monthly reports to {len(doctors)} doctors')
+        # Fan out rendering and delivery in chunks; the chord callback
+        # totals what the chunk tasks actually delivered. The callback is
+        # signed before dispatch finishes, so it gets the wall-clock start
+        # (perf_counter is per process) and times the fan-out itself.
+        started = time.perf_counter()
+        dispatch_started = time.time()
+        chunk_size = current_app.config.get('MONTHLY_REPORT_CHUNK_SIZE', 50)
+        chunks = [reports[i:i + chunk_size] for i in range(0, len(reports), chunk_size)]
+        
+        summary_id = None
+        if chunks:
+            summary = chord(
+                deliver_monthly_reports.s(chunk) for chunk in chunks
+            )(summarize_monthly_reports.s(timings, dispatch_started))
+            summary_id = summary.id
+        timings['dispatch_seconds'] = round(time.perf_counter() - started, 4)
+        progress.update(len(reports), force=True)
+        
+        logger.info(f'Queued {len(reports)} monthly reports in {len(chunks)} chunks')
         
         return {
             'status': 'success',
-            'total_doctors': len(doctors),
-            'reports_sent': reports_sent
+            'month': last_day.strftime('%B %Y'),
+            'total_doctors': len(reports),
+            'chunks': len(chunks),
+            'summary_task_id': summary_id,
+            'timings': timings
         }
     
     except Exception as e:
@@ -208,3 +480,278 @@ def send_monthly_reports():
             'status': 'error',
             'error': str(e)
         }
+
+
+@shared_task(name='app.tasks.celery_tasks.deliver_monthly_reports')
+def deliver_monthly_reports(reports):
+    """Render and deliver one chunk of monthly reports"""
+    render_seconds = 0.0
+    deliver_seconds = 0.0
+    reports_sent = 0
+    
+    for report in reports:
+        try:
+            started = time.perf_counter()
+            html_report = render_monthly_report(report)
+            render_seconds += time.perf_counter() - started
+            
+            if report['doctor_email']:
+                started = time.perf_counter()
+                # In a real application, send the HTML report via email
+                # send_email(report['doctor_email'], 'Monthly Activity Report', html_report)
+                logger.info(f'Monthly report sent to {report["doctor_email"]} ({len(html_report)} bytes)')
+                deliver_seconds += time.perf_counter() - started
+                reports_sent += 1
+        
+        except Exception as e:
+            logger.error(f'Error delivering report for doctor {report["doctor_id"]}: {str(e)}')
+    
+    return {
+        'reports': len(reports),
+        'reports_sent': reports_sent,
+        'render_seconds': render_seconds,
+        'deliver_seconds': deliver_seconds
+    }
+
+
+@shared_task(name='app.tasks.celery_tasks.summarize_monthly_reports')
+def summarize_monthly_reports(chunk_results, timings, dispatch_started=None):
+    """
+    Chord callback - combine chunk results into the run summary
+    dispatch_seconds here runs from the start of dispatch until the last chunk finished
+    """
+    # Header results are spilled like any other once they grow too large
+    chunk_results = [load_result(result) for result in chunk_results]
+    total_doctors = sum(result['reports'] for result in chunk_results)
+    reports_sent = sum(result['reports_sent'] for result in chunk_results)
+    
+    timings = dict(timings)
+    timings['render_seconds'] = round(sum(result['render_seconds'] for result in chunk_results), 4)
+    timings['deliver_seconds'] = round(sum(result['deliver_seconds'] for result in chunk_results), 4)
+    if dispatch_started is not None:
+        timings['dispatch_seconds'] = round(time.time() - dispatch_started, 4)
+    
+    logger.info(f'Sent {reports_sent} monthly reports to {total_doctors} doctors')
+    
+    return {
+        'status': 'success',
+        'total_doctors': total_doctors,
+        'reports_sent': reports_sent,
+        'chunks': len(chunk_results),
+        'timings': timings
+    }
+
+
+@shared_task(name='app.tasks.celery_tasks.offer_freed_slot')
+def offer_freed_slot(doctor_id, appointment_date, appointment_time, exclude_patient_ids=None):
+    """
+    Offer a freed appointment slot to the next waitlisted patient
+    Task 4: Event-triggered - runs when a slot is cancelled or released
+    """
+    try:
+        slot_date = date.fromisoformat(appointment_date)
+        entry = offer_slot(doctor_id, slot_date, appointment_time, exclude_patient_ids)
+        
+        if not entry:
+            logger.info(f'No waitlist match for doctor {doctor_id} at {appointment_date} {appointment_time}')
+            return {
+                'status': 'success',
+                'offered': False
+            }
+        
+        # Release the hold if the patient does not respond in time
+        hold_minutes = current_app.config.get('WAITLIST_HOLD_MINUTES', 30)
+        expire_waitlist_offer.apply_async(
+            args=[entry.id, exclude_patient_ids or []],
+            countdown=hold_minutes * 60
+        )
+        
+        patient_email = entry.patient.user.email if entry.patient and entry.patient.user else None
+        if patient_email:
+            # In a real application, notify the patient by email/SMS here
+            logger.info(
+                f'Waitlist offer sent to {patient_email} for {appointment_date} '
+                f'{appointment_time} (expires {entry.offer_expires_at.isoformat()})'
+            )
+        
+        return {
+            'status': 'success',
+            'offered': True,
+            'waitlist_entry_id': entry.id
+        }
+    
+    except Exception as e:
+        logger.error(f'Error offering slot for doctor {doctor_id}: {str(e)}')
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+
+@shared_task(name='app.tasks.celery_tasks.expire_waitlist_offer')
+def expire_waitlist_offer(entry_id, exclude_patient_ids=None):
+    """
+    Expire an unanswered waitlist offer and pass the slot on
+    Task 5: Delayed task - runs when an offer's hold timeout elapses
+    """
+    try:
+        entry = WaitlistEntry.query.get(entry_id)
+        
+        if not entry or entry.status != 'offered' or entry.offer_expires_at > datetime.utcnow():
+            return {
+                'status': 'success',
+                'expired': False
+            }
+        
+        doctor_id = entry.offered_doctor_id
+        slot_date = entry.offered_date
+        slot_time = entry.offered_time
+        
+        # The patient keeps their place for later slots
+        clear_offer(entry, 'waiting')
+        db.session.commit()
+        
+        logger.info(f'Waitlist offer {entry_id} expired, offering slot to next patient')
+        notify_slot_freed(doctor_id, slot_date, slot_time, (exclude_patient_ids or []) + [entry.patient_id])
+        
+        return {
+            'status': 'success',
+            'expired': True
+        }
+    
+    except Exception as e:
+        logger.error(f'Error expiring waitlist offer {entry_id}: {str(e)}')
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+
+@shared_task(bind=True, name='app.tasks.celery_tasks.export_hospital_data')
+def export_hospital_data(self, entities, fmt='csv', partition_by='id', partition_size=100000):
+    """
+    Export full appointment/treatment tables as compressed shards
+    Task 6: Admin-triggered bulk export
+    """
+    try:
+        export_name = f'hospital-{self.request.id}'
+        logger.info(f'Planning bulk export {export_name} of {", ".join(entities)}')
+        
+        shards = []
+        for entity in entities:
+            for start, end in plan_partitions(entity, partition_by, partition_size):
+                shards.append(export_data_shard.s(
+                    export_name, entity, fmt, partition_by, start, end, len(shards)
+                ))
+        
+        if not shards:
+            write_json(f'{export_name}/manifest.json', build_manifest(export_name, fmt, partition_by, []))
+            return {
+                'status': 'success',
+                'export': export_name,
+                'shards': []
+            }
+        
+        # Shards run in parallel across workers; the chord callback writes
+        # the manifest once every shard has finished.
+        manifest = chord(shards)(write_export_manifest.s(export_name, fmt, partition_by))
+        
+        return {
+            'status': 'success',
+            'export': export_name,
+            'manifest_task_id': manifest.id,
+            'shards': [
+                {'entity': shard.args[1], 'index': shard.args[6], 'task_id': child.id}
+                for shard, child in zip(shards, manifest.parent.results)
+            ]
+        }
+    
+    except Exception as e:
+        logger.error(f'Error starting bulk export: {str(e)}')
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+
+@shared_task(bind=True, name='app.tasks.celery_tasks.export_data_shard')
+def export_data_shard(self, export_name, entity, fmt, partition_by, start, end, index):
+    """Export one partition of a bulk export, reporting rows written as progress"""
+    progress = ProgressReporter(self, entity=entity, index=index)
+    shard = export_shard(export_name, entity, fmt, partition_by, start, end, index, progress.update)
+    logger.info(f'Exported {shard["row_count"]} {entity} rows to {shard["file"]}')
+    return shard
+
+
+@shared_task(name='app.tasks.celery_tasks.write_export_manifest')
+def write_export_manifest(shards, export_name, fmt, partition_by):
+    """Chord callback - write the manifest of a finished bulk export"""
+    shards = [load_result(shard) for shard in shards]
+    manifest = build_manifest(export_name, fmt, partition_by, shards)
+    path = write_json(f'{export_name}/manifest.json', manifest)
+    
+    logger.info(f'Bulk export {export_name} complete: {manifest["totals"]}')
+    
+    return {
+        'status': 'success',
+        'export': export_name,
+        'manifest': f'{export_name}/manifest.json',
+        'path': path,
+        'totals': manifest['totals']
+    }
+
+
+@shared_task(bind=True, name='app.tasks.celery_tasks.clean_task_results')
+def clean_task_results(self):
+    """
+    Reclaim orphaned task results and stale export files
+    Task 7: Scheduled task - runs every JANITOR_INTERVAL_MINUTES
+    """
+    try:
+        result_expires = current_app.config['CELERY_RESULT_EXPIRES']
+        
+        results = reclaim_results(self.backend, result_expires)
+        files = reclaim_files(
+            export_max_age=current_app.config['EXPORT_RETENTION_HOURS'] * 3600,
+            result_max_age=result_expires
+        )
+        
+        logger.info(
+            f'Janitor: {results["orphaned"]} orphaned results ({results["deleted"]} deleted, '
+            f'{results["bytes"]} bytes), {files["deleted"]} files ({files["bytes"]} bytes) removed'
+        )
+        
+        return {
+            'status': 'success',
+            'results': results,
+            'files': files
+        }
+    
+    except Exception as e:
+        logger.error(f'Error cleaning task results: {str(e)}')
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+
+@shared_task(name='app.tasks.celery_tasks.refresh_doctor_rollups', ignore_result=True)
+def refresh_doctor_rollups(keys):
+    """
+    Recompute the doctor monthly rollups touched by a committed change
+    Task 8: Event-triggered - queued after each appointment/treatment commit
+    """
+    keys = [(doctor_id, date.fromisoformat(month)) for doctor_id, month in keys]
+    try:
+        refresh_doctor_months(keys)
+        return {
+            'status': 'success',
+            'refreshed': len(keys)
+        }
+    
+    except Exception as e:
+        logger.error(f'Error refreshing doctor rollups {keys}: {str(e)}')
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
@@ -1,32 +1,84 @@
 """
 Authentication and authorization utilities
 """
+from collections import namedtuple
 from functools import wraps
-from flask import jsonify
-from flask_jwt_extended import verify_jwt_in_request, get_jwt
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import jsonify, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt, get_jwt_identity
+from app.models import db, Doctor, Patient
+from app.utils.timing import phase
 
+# The authenticated caller, decoded from the access token once per request
+Principal = namedtuple('Principal', ['user_id', 'role', 'profile_id'])
 
-def hash_password(password):
-    """Hash a password"""
-    return generate_password_hash(password)
+# Memoized on the request environ rather than g: g belongs to the app
+# context, which requests made inside an existing one (tests) share
+PRINCIPAL_ENVIRON_KEY = 'hms.principal'
 
+PROFILE_MODELS = {
+    'doctor': Doctor,
+    'patient': Patient
+}
 
-def verify_password(password_hash, password):
-    """Verify a password against a hash"""
-    return check_password_hash(password_hash, password)
 
+def profile_id_for(user_id, role):
+    """Return the id of a user's doctor/patient profile, or None"""
+    model = PROFILE_MODELS.get(role)
+    if model is None:
+        return None
+    return db.session.query(model.id).filter(model.user_id == user_id).scalar()
 
-def role_required(*roles):
-    """Decorator to require specific roles"""
+
+def token_claims(role, profile_id):
+    """Additional claims carried by access/refresh tokens"""
+    return {'role': role, 'profile_id': profile_id}
+
+
+def get_principal(optional=False, locations=None):
+    """
+    Return the request's Principal, decoding the access token at most once.
+    
+    The principal is memoized per request, so the rate limiter, the role
+    decorators and the handler all share a single decode. Tokens issued
+    before the profile_id claim existed cost one profile lookup instead. A
+    missing token returns None if optional, otherwise raises like
+    jwt_required() would.
+    """
+    principal = request.environ.get(PRINCIPAL_ENVIRON_KEY)
+    if principal is not None:
+        return principal
+    
+    with phase('auth'):
+        if verify_jwt_in_request(optional=optional, locations=locations) is None:
+            return None
+        
+        claims = get_jwt()
+        user_id = get_jwt_identity()
+        role = claims.get('role')
+        profile_id = claims['profile_id'] if 'profile_id' in claims else profile_id_for(user_id, role)
+    
+    principal = Principal(user_id, role, profile_id)
+    request.environ[PRINCIPAL_ENVIRON_KEY] = principal
+    return principal
+
+
+def current_profile():
+    """Load the logged-in doctor's or patient's profile row, or None"""
+    principal = get_principal()
+    model = PROFILE_MODELS.get(principal.role)
+    if model is None or principal.profile_id is None:
+        return None
+    return db.session.get(model, principal.profile_id)
+
+
+def role_required(*roles, locations=None):
+    """Decorator to require a valid access token with one of the given roles"""
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
-            verify_jwt_in_request()
-            claims = get_jwt()
-            user_role = claims.get('role')
+            principal = get_principal(locations=locations)
             
-            if user_role not in roles:
+            if principal is None or (roles and principal.role not in roles):
                 return jsonify({'error': 'Unauthorized access'}), 403
             
             return fn(*args, **kwargs)
@@ -34,6 +86,11 @@ def role_required(*roles):
     return wrapper
 
 
+def login_required(fn):
+    """Decorator to require a valid access token of any role"""
+    return role_required()(fn)
+
+
 def admin_required(fn):
     """Decorator to require admin role"""
     return role_required('admin')(fn)
@@ -0,0 +1,167 @@
+"""
+Batch dispatch - run several API calls from one HTTP request
+
+Each sub-request is dispatched through the app like a normal request
+(routing, before/after_request hooks, rate limits, error handlers), but
+inherits the batch's already-decoded principal instead of verifying the
+token again. Sub-requests run one after another inside the batch's app
+context and so share its database session. A batch of only GETs may ask
+to run in parallel instead: each sub-request then runs on a worker thread
+with an app context (and session) of its own. Batches do not nest: paths
+are matched against the URL map as the app will route them, and
+sub-requests are marked so a batch dispatched as one refuses to run.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+from flask import current_app, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from app.utils.auth import PRINCIPAL_ENVIRON_KEY
+from app.utils.timing import TIMINGS_ENVIRON_KEY
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+READ_ONLY_METHODS = ('GET',)
+
+BATCH_ENDPOINT = 'batch.batch'
+
+# Set on sub-request environs; a batch dispatched as one is refused
+SUBREQUEST_ENVIRON_KEY = 'hms.batch_subrequest'
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Return this process's batch pool, creating it on first use (and after a fork)"""
+    global _pool, _pool_pid
+    
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('BATCH_WORKERS', 4),
+                    thread_name_prefix='batch'
+                )
+                _pool_pid = os.getpid()
+    
+    return _pool
+
+
+def parse_batch(data):
+    """
+    Validate a batch body into a list of sub-request dicts
+    
+    Raises ValueError with a client-facing message on malformed input.
+    """
+    if request.environ.get(SUBREQUEST_ENVIRON_KEY):
+        raise ValueError('Batches cannot be nested')
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list):
+        raise ValueError('requests must be a list')
+    
+    items = data['requests']
+    max_requests = current_app.config.get('BATCH_MAX_REQUESTS', 20)
+    if not items:
+        raise ValueError('requests must not be empty')
+    if len(items) > max_requests:
+        raise ValueError(f'At most {max_requests} requests per batch')
+    
+    subrequests = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f'requests[{index}] must be an object')
+        
+        method = str(item.get('method', 'GET')).upper()
+        path = item.get('path')
+        if method not in BATCH_METHODS:
+            raise ValueError(f'requests[{index}].method must be one of {list(BATCH_METHODS)}')
+        if not isinstance(path, str) or not path.startswith('/api/'):
+            raise ValueError(f'requests[{index}].path must start with /api/')
+        if _endpoint(path, method) == BATCH_ENDPOINT:
+            raise ValueError(f'requests[{index}] must not be a batch')
+        
+        subrequests.append({
+            'id': item.get('id', index),
+            'method': method,
+            'path': path,
+            'body': item.get('body')
+        })
+    
+    return subrequests
+
+
+def _endpoint(path, method):
+    """The endpoint a sub-request path routes to, as the app will match it, or None"""
+    adapter = current_app.url_map.bind_to_environ(request.environ)
+    try:
+        endpoint, _ = adapter.match(unquote(path.split('?', 1)[0]), method)
+    except HTTPException:
+        return None  # the sub-request gets the 404/405/redirect itself
+    return endpoint
+
+
+def _environ(subrequest, principal):
+    """Build a sub-request's WSGI environ from the batch request"""
+    builder = EnvironBuilder(
+        path=subrequest['path'],
+        base_url=request.host_url,
+        method=subrequest['method'],
+        json=subrequest['body'],
+        headers={'Authorization': request.headers.get('Authorization', '')},
+        environ_base={'REMOTE_ADDR': request.remote_addr}
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    
+    environ[PRINCIPAL_ENVIRON_KEY] = principal
+    environ[SUBREQUEST_ENVIRON_KEY] = True
+    # Sub-requests' SQL, cache and encoding time count towards the batch
+    timings = request.environ.get(TIMINGS_ENVIRON_KEY)
+    if timings is not None:
+        environ[TIMINGS_ENVIRON_KEY] = timings
+    return environ
+
+
+def _run(app, subrequest, environ):
+    with app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception:
+            app.logger.exception(f'Batch sub-request {subrequest["method"]} {subrequest["path"]} failed')
+            return {'id': subrequest['id'], 'status': 500, 'body': {'error': 'Internal server error'}}
+        
+        # Finite generated bodies (calendar feeds) are buffered; event streams
+        # never end and files are better fetched directly
+        if response.direct_passthrough or response.mimetype == 'text/event-stream':
+            response.close()
+            return {
+                'id': subrequest['id'],
+                'status': 400,
+                'body': {'error': 'Streamed responses cannot be batched'}
+            }
+        
+        body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+        response.close()
+        return {'id': subrequest['id'], 'status': response.status_code, 'body': body}
+
+
+def run_batch(subrequests, principal, parallel=False):
+    """
+    Dispatch sub-requests and return their results in request order
+    
+    parallel is honoured only when every sub-request is read-only, so writes
+    always run in order.
+    """
+    app = current_app._get_current_object()
+    environs = [_environ(subrequest, principal) for subrequest in subrequests]
+    
+    if parallel and len(subrequests) > 1 and all(s['method'] in READ_ONLY_METHODS for s in subrequests):
+        pool = _get_pool()
+        futures = [pool.submit(_run, app, s, environ) for s, environ in zip(subrequests, environs)]
+        return [future.result() for future in futures]
+    
+    return [_run(app, s, environ) for s, environ in zip(subrequests, environs)]
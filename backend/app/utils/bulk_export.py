@@ -0,0 +1,129 @@
+"""
+Bulk (full-hospital) data export utilities
+"""
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app.models import db, Appointment, Treatment
+from app.utils.storage import write_csv_gz, write_jsonl_gz
+
+# Exportable tables and the date column used for date-range partitioning
+EXPORT_ENTITIES = {
+    'appointments': (Appointment, Appointment.appointment_date),
+    'treatments': (Treatment, Treatment.visit_date)
+}
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+PARTITION_MODES = ('id', 'date')
+
+
+def plan_partitions(entity, partition_by, partition_size):
+    """
+    Split a table into contiguous [start, end) ranges
+    
+    'id' partitions span partition_size primary keys, 'date' partitions span
+    partition_size days. Only the min/max of the partition column is read.
+    """
+    model, date_column = EXPORT_ENTITIES[entity]
+    column = model.id if partition_by == 'id' else date_column
+    
+    low, high = db.session.query(func.min(column), func.max(column)).one()
+    if low is None:
+        return []
+    
+    partitions = []
+    if partition_by == 'id':
+        start = low
+        while start <= high:
+            partitions.append((start, start + partition_size))
+            start += partition_size
+    else:
+        step = timedelta(days=partition_size)
+        start = low
+        while start <= high:
+            partitions.append((start.isoformat(), (start + step).isoformat()))
+            start += step
+    
+    return partitions
+
+
+def _shard_rows(entity, partition_by, start, end):
+    """Stream the raw table rows of one partition"""
+    model, date_column = EXPORT_ENTITIES[entity]
+    table = model.__table__
+    
+    if partition_by == 'id':
+        column = table.c.id
+    else:
+        column = table.c[date_column.key]
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+    
+    statement = select(table).where(
+        column >= start, column < end
+    ).order_by(table.c.id).execution_options(
+        yield_per=current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    )
+    
+    return db.session.execute(statement)
+
+
+def _format_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def export_shard(export_name, entity, fmt, partition_by, start, end, index, progress=None):
+    """
+    Export one partition of a table into a compressed shard file
+    
+    progress, if given, is called with the running row count every chunk.
+    Returns the shard metadata for the manifest.
+    """
+    table = EXPORT_ENTITIES[entity][0].__table__
+    columns = [column.name for column in table.columns]
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    result = _shard_rows(entity, partition_by, start, end)
+    
+    def counted(rows):
+        for count, row in enumerate(rows, 1):
+            yield row
+            if progress and count % chunk_size == 0:
+                progress(count)
+    
+    if fmt == 'csv':
+        rows = ([_format_value(value) for value in row] for row in result)
+        file_info = write_csv_gz(f'{export_name}/{entity}-{index:05d}.csv.gz', columns, counted(rows))
+    else:
+        records = (dict(row._mapping) for row in result)
+        file_info = write_jsonl_gz(f'{export_name}/{entity}-{index:05d}.jsonl.gz', counted(records))
+    
+    return {
+        'entity': entity,
+        'index': index,
+        'range': [start, end],
+        'file': file_info['name'],
+        'size': file_info['size'],
+        'row_count': file_info['row_count'],
+        'sha256': file_info['sha256']
+    }
+
+
+def build_manifest(export_name, fmt, partition_by, shards):
+    """Assemble the manifest describing a finished bulk export"""
+    shards = sorted(shards, key=lambda shard: (shard['entity'], shard['index']))
+    totals = {}
+    for shard in shards:
+        entity_totals = totals.setdefault(shard['entity'], {'shards': 0, 'row_count': 0, 'size': 0})
+        entity_totals['shards'] += 1
+        entity_totals['row_count'] += shard['row_count']
+        entity_totals['size'] += shard['size']
+    
+    return {
+        'export': export_name,
+        'created_at': datetime.utcnow().isoformat(),
+        'format': fmt,
+        'partition_by': partition_by,
+        'totals': totals,
+        'shards': shards
+    }
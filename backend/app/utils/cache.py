@@ -1,30 +1,84 @@
 """
 Redis cache utilities
+
+Nothing connects at startup: the client is created and pinged the first
+time something needs Redis. While Redis is unreachable redis_client is
+None (caching disabled) and the connection is retried at most every
+REDIS_RETRY_SECONDS, so a dead Redis costs one connect timeout per
+interval rather than one per request.
 """
 import json
+import threading
+import time
 import redis
 from functools import wraps
 from flask import current_app
+from app.utils.timing import timed
 
 
 class Cache:
     """Redis cache wrapper"""
     
-    def __init__(self, app=None):
-        self.redis_client = None
+    def __init__(self, app=None, url_config='REDIS_URL', purpose='Caching'):
+        self._url_config = url_config
+        self._purpose = purpose
+        self._client = None
+        self._url = None
+        self._connect_timeout = None
+        self._retry_seconds = 30
+        self._retry_at = None  # monotonic time of the next connect attempt, None if not pending
+        self._lock = threading.Lock()
+        self._logger = None
         if app:
             self.init_app(app)
     
     def init_app(self, app):
-        """Initialize cache with Flask app"""
-        redis_url = app.config.get('REDIS_URL', 'redis://localhost:6379/0')
-        try:
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            self.redis_client.ping()
-        except redis.ConnectionError:
-            app.logger.warning('Redis connection failed. Caching disabled.')
-            self.redis_client = None
+        """Initialize cache with Flask app (connects on first use)"""
+        self._url = app.config.get(self._url_config, 'redis://localhost:6379/0')
+        self._connect_timeout = app.config.get('REDIS_CONNECT_TIMEOUT', 1)
+        self._retry_seconds = app.config.get('REDIS_RETRY_SECONDS', 30)
+        self._logger = app.logger
+        self._client = None
+        self._retry_at = 0
+    
+    @property
+    def redis_client(self):
+        """The Redis client, or None while Redis is unavailable"""
+        if self._client is None and self._retry_at is not None and time.monotonic() >= self._retry_at:
+            self._connect()
+        return self._client
     
+    @redis_client.setter
+    def redis_client(self, client):
+        # An explicitly set client (or None) is used as-is, without reconnecting
+        self._client = client
+        self._retry_at = None
+    
+    def _connect(self):
+        with self._lock:
+            if self._client is not None or self._retry_at is None or time.monotonic() < self._retry_at:
+                return
+            
+            client = redis.from_url(self._url, decode_responses=True,
+                                    socket_connect_timeout=self._connect_timeout)
+            try:
+                client.ping()
+            except redis.RedisError as e:
+                client.close()
+                self._retry_at = time.monotonic() + self._retry_seconds
+                self._logger.warning(f'Redis connection failed ({e}). {self._purpose} disabled, '
+                                     f'retrying in {self._retry_seconds}s.')
+                return
+            
+            self._client = client
+            self._retry_at = None
+    
+    def reset_connections(self):
+        """Drop pooled connections (e.g. inherited across a fork) without connecting"""
+        if self._client is not None:
+            self._client.connection_pool.reset()
+    
+    @timed('cache')
     def get(self, key):
         """Get value from cache"""
         if not self.redis_client:
@@ -39,6 +93,7 @@ class Cache:
         
         return None
     
+    @timed('cache')
     def set(self, key, value, timeout=None):
         """Set value in cache"""
         if not self.redis_client:
@@ -52,6 +107,25 @@ class Cache:
             current_app.logger.error(f'Cache set error: {e}')
             return False
     
+    @timed('cache')
+    def add(self, key, value, timeout=None):
+        """
+        Set value only if key does not exist yet (atomic SET NX)
+        
+        Returns True if the value was stored. With caching disabled there is
+        nothing to race against, so this also returns True.
+        """
+        if not self.redis_client:
+            return True
+        
+        try:
+            timeout = timeout or current_app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+            return bool(self.redis_client.set(key, json.dumps(value), ex=timeout, nx=True))
+        except Exception as e:
+            current_app.logger.error(f'Cache add error: {e}')
+            return True
+    
+    @timed('cache')
     def delete(self, key):
         """Delete key from cache"""
         if not self.redis_client:
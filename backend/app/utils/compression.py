@@ -0,0 +1,84 @@
+"""
+Response compression - gzip, or brotli when installed, negotiated per request
+"""
+import gzip
+from flask import request
+from app.utils.timing import timed
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+
+class Compressor:
+    """after_request hook compressing large text responses"""
+    
+    def __init__(self, app=None):
+        self.enabled = True
+        self.min_size = 1024
+        self.mimetypes = set()
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Read the compression settings and register the hook"""
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ['application/json']))
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+        app.after_request(self.compress_response)
+    
+    def encode(self, data, accept_encodings):
+        """
+        Compress data with the best encoding the client accepts
+        
+        accept_encodings is a parsed Accept-Encoding header (q-values are
+        respected). Returns (data, encoding), encoding None if left as-is.
+        """
+        if len(data) < self.min_size:
+            return data, None
+        
+        offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+        encoding = accept_encodings.best_match(offered)
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality), encoding
+        if encoding == 'gzip':
+            return gzip.compress(data, compresslevel=self.gzip_level, mtime=0), encoding
+        return data, None
+    
+    @timed('compress')
+    def compress_response(self, response):
+        # Streamed bodies (feeds, SSE) and files are left alone, as are
+        # responses that are already encoded
+        if (not self.enabled
+                or response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.mimetypes):
+            return response
+        
+        response.vary.add('Accept-Encoding')
+        
+        # A strong ETag promises byte-identical bodies, which an encoded
+        # variant would break
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            return response
+        
+        data, encoding = self.encode(response.get_data(), request.accept_encodings)
+        if encoding is None:
+            return response
+        
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+# Global compressor instance
+compressor = Compressor()
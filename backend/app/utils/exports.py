@@ -0,0 +1,109 @@
+"""
+Patient export task helpers - ownership checks and status payloads
+
+Shared by the Flask task routes and the ASGI app's native status route, so
+both answer exactly alike.
+"""
+import uuid
+from flask import current_app, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from app.utils.progress import task_owner
+from app.utils.results import load_result
+from app.utils.storage import sign_download
+
+
+def owns_export(task, user_id, patient_id):
+    """Whether the current user started (or is the subject of) an export task"""
+    return export_owned_by(task, task_owner(task.id), user_id, patient_id)
+
+
+def export_owned_by(task, owner, user_id, patient_id):
+    """owns_export with the recorded owner (None if unknown) already looked up"""
+    if owner is not None:
+        return str(owner) == str(user_id)
+    
+    # Owner record unavailable (cache down or expired): fall back to the
+    # patient recorded in the task's own progress/result meta. A pending
+    # task has no meta yet but exposes nothing either (unknown ids are
+    # also PENDING), so it is reported as waiting.
+    if task.state == 'PENDING':
+        return True
+    
+    info = load_result(task.info)
+    info = info if isinstance(info, dict) else {}
+    return info.get('patient_id') == patient_id
+
+
+def export_status(task):
+    """Build the status payload for an export task"""
+    if task.state == 'PENDING':
+        return {
+            'state': task.state,
+            'status': 'Task is waiting to be processed'
+        }
+    
+    if task.state == 'PROGRESS':
+        return {
+            'state': task.state,
+            'progress': task.info,
+            'status': 'Task is being processed'
+        }
+    
+    if task.state == 'SUCCESS':
+        result = load_result(task.result) or {}
+        response = {
+            'state': task.state,
+            'result': result,
+            'status': 'Task completed successfully'
+        }
+        
+        if result.get('file'):
+            token = sign_download(result['file']['name'], result['patient_id'])
+            response['download_url'] = url_for('tasks.download_export', token=token, _external=True)
+        
+        return response
+    
+    if task.state == 'FAILURE':
+        return {
+            'state': task.state,
+            'error': str(task.info),
+            'status': 'Task failed'
+        }
+    
+    return {
+        'state': task.state,
+        'status': 'Task is being processed'
+    }
+
+
+def _ticket_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='export-events')
+
+
+def sign_stream_ticket(task_id, user_id, patient_id):
+    """
+    Create a short-lived ticket for one export's event stream
+    
+    EventSource cannot set headers, so the stream URL carries this ticket
+    instead of the access token: it only opens that task's stream, expires
+    after SSE_TICKET_EXPIRES seconds and, via its nonce, is redeemed once.
+    """
+    return _ticket_serializer().dumps({
+        'task_id': task_id,
+        'user_id': user_id,
+        'patient_id': patient_id,
+        'nonce': uuid.uuid4().hex
+    })
+
+
+def verify_stream_ticket(ticket, task_id):
+    """
+    Decode a stream ticket issued for task_id, returning its payload
+    
+    Raises itsdangerous.BadSignature (or SignatureExpired) if the ticket is
+    invalid, expired or was issued for another task.
+    """
+    payload = _ticket_serializer().loads(ticket, max_age=current_app.config.get('SSE_TICKET_EXPIRES', 60))
+    if payload.get('task_id') != task_id:
+        raise BadSignature('Ticket was issued for another task')
+    return payload
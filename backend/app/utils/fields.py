@@ -0,0 +1,207 @@
+"""
+Sparse fieldsets - ?fields= and ?format=columnar for list and detail routes
+
+?fields=id,name,specialization narrows the response to those keys and the
+SQL to those columns, joining users/doctors/patients only when a requested
+field lives there. ?format=columnar returns {"fields": [...], "rows": [[...]]}
+so large lists carry each key once. Without either parameter, routes keep
+their to_dict() responses.
+"""
+from datetime import date, datetime
+from flask import request, jsonify
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app.models import User, Doctor, Patient, Appointment, Treatment
+
+COLUMNAR = 'columnar'
+
+
+class Fieldset:
+    """The keys of a model's to_dict(), each mapped to a SQL expression"""
+    
+    def __init__(self, model, columns, joins=None):
+        # columns: field -> (expression, join name or None)
+        # joins: join name -> (target, onclause), outer-joined on demand
+        self.model = model
+        self.columns = columns
+        self.joins = joins or {}
+        self.names = list(columns)
+    
+    def parse(self, value):
+        """Validate a comma-separated field list, keeping request order"""
+        names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        if not names:
+            raise ValueError('fields must name at least one field')
+        
+        unknown = [name for name in names if name not in self.columns]
+        if unknown:
+            raise ValueError(f'Unknown fields {unknown}; allowed: {self.names}')
+        
+        return names
+    
+    def _labelled(self, names):
+        return [self.columns[name][0].label(name) for name in names]
+    
+    def _joins(self, names):
+        return list(dict.fromkeys(self.columns[name][1] for name in names if self.columns[name][1]))
+    
+    def project(self, query, names):
+        """Narrow an ORM query of the model to the given fields"""
+        query = query.with_entities(*self._labelled(names))
+        
+        joins = self._joins(names)
+        if joins:
+            # The route's filters are already applied; anchor the joins on the
+            # model in case none of the selected columns belongs to it
+            query = query.enable_assertions(False).select_from(self.model)
+        
+        for join in joins:
+            target, onclause = self.joins[join]
+            query = query.outerjoin(target, onclause)
+        
+        return query
+    
+    def select(self, names):
+        """A Core SELECT of the given fields, for callers without an ORM query"""
+        statement = select(*self._labelled(names)).select_from(self.model)
+        for join in self._joins(names):
+            target, onclause = self.joins[join]
+            statement = statement.outerjoin(target, onclause)
+        
+        return statement
+
+
+def format_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def requested_fields(fieldset, args=None):
+    """
+    Read ?fields= and ?format= for a fieldset (from args, default request.args)
+    
+    Returns (names, columnar), names being None when no projection was asked
+    for. Raises ValueError on unknown fields or formats.
+    """
+    args = request.args if args is None else args
+    fmt = args.get('format')
+    if fmt not in (None, '', COLUMNAR):
+        raise ValueError(f"format must be one of ['{COLUMNAR}']")
+    
+    value = args.get('fields')
+    names = fieldset.parse(value) if value is not None else None
+    return names, fmt == COLUMNAR
+
+
+def sparse_list(query, fieldset):
+    """
+    Respond with a projected list if the request asked for one
+    
+    Returns None when neither ?fields= nor ?format=columnar is given, so the
+    caller falls through to its full to_dict() response.
+    """
+    try:
+        names, columnar = requested_fields(fieldset)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if names is None and not columnar:
+        return None
+    
+    names = names or fieldset.names
+    rows = [[format_value(value) for value in row] for row in fieldset.project(query, names)]
+    
+    if columnar:
+        return jsonify({'fields': names, 'rows': rows}), 200
+    return jsonify([dict(zip(names, row)) for row in rows]), 200
+
+
+def sparse_detail(query, fieldset, not_found):
+    """Like sparse_list, for a query matching one row (404 with not_found if none)"""
+    try:
+        names, _ = requested_fields(fieldset)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if names is None:
+        return None
+    
+    row = fieldset.project(query, names).first()
+    if row is None:
+        return jsonify({'error': not_found}), 404
+    
+    return jsonify({name: format_value(value) for name, value in zip(names, row)}), 200
+
+
+# Aliased so the on-demand joins cannot clash with tables a route's query
+# already joins
+_AppointmentPatient = aliased(Patient)
+_AppointmentDoctor = aliased(Doctor)
+_TreatmentPatient = aliased(Patient)
+_TreatmentDoctor = aliased(Doctor)
+
+DOCTOR_FIELDS = Fieldset(Doctor, {
+    'id': (Doctor.id, None),
+    'user_id': (Doctor.user_id, None),
+    'name': (Doctor.name, None),
+    'email': (User.email, 'user'),
+    'phone': (Doctor.phone, None),
+    'specialization': (Doctor.specialization, None),
+    'qualification': (Doctor.qualification, None),
+    'experience': (Doctor.experience, None),
+    'created_at': (Doctor.created_at, None)
+}, {
+    'user': (User, Doctor.user_id == User.id)
+})
+
+PATIENT_FIELDS = Fieldset(Patient, {
+    'id': (Patient.id, None),
+    'user_id': (Patient.user_id, None),
+    'name': (Patient.name, None),
+    'email': (User.email, 'user'),
+    'age': (Patient.age, None),
+    'gender': (Patient.gender, None),
+    'phone': (Patient.phone, None),
+    'registration_date': (Patient.registration_date, None),
+    'created_at': (Patient.created_at, None)
+}, {
+    'user': (User, Patient.user_id == User.id)
+})
+
+APPOINTMENT_FIELDS = Fieldset(Appointment, {
+    'id': (Appointment.id, None),
+    'patient_id': (Appointment.patient_id, None),
+    'patient_name': (_AppointmentPatient.name, 'patient'),
+    'doctor_id': (Appointment.doctor_id, None),
+    'doctor_name': (_AppointmentDoctor.name, 'doctor'),
+    'department': (_AppointmentDoctor.specialization, 'doctor'),
+    'appointment_date': (Appointment.appointment_date, None),
+    'appointment_time': (Appointment.appointment_time, None),
+    'reason': (Appointment.reason, None),
+    'status': (Appointment.status, None),
+    'created_at': (Appointment.created_at, None),
+    'updated_at': (Appointment.updated_at, None)
+}, {
+    'patient': (_AppointmentPatient, Appointment.patient_id == _AppointmentPatient.id),
+    'doctor': (_AppointmentDoctor, Appointment.doctor_id == _AppointmentDoctor.id)
+})
+
+TREATMENT_FIELDS = Fieldset(Treatment, {
+    'id': (Treatment.id, None),
+    'patient_id': (Treatment.patient_id, None),
+    'patient_name': (_TreatmentPatient.name, 'patient'),
+    'doctor_id': (Treatment.doctor_id, None),
+    'doctor_name': (_TreatmentDoctor.name, 'doctor'),
+    'department': (_TreatmentDoctor.specialization, 'doctor'),
+    'visit_date': (Treatment.visit_date, None),
+    'symptoms': (Treatment.symptoms, None),
+    'diagnosis': (Treatment.diagnosis, None),
+    'prescription': (Treatment.prescription, None),
+    'follow_up_date': (Treatment.follow_up_date, None),
+    'notes': (Treatment.notes, None),
+    'created_at': (Treatment.created_at, None)
+}, {
+    'patient': (_TreatmentPatient, Treatment.patient_id == _TreatmentPatient.id),
+    'doctor': (_TreatmentDoctor, Treatment.doctor_id == _TreatmentDoctor.id)
+})
@@ -0,0 +1,32 @@
+"""
+Fork safety for preforking servers
+
+With gunicorn's preload_app the app is created once in the master and the
+workers are forked from it, inheriting its database engines and Redis and
+Celery connection pools. A socket shared by two processes interleaves their
+traffic, so every worker drops what it inherited right after the fork and
+opens its own connections on first use. The parent's sockets are left open
+for the parent.
+
+Thread pools and background threads (password hashing, batch dispatch, the
+local task worker, the revocation subscriber) already restart themselves
+when they notice a new pid.
+"""
+from app.models import db
+from app.utils.cache import cache
+
+
+def reset_after_fork(app):
+    """Forget connections inherited from the parent process"""
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: the parent still owns those connections
+            engine.dispose(close=False)
+    
+    cache.reset_connections()
+    
+    celery = app.extensions.get('celery')
+    if celery is not None:  # only if it was built before the fork
+        # What Celery does itself after a multiprocessing fork: drop the
+        # broker connection and producer pools
+        celery._after_fork()
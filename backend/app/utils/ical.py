@@ -0,0 +1,103 @@
+"""
+iCalendar (RFC 5545) rendering utilities
+"""
+from datetime import datetime, timedelta
+from app.utils.schedule import parse_appointment_time
+
+CRLF = '\r\n'
+
+STATUS_MAP = {
+    'scheduled': 'CONFIRMED',
+    'completed': 'CONFIRMED',
+    'cancelled': 'CANCELLED'
+}
+
+
+def escape_text(value):
+    """Escape a TEXT property value"""
+    if value is None:
+        return ''
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold_line(line):
+    """Fold a content line at 75 octets as required by RFC 5545"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + CRLF
+    
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    
+    return (CRLF + ' ').join(parts) + CRLF
+
+
+def format_datetime(value):
+    """Format a naive local datetime as an iCalendar floating DATE-TIME"""
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def calendar_header(name):
+    """Render the opening lines of a calendar"""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Syntura//Hospital Management System//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}'
+    ]
+    return ''.join(fold_line(line) for line in lines)
+
+
+def calendar_footer():
+    """Render the closing line of a calendar"""
+    return fold_line('END:VCALENDAR')
+
+
+def render_event(uid, appointment_date, appointment_time, summary, description,
+                 status, updated_at, duration_minutes=30):
+    """Render a single appointment as a VEVENT block"""
+    parsed_time = parse_appointment_time(appointment_time)
+    stamp = format_datetime(updated_at or datetime.utcnow()) + 'Z'
+    
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{stamp}',
+        f'LAST-MODIFIED:{stamp}'
+    ]
+    
+    if parsed_time:
+        start = datetime.combine(appointment_date, parsed_time)
+        end = start + timedelta(minutes=duration_minutes)
+        lines.append(f'DTSTART:{format_datetime(start)}')
+        lines.append(f'DTEND:{format_datetime(end)}')
+    else:
+        # Unrecognised time strings become all-day events
+        lines.append(f'DTSTART;VALUE=DATE:{appointment_date.strftime("%Y%m%d")}')
+        lines.append(f'DTEND;VALUE=DATE:{(appointment_date + timedelta(days=1)).strftime("%Y%m%d")}')
+    
+    lines.extend([
+        f'SUMMARY:{escape_text(summary)}',
+        f'DESCRIPTION:{escape_text(description)}',
+        f'STATUS:{STATUS_MAP.get(status, "TENTATIVE")}',
+        'END:VEVENT'
+    ])
+    
+    return ''.join(fold_line(line) for line in lines)
@@ -0,0 +1,68 @@
+"""
+Flask JSON provider - orjson when installed, the stdlib encoder otherwise
+
+Both encoders write dates, datetimes and times as ISO 8601 (Flask's own
+provider turns dates into HTTP dates) and keep Flask's sorted keys, so
+responses decode to the same values whichever one ran. Anything orjson
+rejects (e.g. integers wider than 64 bits) is retried with the stdlib.
+"""
+from datetime import date, time
+from flask.json.provider import DefaultJSONProvider
+from app.utils.timing import timed
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, (date, time)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that encodes and decodes with orjson when available"""
+    
+    default = staticmethod(_default)
+    
+    def _orjson_option(self, indent=False):
+        option = 0
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_option()).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+    
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+    
+    @timed('json')
+    def response(self, *args, **kwargs):
+        """Like jsonify(), but hands orjson's bytes straight to the response"""
+        if orjson is not None:
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            try:
+                body = orjson.dumps(
+                    obj,
+                    default=self.default,
+                    option=self._orjson_option(indent) | orjson.OPT_APPEND_NEWLINE
+                )
+            except TypeError:
+                pass
+            else:
+                return self._app.response_class(body, mimetype=self.mimetype)
+        
+        return super().response(*args, **kwargs)
@@ -0,0 +1,67 @@
+"""
+Notification delivery utilities
+"""
+import json
+import logging
+import urllib.request
+from importlib import import_module
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationError(Exception):
+    """Raised when a notification could not be delivered"""
+
+
+class Notifier:
+    """Base notifier - subclasses deliver a single message to a recipient"""
+    
+    def send(self, recipient, subject, body):
+        raise NotImplementedError
+
+
+class LogNotifier(Notifier):
+    """Notifier that only writes messages to the log (development default)"""
+    
+    def send(self, recipient, subject, body):
+        logger.info(f'Notification to {recipient}: {subject} - {body}')
+
+
+class WebhookNotifier(Notifier):
+    """Notifier that posts messages to a chat webhook (e.g. Google Chat)"""
+    
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+    
+    def send(self, recipient, subject, body):
+        payload = json.dumps({'text': f'*{subject}* ({recipient})\n{body}'}).encode('utf-8')
+        req = urllib.request.Request(
+            self.url,
+            data=payload,
+            headers={'Content-Type': 'application/json; charset=UTF-8'}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                if response.status >= 400:
+                    raise NotificationError(f'Webhook returned {response.status}')
+        except OSError as e:
+            raise NotificationError(str(e)) from e
+
+
+def get_notifier():
+    """
+    Build the configured notifier.
+    
+    NOTIFIER is 'log', 'webhook' or a dotted path to a Notifier subclass.
+    """
+    name = current_app.config.get('NOTIFIER', 'log')
+    
+    if name == 'log':
+        return LogNotifier()
+    if name == 'webhook':
+        return WebhookNotifier(current_app.config['NOTIFIER_WEBHOOK_URL'])
+    
+    module_name, _, class_name = name.rpartition('.')
+    return getattr(import_module(module_name), class_name)()
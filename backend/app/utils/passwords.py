@@ -0,0 +1,161 @@
+"""
+Password hashing utilities
+
+PASSWORD_HASH_METHOD selects the scheme for new hashes:
+    scrypt:<n>:<r>:<p>           werkzeug scrypt (default, werkzeug's own default)
+    pbkdf2:sha256:<iterations>   werkzeug PBKDF2
+    argon2[:<time>:<memory>:<parallelism>]   argon2id, needs argon2-cffi
+
+Existing hashes of any of these schemes keep verifying; a successful login
+with a hash made under other parameters is transparently rehashed.
+
+Hashing is CPU-bound, so logins and registrations run it on a bounded
+thread pool (hashlib and argon2 release the GIL while hashing). When more
+than PASSWORD_HASH_MAX_PENDING hashes are in flight new requests are
+rejected with PasswordHashBusy instead of queueing behind the storm.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:  # argon2-cffi is optional
+    PasswordHasher = None
+
+_pool = None
+_pool_pid = None
+_pending = None
+_pool_lock = threading.Lock()
+
+
+class PasswordHashBusy(Exception):
+    """Raised when the hashing pool is saturated; the client should retry later"""
+
+
+def _argon2_hasher(method):
+    if PasswordHasher is None:
+        raise RuntimeError('PASSWORD_HASH_METHOD=argon2 requires the argon2-cffi package')
+    
+    params = method.split(':')[1:]
+    if not params:
+        return PasswordHasher()
+    
+    time_cost, memory_cost, parallelism = (int(value) for value in params)
+    return PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    """The parameter prefix werkzeug writes for a method (fills in its defaults)"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def _method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+
+def hash_password(password, method=None):
+    """Hash a password with the configured (or given) method"""
+    method = method or _method()
+    
+    if method.startswith('argon2'):
+        return _argon2_hasher(method).hash(password)
+    
+    return generate_password_hash(password, method=method)
+
+
+def verify_password(password_hash, password):
+    """Verify a password against a hash of any supported scheme"""
+    if password_hash.startswith('$argon2'):
+        if PasswordHasher is None:
+            return False
+        try:
+            return PasswordHasher().verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    return check_password_hash(password_hash, password)
+
+
+def needs_rehash(password_hash, method=None):
+    """Whether a hash was made with a different scheme or cost than configured"""
+    method = method or _method()
+    
+    if method.startswith('argon2'):
+        if not password_hash.startswith('$argon2'):
+            return True
+        return _argon2_hasher(method).check_needs_rehash(password_hash)
+    
+    if password_hash.startswith('$argon2'):
+        return True
+    
+    return password_hash.split('$', 1)[0] != _hash_prefix(method)
+
+
+def _verify_and_rehash(password_hash, password, method):
+    """Pool job: verify, and produce an upgraded hash if the parameters changed"""
+    if not verify_password(password_hash, password):
+        return False, None
+    
+    if needs_rehash(password_hash, method):
+        return True, hash_password(password, method)
+    
+    return True, None
+
+
+def _get_pool():
+    """Return this process's hashing pool, creating it on first use (and after a fork)"""
+    global _pool, _pool_pid, _pending
+    
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('PASSWORD_HASH_WORKERS', 4),
+                    thread_name_prefix='password-hash'
+                )
+                _pending = threading.BoundedSemaphore(current_app.config.get('PASSWORD_HASH_MAX_PENDING', 32))
+                _pool_pid = os.getpid()
+    
+    return _pool, _pending
+
+
+def _run_bounded(fn, *args):
+    """Run fn on the hashing pool, failing fast when it is saturated"""
+    pool, pending = _get_pool()
+    
+    if not pending.acquire(blocking=False):
+        raise PasswordHashBusy()
+    
+    try:
+        future = pool.submit(fn, *args)
+    except Exception:
+        pending.release()
+        raise
+    future.add_done_callback(lambda _: pending.release())
+    
+    try:
+        return future.result(timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', 10))
+    except FutureTimeoutError:
+        raise PasswordHashBusy()
+
+
+def check_login_password(password_hash, password):
+    """
+    Verify a login attempt on the hashing pool
+    
+    Returns (verified, new_hash); new_hash is set when the stored hash
+    should be replaced because PASSWORD_HASH_METHOD changed.
+    Raises PasswordHashBusy under backpressure.
+    """
+    return _run_bounded(_verify_and_rehash, password_hash, password, _method())
+
+
+def hash_password_bounded(password):
+    """Hash a new password on the hashing pool (raises PasswordHashBusy under backpressure)"""
+    return _run_bounded(hash_password, password, _method())
@@ -0,0 +1,56 @@
+"""
+Per-user profile cache for /api/auth/me and login
+"""
+from flask import current_app
+from sqlalchemy.orm import contains_eager
+from app.models import db, User
+from app.utils.cache import cache
+
+
+def profile_cache_key(user_id):
+    return f'profile:user:{user_id}'
+
+
+def load_user_profile(user_id):
+    """
+    Assemble a user's account and doctor/patient profile in one query.
+    
+    The profile's to_dict() reads .user back, which the identity map
+    already holds, so no further queries are issued.
+    """
+    user = db.session.query(User).outerjoin(User.doctor).outerjoin(User.patient).options(
+        contains_eager(User.doctor),
+        contains_eager(User.patient)
+    ).filter(User.id == user_id).first()
+    
+    if not user:
+        return None
+    
+    profile = user.doctor if user.role == 'doctor' else user.patient if user.role == 'patient' else None
+    
+    return {
+        'id': user.id,
+        'email': user.email,
+        'role': user.role,
+        'profile': profile.to_dict() if profile else None
+    }
+
+
+def get_user_profile(user_id):
+    """Return the cached profile of a user, loading it on a miss (None if gone)"""
+    key = profile_cache_key(user_id)
+    
+    profile = cache.get(key)
+    if profile is not None:
+        return profile
+    
+    profile = load_user_profile(user_id)
+    if profile is not None:
+        cache.set(key, profile, current_app.config.get('PROFILE_CACHE_TIMEOUT', 3600))
+    
+    return profile
+
+
+def invalidate_user_profile(user_id):
+    """Drop a user's cached profile after their user/doctor/patient row changed"""
+    cache.delete(profile_cache_key(user_id))
@@ -0,0 +1,330 @@
+"""
+Request profiling - aggregated profiles of live requests for admins
+
+A request is profiled when its route is sampled (PROFILE_SAMPLE_RATES, the
+percentage of requests by endpoint ('doctor.get_doctor_appointments') or
+blueprint ('doctor'), an endpoint entry winning over its blueprint's) or
+when an admin sends the PROFILE_HEADER header. PROFILE_MODE picks how:
+    sampler  - a background thread records the request thread's stack every
+               PROFILE_SAMPLE_INTERVAL_MS; collapsed stacks for flamegraphs,
+               at almost no cost to the request
+    cprofile - cProfile, for call counts and per-function times (pstats);
+               slows the profiled request down several times, and only one
+               request per process is profiled at a time
+Profiles are added up per endpoint in one file per process in PROFILE_DIR,
+and the admin download merges every process's file. With PROFILING_ENABLED
+off no hooks are registered.
+"""
+import cProfile
+import glob
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import Flask, current_app, request
+from app.utils.auth import get_principal
+
+# Like the principal, kept on the request environ (batch sub-requests share g)
+PROFILE_ENVIRON_KEY = 'hms.profile'
+
+PROFILE_MODES = ('sampler', 'cprofile')
+
+# Download formats, by the mode that records them
+PROFILE_FORMATS = {'collapsed': 'sampler', 'pstats': 'cprofile', 'text': 'cprofile'}
+
+# Functions listed by the text format
+TEXT_FORMAT_LIMIT = 50
+
+
+def parse_sample_rates(spec):
+    """Parse 'doctor.get_doctor_appointments=5,patient=0.5' into {name: percent}"""
+    if isinstance(spec, dict):
+        return {name: float(percent) for name, percent in spec.items()}
+    
+    rates = {}
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, percent = entry.partition('=')
+        rates[name.strip()] = float(percent)
+    return rates
+
+
+def _stack(frame, root_code):
+    """Frame labels from the outermost (Flask.wsgi_app when present) to the innermost"""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}")
+        if code is root_code:
+            break
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+def _stats(raw):
+    """pstats.Stats for a stats dict, as marshalled by Stats.dump_stats()"""
+    stats = pstats.Stats()
+    stats.stats = raw
+    stats.get_top_level_stats()
+    return stats
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Profiler:
+    """before/teardown_request hooks profiling sampled requests"""
+    
+    def __init__(self, app=None):
+        self.enabled = False
+        self.mode = 'sampler'
+        self.rates = {}
+        self.header = 'X-Profile'
+        self.interval = 0.005
+        self.directory = None
+        self._cprofile_lock = threading.Lock()  # cProfile allows one active profiler
+        self._file_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._sampled = {}  # thread id -> stack Counter of the request it is serving
+        self._wakeup = threading.Event()
+        self._sampler = None
+        self._sampler_pid = None
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """
+        Read the profiling settings and, if enabled, register the hooks
+        
+        Call right after the request timer, so the profile covers the
+        other extensions' hooks too.
+        """
+        self.enabled = app.config.get('PROFILING_ENABLED', False)
+        self.mode = app.config.get('PROFILE_MODE', 'sampler')
+        if self.mode not in PROFILE_MODES:
+            raise ValueError(f'PROFILE_MODE must be one of {list(PROFILE_MODES)}')
+        self.rates = parse_sample_rates(app.config.get('PROFILE_SAMPLE_RATES', ''))
+        self.header = app.config.get('PROFILE_HEADER', 'X-Profile')
+        self.interval = app.config.get('PROFILE_SAMPLE_INTERVAL_MS', 5) / 1000
+        self.directory = app.config['PROFILE_DIR']
+        if not self.enabled:
+            return
+        
+        app.before_request(self.start_request)
+        app.teardown_request(self.finish_request)
+    
+    def rate_for(self, endpoint):
+        """Percentage of an endpoint's requests to profile, or None"""
+        if endpoint in self.rates:
+            return self.rates[endpoint]
+        return self.rates.get(endpoint.rpartition('.')[0])
+    
+    def _requested_by_admin(self):
+        if self.header not in request.headers:
+            return False
+        try:
+            principal = get_principal(optional=True)
+        except Exception:
+            return False  # the route rejects the token itself
+        return principal is not None and principal.role == 'admin'
+    
+    def should_profile(self):
+        if request.endpoint is None or request.method == 'OPTIONS':
+            return False
+        if self._requested_by_admin():
+            return True
+        rate = self.rate_for(request.endpoint)
+        return rate is not None and random.random() * 100 < rate
+    
+    def start_request(self):
+        if not self.should_profile():
+            return
+        
+        if self.mode == 'cprofile':
+            # Skips requests overlapping a profiled one, including batch
+            # sub-requests, which count towards their batch
+            if not self._cprofile_lock.acquire(blocking=False):
+                return
+            profile = cProfile.Profile()
+            request.environ[PROFILE_ENVIRON_KEY] = (request.endpoint, profile)
+            profile.enable()
+            return
+        
+        thread_id = threading.get_ident()
+        with self._lock:
+            if thread_id in self._sampled:  # a sequential batch sub-request
+                return
+            stacks = self._sampled[thread_id] = Counter()
+        request.environ[PROFILE_ENVIRON_KEY] = (request.endpoint, stacks)
+        self._start_sampler()
+        self._wakeup.set()
+    
+    def finish_request(self, exc=None):
+        run = request.environ.pop(PROFILE_ENVIRON_KEY, None)
+        if run is None:
+            return
+        
+        endpoint, data = run
+        if self.mode == 'cprofile':
+            data.disable()
+            self._cprofile_lock.release()
+            data = pstats.Stats(data).stats
+        else:
+            with self._lock:
+                del self._sampled[threading.get_ident()]
+            data = dict(data)
+        
+        try:
+            self._save(endpoint, data)
+        except Exception as e:
+            current_app.logger.warning(f'Could not save the profile of {endpoint}: {e}')
+    
+    def _start_sampler(self):
+        """Start the sampling thread (again, in a forked worker)"""
+        if self._sampler is not None and self._sampler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sampler is None or self._sampler_pid != os.getpid():
+                self._sampler = threading.Thread(target=self._sample, name='request-sampler', daemon=True)
+                self._sampler_pid = os.getpid()
+                self._sampler.start()
+    
+    def _sample(self):
+        root_code = Flask.wsgi_app.__code__
+        while True:
+            if not self._sampled:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._sampled.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_stack(frame, root_code)] += 1
+    
+    # ===== Storage =====
+    
+    def _path(self, endpoint, mode, pid):
+        return os.path.join(self.directory, f'{endpoint}.{mode}.{pid}.prof')
+    
+    def _save(self, endpoint, data):
+        """Add one request's profile to this process's file for the endpoint"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(endpoint, self.mode, os.getpid())
+        
+        # Read back rather than kept in memory, so a reset also clears
+        # what other processes have recorded
+        with self._file_lock:
+            profile = _read(path) or {'requests': 0, 'data': {}}
+            if self.mode == 'cprofile':
+                stats = _stats(data)
+                if profile['data']:
+                    stats.add(_stats(profile['data']))
+                profile['data'] = stats.stats
+            else:
+                profile['data'] = dict(Counter(profile['data']) + Counter(data))
+            profile['requests'] += 1
+            
+            tmp_path = f'{path}.part'
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(profile, f)
+            os.replace(tmp_path, path)
+    
+    def _files(self, endpoint='*', mode='*'):
+        """(endpoint, mode, path) of the stored profile files"""
+        pattern = self._path(glob.escape(endpoint) if endpoint != '*' else '*', mode, '*')
+        for path in glob.glob(pattern):
+            name_endpoint, name_mode, _, _ = os.path.basename(path).rsplit('.', 3)
+            yield name_endpoint, name_mode, path
+    
+    def list_profiles(self):
+        """Summary of the stored profiles, one per endpoint and mode"""
+        summaries = {}
+        for endpoint, mode, path in self._files():
+            profile = _read(path)
+            if profile is None:
+                continue
+            summary = summaries.setdefault((endpoint, mode), {
+                'endpoint': endpoint,
+                'mode': mode,
+                'requests': 0,
+                'processes': 0,
+                'updated_at': None
+            })
+            summary['requests'] += profile['requests']
+            summary['processes'] += 1
+            updated_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+            summary['updated_at'] = max(summary['updated_at'] or updated_at, updated_at)
+        
+        return sorted(summaries.values(), key=lambda s: (s['endpoint'], s['mode']))
+    
+    def load(self, endpoint, mode):
+        """Every process's profile of an endpoint added up, as (requests, data), or None"""
+        requests, merged = 0, None
+        for _, _, path in self._files(endpoint, mode):
+            profile = _read(path)
+            if profile is None:
+                continue
+            requests += profile['requests']
+            if mode == 'cprofile':
+                if merged is None:
+                    merged = _stats(profile['data'])
+                else:
+                    merged.add(_stats(profile['data']))
+            else:
+                merged = (merged or Counter()) + Counter(profile['data'])
+        
+        return (requests, merged) if requests else None
+    
+    def export(self, endpoint, fmt):
+        """
+        An endpoint's profile in a download format
+        
+        Returns the body (bytes for pstats, otherwise text), or None if no
+        request of the endpoint was profiled in the format's mode.
+        """
+        loaded = self.load(endpoint, PROFILE_FORMATS[fmt])
+        if loaded is None:
+            return None
+        
+        requests, data = loaded
+        if fmt == 'collapsed':
+            # Brendan Gregg's folded format, for flamegraph.pl or speedscope
+            return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(data.items()))
+        if fmt == 'pstats':
+            # What Stats.dump_stats() writes: python -m pstats, snakeviz
+            return marshal.dumps(data.stats)
+        
+        stream = io.StringIO()
+        stream.write(f'{requests} profiled requests of {endpoint}\n')
+        data.stream = stream
+        data.sort_stats('cumulative').print_stats(TEXT_FORMAT_LIMIT)
+        return stream.getvalue()
+    
+    def reset(self, endpoint=None):
+        """Delete the stored profiles of an endpoint, or all of them; returns the files removed"""
+        removed = 0
+        for _, _, path in self._files(endpoint or '*'):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+profiler = Profiler()
@@ -0,0 +1,91 @@
+"""
+Task progress reporting and ownership utilities
+"""
+import json
+import time
+from flask import current_app
+from app.utils.cache import cache
+
+
+def progress_channel(task_id):
+    """Redis pub/sub channel carrying a task's progress updates"""
+    return f'task-progress:{task_id}'
+
+
+class ProgressReporter:
+    """
+    Publish a task's progress (processed, total, ETA)
+    
+    Progress is stored as PROGRESS state meta in the result backend (read by
+    the status endpoint) and published on the task's Redis channel (pushed to
+    SSE clients). Updates are throttled to one per `interval` seconds.
+    """
+    
+    def __init__(self, task, total=None, interval=1.0, **extra):
+        self.task = task
+        self.total = total
+        self.interval = interval
+        self.extra = extra
+        self.started = time.monotonic()
+        self.last_sent = 0.0
+    
+    def meta(self, processed):
+        elapsed = time.monotonic() - self.started
+        eta = None
+        if self.total and processed:
+            eta = round(elapsed / processed * max(self.total - processed, 0), 1)
+        
+        return dict(
+            self.extra,
+            processed=processed,
+            total=self.total,
+            percent=round(100.0 * processed / self.total, 1) if self.total else None,
+            elapsed_seconds=round(elapsed, 1),
+            eta_seconds=eta
+        )
+    
+    def track(self, items):
+        """Wrap an iterable, reporting progress as items are consumed"""
+        processed = 0
+        for item in items:
+            yield item
+            processed += 1
+            self.update(processed)
+        self.update(processed, force=True)
+    
+    def update(self, processed, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_sent < self.interval:
+            return
+        
+        self.last_sent = now
+        meta = self.meta(processed)
+        
+        if self.task.request.id:
+            self.task.update_state(state='PROGRESS', meta=meta)
+            publish_progress(self.task.request.id, 'PROGRESS', meta)
+
+
+def publish_progress(task_id, state, meta=None):
+    """Push a state change to SSE subscribers of a task"""
+    if not cache.redis_client:
+        return
+    
+    try:
+        cache.redis_client.publish(progress_channel(task_id), json.dumps({'state': state, 'meta': meta}))
+    except Exception as e:
+        current_app.logger.error(f'Progress publish error: {e}')
+
+
+def task_owner_key(task_id):
+    return f'task:owner:{task_id}'
+
+
+def record_task_owner(task_id, user_id):
+    """Remember which user started a task so only they can read its status"""
+    cache.set(task_owner_key(task_id), user_id, current_app.config.get('EXPORT_CACHE_TIMEOUT', 86400))
+
+
+def task_owner(task_id):
+    """Return the user who started a task, or None if unknown"""
+    return cache.get(task_owner_key(task_id))
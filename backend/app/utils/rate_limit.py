@@ -0,0 +1,174 @@
+"""
+Rate limiting utilities - token buckets per route and client
+
+Limits are configured in RATE_LIMITS by endpoint ('auth.login') or by
+blueprint ('auth'); an endpoint entry wins over its blueprint's. Each
+route/client pair gets its own bucket: authenticated clients are keyed by
+user id, anonymous ones by IP address. Buckets live in Redis and are
+updated atomically by a Lua script; if Redis is unavailable a per-process
+bucket is used instead, so limits still apply (per worker) during an outage.
+"""
+import math
+import threading
+import time
+import redis
+from flask import current_app, jsonify, request
+from app.utils.auth import get_principal
+from app.utils.cache import cache
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# KEYS[1] bucket key; ARGV[1] capacity, ARGV[2] refill rate (tokens/s).
+# Returns {allowed, retry_after}; floats go back as strings because Lua
+# numbers are truncated to integers in replies.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+def parse_limit(spec):
+    """Parse '10/minute' into (capacity, refill rate in tokens per second)"""
+    count, _, period = spec.partition('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip()]
+
+
+class RateLimiter:
+    """Token-bucket rate limiter backed by Redis, with an in-process fallback"""
+    
+    # In-process buckets kept before idle ones are pruned
+    LOCAL_MAX_BUCKETS = 10000
+    
+    def __init__(self, app=None):
+        self.enabled = False
+        self.limits = {}
+        self._script = None
+        self._script_client = None
+        self._redis_down = False
+        self._local = {}
+        self._local_lock = threading.Lock()
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize limiter with Flask app"""
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.limits = {
+            name: parse_limit(spec)
+            for name, spec in app.config.get('RATE_LIMITS', {}).items()
+        }
+        app.before_request(self.check_request)
+    
+    def limit_for(self, endpoint):
+        """Return the (capacity, rate) limit of an endpoint, or None"""
+        if not endpoint:
+            return None
+        if endpoint in self.limits:
+            return self.limits[endpoint]
+        return self.limits.get(endpoint.rpartition('.')[0])
+    
+    def hit(self, key, capacity, rate):
+        """
+        Take one token from a bucket
+        
+        Returns (allowed, retry_after_seconds).
+        """
+        client = cache.redis_client
+        if client is not None:
+            try:
+                if self._script is None or self._script_client is not client:
+                    self._script = client.register_script(TOKEN_BUCKET_LUA)
+                    self._script_client = client
+                allowed, retry_after = self._script(keys=[key], args=[capacity, rate])
+                if self._redis_down:
+                    self._redis_down = False
+                    current_app.logger.info('Rate limiter using Redis again')
+                return bool(int(allowed)), float(retry_after)
+            except redis.RedisError as e:
+                if not self._redis_down:
+                    self._redis_down = True
+                    current_app.logger.warning(f'Rate limiter falling back to in-process buckets: {e}')
+        
+        return self._hit_local(key, capacity, rate)
+    
+    def _hit_local(self, key, capacity, rate):
+        """Same algorithm as the Lua script on a per-process bucket"""
+        now = time.monotonic()
+        
+        with self._local_lock:
+            tokens, ts = self._local.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            
+            if tokens >= 1:
+                allowed, retry_after = True, 0.0
+                tokens -= 1
+            else:
+                allowed, retry_after = False, (1 - tokens) / rate
+            
+            self._local[key] = (tokens, now)
+            if len(self._local) > self.LOCAL_MAX_BUCKETS:
+                self._prune_local(now)
+        
+        return allowed, retry_after
+    
+    def _prune_local(self, now):
+        """Drop buckets idle long enough to have refilled completely"""
+        for key, (_, ts) in list(self._local.items()):
+            if now - ts > 3600:
+                del self._local[key]
+        if len(self._local) > self.LOCAL_MAX_BUCKETS:
+            self._local.clear()
+    
+    def _client_key(self):
+        """User id for authenticated requests, otherwise the client IP"""
+        try:
+            principal = get_principal(optional=True)
+        except Exception:
+            principal = None  # invalid tokens are rejected by the route itself
+        
+        if principal is not None:
+            return f'user:{principal.user_id}'
+        return f'ip:{request.remote_addr}'
+    
+    def check_request(self):
+        """before_request hook - reject requests over their route's limit with 429"""
+        if not self.enabled or request.method == 'OPTIONS':
+            return None
+        
+        limit = self.limit_for(request.endpoint)
+        if limit is None:
+            return None
+        
+        capacity, rate = limit
+        allowed, retry_after = self.hit(f'ratelimit:{request.endpoint}:{self._client_key()}', capacity, rate)
+        if allowed:
+            return None
+        
+        response = jsonify({'error': 'Too many requests, please retry later'})
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response, 429
+
+
+# Global limiter instance
+limiter = RateLimiter()
@@ -0,0 +1,136 @@
+"""
+Task result lifecycle utilities - size guard and janitor helpers
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from app.utils.storage import storage_dir, storage_path, write_json
+
+logger = logging.getLogger(__name__)
+
+# Spilled results live in export storage under this prefix
+RESULTS_PREFIX = 'results'
+
+
+def spill_result(task_id, result):
+    """
+    Keep oversized task results out of the result backend
+    
+    Results whose JSON encoding exceeds TASK_RESULT_MAX_BYTES are written to
+    export storage and replaced by a small stub pointing at the file; use
+    load_result() to read them back.
+    """
+    limit = current_app.config.get('TASK_RESULT_MAX_BYTES')
+    if not limit or not task_id or result is None:
+        return result
+    
+    size = len(json.dumps(result, default=str))
+    if size <= limit:
+        return result
+    
+    name = f'{RESULTS_PREFIX}/{task_id}.json'
+    write_json(name, result)
+    logger.info(f'Spilled {size} byte result of task {task_id} to {name}')
+    
+    stub = {'spilled': True, 'result_file': name, 'size': size}
+    if isinstance(result, dict) and 'status' in result:
+        stub['status'] = result['status']
+    return stub
+
+
+def load_result(result):
+    """Return a task result, reading it back from storage if it was spilled"""
+    if isinstance(result, dict) and result.get('spilled'):
+        with open(storage_path(result['result_file']), encoding='utf-8') as f:
+            return json.load(f)
+    return result
+
+
+def reclaim_results(backend, expires):
+    """
+    Reclaim result backend entries that would otherwise never expire
+    
+    On Redis, task/group/chord keys without a TTL (written before
+    result_expires was set, or by a misconfigured client) are deleted once
+    older than `expires` seconds and otherwise given the remaining TTL.
+    Other backends run their own expiry cleanup. Returns a report.
+    """
+    report = {'backend': type(backend).__name__, 'scanned': 0, 'orphaned': 0, 'deleted': 0, 'bytes': 0}
+    client = getattr(backend, 'client', None)
+    
+    if client is None or not hasattr(client, 'scan_iter'):
+        backend.cleanup()
+        return report
+    
+    from kombu.utils.encoding import bytes_to_str  # janitor-only; kept out of web startup
+    
+    cutoff = datetime.utcnow() - timedelta(seconds=expires)
+    prefixes = (backend.task_keyprefix, backend.group_keyprefix, backend.chord_keyprefix)
+    
+    for prefix in prefixes:
+        for key in client.scan_iter(match=f'{bytes_to_str(prefix)}*', count=1000):
+            report['scanned'] += 1
+            if client.ttl(key) != -1:
+                continue
+            
+            report['orphaned'] += 1
+            report['bytes'] += client.memory_usage(key) or 0
+            
+            done = None
+            if prefix == backend.task_keyprefix:
+                try:
+                    done = json.loads(client.get(key) or '{}').get('date_done')
+                except ValueError:
+                    pass
+            
+            if done and datetime.fromisoformat(done).replace(tzinfo=None) < cutoff:
+                client.delete(key)
+                report['deleted'] += 1
+            else:
+                client.expire(key, expires)
+    
+    return report
+
+
+def reclaim_files(export_max_age, result_max_age, partial_max_age=3600):
+    """
+    Delete stale files from export storage
+    
+    Spilled results older than result_max_age, exports older than
+    export_max_age and abandoned partial writes (.part) older than
+    partial_max_age seconds are removed, along with emptied directories.
+    Returns a report.
+    """
+    base = storage_dir()
+    now = time.time()
+    report = {'scanned': 0, 'deleted': 0, 'bytes': 0}
+    
+    for root, dirs, files in os.walk(base, topdown=False):
+        for filename in files:
+            path = os.path.join(root, filename)
+            relative = os.path.relpath(path, base)
+            
+            if filename.endswith('.part'):
+                max_age = partial_max_age
+            elif relative.startswith(RESULTS_PREFIX + os.sep):
+                max_age = result_max_age
+            else:
+                max_age = export_max_age
+            
+            try:
+                stat = os.stat(path)
+                report['scanned'] += 1
+                if now - stat.st_mtime > max_age:
+                    os.remove(path)
+                    report['deleted'] += 1
+                    report['bytes'] += stat.st_size
+            except FileNotFoundError:
+                continue
+        
+        if root != base and not os.listdir(root):
+            os.rmdir(root)
+    
+    return report
@@ -0,0 +1,250 @@
+"""
+JWT revocation - a Redis blocklist fronted by a per-process Bloom filter
+
+Revoking a single token writes revoked:jti:<jti>; revoking every token of
+a user (account deleted) writes revoked:user:<id> holding the revocation
+time, which rejects all tokens issued up to then. Both keys expire once the
+tokens they cover would have, and are published on a pub/sub channel.
+
+Every process keeps a Bloom filter of the revoked keys, filled by a SCAN
+and kept current by a subscriber thread, so the common "not revoked" case
+is answered from memory. Only filter hits - real revocations and rare false
+positives - cost a Redis round trip. Without Redis, revocations are kept
+in-process only.
+
+The keys live in REVOCATION_REDIS_URL, a database of their own: the cache
+database is flushed by Cache.clear() and evicts under memory pressure,
+and either would silently un-revoke tokens.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import timedelta
+import redis
+from app.utils.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+JTI_PREFIX = 'revoked:jti:'
+USER_PREFIX = 'revoked:user:'
+CHANNEL = 'revocations'
+
+# Seconds between reconnect attempts of the subscriber thread
+RECONNECT_SECONDS = 5
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings - no deletes, rebuild to shrink"""
+    
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def _positions(self, item):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+    
+    def add(self, item):
+        positions = self._positions(item)
+        # Byte read-modify-writes must not interleave or a set bit is lost
+        with self._lock:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+    
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def _seconds(value, default):
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    return default
+
+
+class RevocationStore:
+    """Token blocklist checked by flask_jwt_extended on every decode"""
+    
+    def __init__(self, app=None):
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.resync_seconds = 3600
+        self.user_ttl = 30 * 86400
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._synced = False
+        self._local = {}
+        self._lock = threading.Lock()
+        self._listener_pid = None
+        self._redis = Cache(url_config='REVOCATION_REDIS_URL', purpose='Shared token revocation')
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Size the filter and the per-user TTL from the app config (connects on first use)"""
+        self._redis.init_app(app)
+        self.capacity = app.config.get('JWT_REVOCATION_BLOOM_CAPACITY', 100000)
+        self.error_rate = app.config.get('JWT_REVOCATION_BLOOM_ERROR_RATE', 0.001)
+        self.resync_seconds = app.config.get('JWT_REVOCATION_RESYNC_SECONDS', 3600)
+        # A user revocation must outlive the longest-lived token it covers
+        self.user_ttl = max(
+            _seconds(app.config.get('JWT_ACCESS_TOKEN_EXPIRES'), 3600),
+            _seconds(app.config.get('JWT_REFRESH_TOKEN_EXPIRES'), 30 * 86400)
+        )
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._synced = False
+    
+    # ----- Revoking -----
+    
+    def revoke_token(self, jti, expires_at):
+        """Revoke one token until its exp (a unix timestamp)"""
+        self._store(JTI_PREFIX + jti, time.time(), int(expires_at - time.time()) + 1)
+    
+    def revoke_user(self, user_id):
+        """Revoke every token issued to a user so far"""
+        self._store(USER_PREFIX + str(user_id), time.time(), self.user_ttl)
+    
+    def _store(self, key, revoked_at, ttl):
+        if ttl <= 0:
+            return
+        
+        # Local first: this process rejects the token even if Redis fails
+        self._filter.add(key)
+        with self._lock:
+            self._local[key] = (revoked_at, time.time() + ttl)
+            self._prune_local()
+        
+        client = self._redis.redis_client
+        if client is None:
+            return
+        
+        try:
+            pipe = client.pipeline()
+            pipe.set(key, revoked_at, ex=ttl)
+            pipe.publish(CHANNEL, key)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f'Failed to store revocation {key}: {e}')
+    
+    def _prune_local(self):
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self._local.items() if expires_at <= now]:
+            del self._local[key]
+    
+    # ----- Checking -----
+    
+    def is_token_revoked(self, jwt_header, jwt_payload):
+        """token_in_blocklist_loader callback"""
+        jti_key = JTI_PREFIX + jwt_payload['jti']
+        user_key = USER_PREFIX + str(jwt_payload['sub'])
+        issued_at = jwt_payload.get('iat', 0)
+        
+        client = self._redis.redis_client
+        if client is not None:
+            self._ensure_listener()
+        
+        hit = jti_key in self._filter or user_key in self._filter
+        if not hit and (self._synced or client is None):
+            return False
+        
+        if client is None:
+            return self._revoked_locally(jti_key, user_key, issued_at)
+        
+        try:
+            jti_revoked, user_revoked_at = client.mget(jti_key, user_key)
+        except redis.RedisError as e:
+            logger.warning(f'Revocation lookup failed, using local state: {e}')
+            return self._revoked_locally(jti_key, user_key, issued_at) or hit
+        
+        return jti_revoked is not None or (
+            user_revoked_at is not None and issued_at <= float(user_revoked_at)
+        )
+    
+    def _revoked_locally(self, jti_key, user_key, issued_at):
+        now = time.time()
+        jti_entry = self._local.get(jti_key)
+        user_entry = self._local.get(user_key)
+        return (jti_entry is not None and jti_entry[1] > now) or (
+            user_entry is not None and user_entry[1] > now and issued_at <= user_entry[0]
+        )
+    
+    # ----- Filter sync -----
+    
+    def _ensure_listener(self):
+        """Start the subscriber thread once per process (threads do not survive fork)"""
+        if self._listener_pid == os.getpid():
+            return
+        
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._synced = False
+            threading.Thread(target=self._listen, name='jwt-revocations', daemon=True).start()
+    
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                client = self._redis.redis_client
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                # Subscribe before scanning so nothing published meanwhile is missed
+                pubsub.subscribe(CHANNEL)
+                self._rebuild(client)
+                rebuilt_at = time.monotonic()
+                
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        self._filter.add(message['data'])
+                    
+                    # Expired revocations stay in the filter until it is rebuilt
+                    if time.monotonic() - rebuilt_at >= self.resync_seconds:
+                        self._rebuild(client)
+                        rebuilt_at = time.monotonic()
+            except Exception as e:
+                if self._synced:
+                    logger.warning(f'Revocation subscriber disconnected, checking Redis per request: {e}')
+                self._synced = False
+                time.sleep(RECONNECT_SECONDS)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+    
+    def _rebuild(self, client):
+        """Replace the filter with one built from the revocations in Redis"""
+        fresh = BloomFilter(self.capacity, self.error_rate)
+        for key in client.scan_iter(match='revoked:*', count=1000):
+            fresh.add(key)
+        # Keep revocations made here that Redis did not accept
+        with self._lock:
+            self._prune_local()
+            for key in self._local:
+                fresh.add(key)
+        
+        if fresh.count > self.capacity:
+            logger.warning(
+                f'{fresh.count} revoked tokens exceed JWT_REVOCATION_BLOOM_CAPACITY '
+                f'({self.capacity}); false positives will rise'
+            )
+        
+        self._filter = fresh
+        self._synced = True
+
+
+# Global revocation store
+revocations = RevocationStore()
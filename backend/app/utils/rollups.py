@@ -0,0 +1,247 @@
+"""
+Doctor activity rollups - per doctor, per month counters kept current on write
+
+Every committed change to an appointment or treatment queues a refresh of
+the doctor_monthly_stats row of each doctor-month it touched (old and new
+doctor/date on a reschedule), so reports and dashboards read one row per
+doctor instead of scanning a month of raw data. Refreshes of a doctor-month
+take its row lock before counting, so concurrent ones cannot store a stale
+count. rebuild_rollups() recomputes the whole table for backfills
+(`flask rebuild-rollups`; `flask upgrade-db` runs it when it creates the
+table).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, func, inspect, select, union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import db, Appointment, Doctor, DoctorMonthlyStats, Treatment
+
+logger = logging.getLogger(__name__)
+
+# Attributes whose changes move a row between rollups or change its counts
+TRACKED_ATTRIBUTES = {
+    Appointment: ('doctor_id', 'appointment_date', 'patient_id', 'status'),
+    Treatment: ('doctor_id', 'visit_date', 'patient_id')
+}
+
+
+def month_start(value):
+    """First day of the month containing a date"""
+    return value.replace(day=1)
+
+
+def month_end(month):
+    """Last day of the month starting at `month`"""
+    return (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def _rollup_keys(obj, check_changes):
+    """(doctor_id, month) pairs affected by a new, changed or deleted row"""
+    attributes = TRACKED_ATTRIBUTES[type(obj)]
+    state = inspect(obj)
+    
+    if check_changes and not any(state.attrs[name].history.has_changes() for name in attributes):
+        return set()
+    
+    # Current and previous values, so a move also refreshes the old month
+    doctor_ids = set(state.attrs.doctor_id.history.sum()) or {obj.doctor_id}
+    dates = set(state.attrs[attributes[1]].history.sum()) or {getattr(obj, attributes[1])}
+    
+    return {
+        (doctor_id, month_start(day))
+        for doctor_id in doctor_ids if doctor_id
+        for day in dates if day
+    }
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_rollup_keys(session, flush_context):
+    """Remember which doctor-months the flushed changes touched"""
+    keys = session.info.setdefault('rollup_keys', set())
+    
+    for collection, check_changes in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in collection:
+            if type(obj) in TRACKED_ATTRIBUTES:
+                keys |= _rollup_keys(obj, check_changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_rollup_keys(session):
+    session.info.pop('rollup_keys', None)
+
+
+@event.listens_for(db.session, 'after_commit')
+def apply_rollup_keys(session):
+    """Queue a refresh of the touched doctor-months once the change is committed"""
+    keys = session.info.pop('rollup_keys', None)
+    if not keys:
+        return
+    
+    keys = sorted(keys)
+    try:
+        from app.tasks.backend import submit
+        from app.tasks.celery_tasks import refresh_doctor_rollups
+        
+        # No result and no publish retries, so a broker outage costs one
+        # connection timeout before the refresh runs inline instead
+        args = [[doctor_id, month.isoformat()] for doctor_id, month in keys]
+        submit(refresh_doctor_rollups, args=[args], retry=False)
+        return
+    except Exception as e:
+        current_app.logger.warning(f'Failed to queue doctor rollup refresh, refreshing inline: {e}')
+    
+    # The committed session cannot run SQL here, so use a short separate
+    # transaction. A failure only leaves a rollup stale until the next
+    # change to that doctor-month or a rebuild; it never fails the request.
+    try:
+        refresh_doctor_months(keys)
+    except Exception as e:
+        current_app.logger.error(f'Failed to refresh doctor rollups {keys}: {e}')
+
+
+def refresh_doctor_months(keys):
+    """Refresh the rollups of (doctor_id, month) pairs, each in its own transaction"""
+    with Session(db.engine) as rollup_session:
+        for doctor_id, month in keys:
+            refresh_doctor_month(rollup_session, doctor_id, month)
+
+
+def _month_counts(session, doctor_id, month):
+    """Recompute one doctor-month from the indexed raw rows"""
+    first_day, last_day = month, month_end(month)
+    
+    appointment_filter = (
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date >= first_day,
+        Appointment.appointment_date <= last_day
+    )
+    treatment_filter = (
+        Treatment.doctor_id == doctor_id,
+        Treatment.visit_date >= first_day,
+        Treatment.visit_date <= last_day
+    )
+    
+    by_status = dict(
+        session.query(Appointment.status, func.count(Appointment.id))
+        .filter(*appointment_filter)
+        .group_by(Appointment.status)
+        .all()
+    )
+    treatment_records = session.query(func.count(Treatment.id)).filter(*treatment_filter).scalar()
+    
+    patients = union(
+        select(Appointment.patient_id).where(*appointment_filter),
+        select(Treatment.patient_id).where(*treatment_filter)
+    ).subquery()
+    unique_patients = session.query(func.count()).select_from(patients).scalar()
+    
+    return {
+        'total_appointments': sum(by_status.values()),
+        'scheduled_appointments': by_status.get('scheduled', 0),
+        'completed_appointments': by_status.get('completed', 0),
+        'cancelled_appointments': by_status.get('cancelled', 0),
+        'treatment_records': treatment_records,
+        'unique_patients': unique_patients
+    }
+
+
+def _lock_doctor_month(session, doctor_id, month):
+    """
+    Lock the rollup row of a doctor-month, creating it if missing
+    
+    Returns False if the doctor no longer exists.
+    """
+    for attempt in range(2):
+        # A write takes the row lock (and SQLite's database lock), so
+        # refreshes of the same doctor-month run one after the other
+        locked = session.query(DoctorMonthlyStats).filter_by(doctor_id=doctor_id, month=month).update(
+            {'updated_at': datetime.utcnow()}, synchronize_session=False
+        )
+        if locked:
+            return True
+        if session.get(Doctor, doctor_id) is None:
+            return False  # doctor deleted; its rollups went with it
+        
+        try:
+            session.add(DoctorMonthlyStats(doctor_id=doctor_id, month=month))
+            session.flush()
+            return True
+        except IntegrityError:
+            # A concurrent refresh created the row first; lock that one
+            session.rollback()
+            if attempt:
+                raise
+
+
+def refresh_doctor_month(session, doctor_id, month):
+    """
+    Recompute and store the rollup row of one doctor-month
+    
+    Counts are taken after the row lock, so of two overlapping refreshes
+    the later one sees every change committed before it and writes last.
+    """
+    if not _lock_doctor_month(session, doctor_id, month):
+        session.rollback()
+        return
+    
+    counts = _month_counts(session, doctor_id, month)
+    session.query(DoctorMonthlyStats).filter_by(doctor_id=doctor_id, month=month).update(
+        counts, synchronize_session=False
+    )
+    session.commit()
+
+
+def rebuild_rollups(chunk_size=10000):
+    """
+    Recompute the whole doctor_monthly_stats table from raw data
+    
+    Streams a narrow projection of both tables and aggregates per
+    doctor-month in Python, so it works on every database dialect.
+    Returns the number of rollup rows written.
+    """
+    counts = defaultdict(lambda: defaultdict(int))
+    patients = defaultdict(set)
+    
+    appointments = db.session.query(
+        Appointment.doctor_id, Appointment.appointment_date, Appointment.status, Appointment.patient_id
+    ).yield_per(chunk_size)
+    for doctor_id, day, status, patient_id in appointments:
+        key = (doctor_id, month_start(day))
+        counts[key]['total_appointments'] += 1
+        if status in ('scheduled', 'completed', 'cancelled'):
+            counts[key][f'{status}_appointments'] += 1
+        patients[key].add(patient_id)
+    
+    treatments = db.session.query(
+        Treatment.doctor_id, Treatment.visit_date, Treatment.patient_id
+    ).yield_per(chunk_size)
+    for doctor_id, day, patient_id in treatments:
+        key = (doctor_id, month_start(day))
+        counts[key]['treatment_records'] += 1
+        patients[key].add(patient_id)
+    
+    doctor_ids = {doctor_id for (doctor_id,) in db.session.query(Doctor.id)}
+    
+    DoctorMonthlyStats.query.delete()
+    rows = [
+        {
+            'doctor_id': doctor_id,
+            'month': month,
+            'total_appointments': values['total_appointments'],
+            'scheduled_appointments': values['scheduled_appointments'],
+            'completed_appointments': values['completed_appointments'],
+            'cancelled_appointments': values['cancelled_appointments'],
+            'treatment_records': values['treatment_records'],
+            'unique_patients': len(patients[(doctor_id, month)])
+        }
+        for (doctor_id, month), values in counts.items()
+        if doctor_id in doctor_ids
+    ]
+    if rows:
+        db.session.execute(DoctorMonthlyStats.__table__.insert(), rows)
+    db.session.commit()
+    
+    return len(rows)
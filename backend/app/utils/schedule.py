@@ -0,0 +1,31 @@
+"""
+Appointment scheduling helpers
+"""
+from datetime import datetime, time
+
+# Formats used by the booking UIs ('10:00 AM') and the API ('14:30')
+TIME_FORMATS = ('%I:%M %p', '%H:%M', '%H:%M:%S')
+
+
+def parse_appointment_time(appointment_time):
+    """Parse an appointment time string, returning None if it is not recognised"""
+    if not appointment_time:
+        return None
+    
+    value = appointment_time.strip().upper()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    
+    return None
+
+
+def appointment_start(appointment_date, appointment_time):
+    """Combine an appointment date and time string into a start datetime"""
+    if not appointment_date:
+        return None
+    
+    parsed = parse_appointment_time(appointment_time)
+    return datetime.combine(appointment_date, parsed or time(0, 0))
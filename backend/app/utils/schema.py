@@ -0,0 +1,158 @@
+"""
+Schema upgrades for existing databases
+
+db.create_all() only creates missing tables. upgrade_schema() also brings
+existing tables up to date: missing columns are added (they must be
+nullable or have a server default) and indexes that are missing or whose
+columns changed are (re)built. Columns derived from other columns are then
+backfilled for rows saved before they existed, and tables of derived data
+created here are filled from the raw rows.
+"""
+from sqlalchemy import bindparam, inspect, text, update
+from sqlalchemy.schema import CreateColumn
+from app.models import db, Appointment, DoctorMonthlyStats, WaitlistEntry
+from app.utils.rollups import rebuild_rollups
+from app.utils.schedule import appointment_start
+from app.utils.waitlist import clear_offer
+
+# Rows backfilled per statement
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade_columns(engine):
+    """Add the model columns missing from existing tables; returns 'table.column' names"""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f'Cannot add NOT NULL column {table.name}.{column.name} without a server default')
+            
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+            added.append(f'{table.name}.{column.name}')
+    
+    return added
+
+
+def _index_matches(reflected, index):
+    return (
+        reflected['column_names'] == [column.name for column in index.columns]
+        and bool(reflected['unique']) == bool(index.unique)
+    )
+
+
+def upgrade_indexes(engine):
+    """Create missing indexes and rebuild changed ones; returns their names"""
+    inspector = inspect(engine)
+    changed = []
+    
+    for table in db.metadata.sorted_tables:
+        reflected = {index['name']: index for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            current = reflected.get(index.name)
+            if current is not None and _index_matches(current, index):
+                continue
+            if current is not None:
+                index.drop(engine)
+            index.create(engine)
+            changed.append(index.name)
+    
+    return changed
+
+
+def backfill_scheduled_at():
+    """
+    Fill Appointment.scheduled_at on rows saved before the column existed
+    
+    Without it those appointments never get an "N hours before" reminder.
+    Returns the number of rows filled.
+    """
+    table = Appointment.__table__
+    statement = update(table).where(table.c.id == bindparam('row_id')).values(
+        scheduled_at=bindparam('start'),
+        updated_at=table.c.updated_at  # a backfill is not an edit
+    )
+    last_id = 0
+    filled = 0
+    
+    while True:
+        rows = db.session.query(
+            Appointment.id, Appointment.appointment_date, Appointment.appointment_time
+        ).filter(
+            Appointment.scheduled_at.is_(None),
+            Appointment.id > last_id
+        ).order_by(Appointment.id).limit(BACKFILL_BATCH_SIZE).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        params = [
+            {'row_id': row.id, 'start': appointment_start(row.appointment_date, row.appointment_time)}
+            for row in rows
+        ]
+        params = [param for param in params if param['start'] is not None]
+        if params:
+            db.session.execute(statement, params)
+            db.session.commit()
+            filled += len(params)
+    
+    return filled
+
+
+def cancel_duplicate_waitlist_entries():
+    """
+    Cancel all but one active waitlist entry per patient and doctor (or department)
+    
+    Older databases allowed duplicates, which the unique indexes on active
+    entries reject. A pending offer is kept over waiting entries, then the
+    oldest request. Returns the number of entries cancelled.
+    """
+    entries = WaitlistEntry.query.filter(WaitlistEntry.status.in_(['waiting', 'offered'])).all()
+    entries.sort(key=lambda entry: (entry.status != 'offered', entry.requested_at, entry.id))
+    
+    seen = set()
+    cancelled = 0
+    for entry in entries:
+        key = (entry.patient_id, entry.doctor_id, None if entry.doctor_id else entry.department)
+        if key in seen:
+            clear_offer(entry, 'cancelled')
+            cancelled += 1
+        seen.add(key)
+    
+    db.session.commit()
+    return cancelled
+
+
+def upgrade_schema():
+    """
+    Create missing tables and bring existing ones up to date
+    
+    Safe to run repeatedly. Returns a list of the changes made.
+    """
+    engine = db.engine
+    existing = set(inspect(engine).get_table_names())
+    db.create_all()
+    
+    changes = [f'created table {table.name}' for table in db.metadata.sorted_tables if table.name not in existing]
+    changes += [f'added column {name}' for name in upgrade_columns(engine)]
+    
+    cancelled = cancel_duplicate_waitlist_entries()
+    if cancelled:
+        changes.append(f'cancelled {cancelled} duplicate waitlist entries')
+    changes += [f'built index {name}' for name in upgrade_indexes(engine)]
+    
+    # The rollups are only kept current from here on; start from the raw data
+    if DoctorMonthlyStats.__tablename__ not in existing:
+        changes.append(f'rebuilt {rebuild_rollups()} doctor monthly rollups')
+    
+    filled = backfill_scheduled_at()
+    if filled:
+        changes.append(f'backfilled appointments.scheduled_at on {filled} rows')
+    return changes
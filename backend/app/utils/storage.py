@@ -0,0 +1,149 @@
+"""
+Local file storage utilities for generated exports
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+from datetime import date, datetime
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer
+
+
+class _HashingWriter(io.RawIOBase):
+    """Binary writer that checksums and counts the bytes passing through it"""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+
+def storage_dir():
+    """Return the export storage directory, creating it if needed"""
+    path = current_app.config['EXPORT_STORAGE_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def storage_path(name):
+    """Resolve a stored file name to an absolute path inside the storage directory"""
+    base = os.path.abspath(storage_dir())
+    path = os.path.abspath(os.path.join(base, name))
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError('Invalid storage path')
+    return path
+
+
+def _write_gzip_text(name, write_body):
+    """
+    Write a gzip-compressed text file in the storage directory
+    
+    write_body receives the text stream and returns the number of records
+    written. The file is written under a temporary name and moved into place
+    once complete. Returns the file metadata.
+    """
+    path = storage_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.part'
+    
+    with open(tmp_path, 'wb') as raw:
+        hashing = _HashingWriter(raw)
+        with gzip.GzipFile(filename=os.path.basename(name)[:-3], mode='wb', fileobj=hashing) as gz:
+            text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+            row_count = write_body(text)
+            text.flush()
+            text.detach()
+    
+    os.replace(tmp_path, path)
+    
+    return {
+        'name': name,
+        'path': path,
+        'size': hashing.size,
+        'row_count': row_count,
+        'sha256': hashing.sha256.hexdigest()
+    }
+
+
+def write_csv_gz(name, header, rows):
+    """
+    Stream rows into a gzip-compressed CSV in the storage directory
+    
+    Rows are written as they are produced, so memory use does not grow with
+    the export. Returns the file metadata.
+    """
+    def write_body(text):
+        writer = csv.writer(text)
+        writer.writerow(header)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+    
+    return _write_gzip_text(name, write_body)
+
+
+def write_jsonl_gz(name, records):
+    """Stream dict records into a gzip-compressed JSON Lines file"""
+    def write_body(text):
+        count = 0
+        for record in records:
+            text.write(json.dumps(record, default=_json_default, separators=(',', ':')))
+            text.write('\n')
+            count += 1
+        return count
+    
+    return _write_gzip_text(name, write_body)
+
+
+def write_json(name, data):
+    """Write a small JSON document (e.g. a manifest) in the storage directory"""
+    path = storage_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.part'
+    
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=_json_default, indent=2)
+    
+    os.replace(tmp_path, path)
+    return path
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _download_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='export-download')
+
+
+def sign_download(name, owner_id):
+    """Create a signed token granting download access to a stored file"""
+    return _download_serializer().dumps({'name': name, 'owner_id': owner_id})
+
+
+def verify_download(token):
+    """
+    Decode a download token, returning its payload
+    
+    Raises itsdangerous.BadSignature (or SignatureExpired) if the token is
+    invalid or older than EXPORT_URL_EXPIRES seconds.
+    """
+    return _download_serializer().loads(
+        token,
+        max_age=current_app.config.get('EXPORT_URL_EXPIRES', 3600)
+    )
@@ -0,0 +1,222 @@
+"""
+Request timing - Server-Timing headers and a slow-request log
+
+Each request's wall time is split into phases:
+    auth     - access token decode and revocation check
+    db       - SQL, from SQLAlchemy cursor events (also gives the query
+               count and the slowest statement)
+    cache    - Redis cache reads and writes
+    json     - response encoding
+    compress - response compression
+Phases may overlap (a profile lookup during auth counts as auth and db)
+and do not add up to the total, which also covers view code and hooks.
+
+They are sent as a Server-Timing header (shown in the browser dev tools)
+and requests slower than SLOW_REQUEST_MS are logged as one JSON record.
+Statements are logged without their parameters, which may hold patient
+data. Batch sub-requests count towards the batch request.
+"""
+import json
+import logging
+import threading
+from functools import wraps
+from time import perf_counter
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Like the principal, kept on the request environ: g is shared by requests
+# made inside an existing app context (batch sub-requests, tests)
+TIMINGS_ENVIRON_KEY = 'hms.timings'
+
+PHASES = ('auth', 'db', 'cache', 'json', 'compress')
+
+# Longest statement text kept for the slow-request log
+MAX_STATEMENT_CHARS = 2000
+
+_sql_hooks_installed = False
+
+
+class RequestTimings:
+    """Seconds spent per phase by one request, and its SQL statistics"""
+    
+    def __init__(self, owner=None):
+        self.owner = owner  # the environ of the request that reports these timings
+        self.started = perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.query_count = 0
+        self.slowest_query = None  # (seconds, statement)
+        # Parallel batch sub-requests add from several threads
+        self._lock = threading.Lock()
+    
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] += seconds
+    
+    def add_query(self, statement, seconds):
+        """Count one statement (a string or SQLAlchemy statement, stringified only if logged)"""
+        with self._lock:
+            self.phases['db'] += seconds
+            self.query_count += 1
+            if self.slowest_query is None or seconds > self.slowest_query[0]:
+                self.slowest_query = (seconds, statement)
+    
+    def measure(self, phase):
+        return _Measure(self, phase)
+    
+    def server_timing(self, total):
+        """Server-Timing header value, listing the phases that took any time"""
+        queries = f'{self.query_count} quer{"y" if self.query_count == 1 else "ies"}'
+        entries = [
+            f'{name};dur={seconds * 1000:.2f}' + (f';desc="{queries}"' if name == 'db' else '')
+            for name, seconds in self.phases.items() if seconds
+        ]
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+    
+    def record(self, total, **request_info):
+        """The slow-request log record"""
+        slowest = None
+        if self.slowest_query is not None:
+            seconds, statement = self.slowest_query
+            slowest = {
+                'duration_ms': round(seconds * 1000, 2),
+                'statement': ' '.join(str(statement).split())[:MAX_STATEMENT_CHARS]
+            }
+        
+        return dict(
+            request_info,
+            duration_ms=round(total * 1000, 2),
+            phases_ms={name: round(seconds * 1000, 2) for name, seconds in self.phases.items()},
+            query_count=self.query_count,
+            slowest_query=slowest
+        )
+
+
+class _Measure:
+    """Context manager adding the enclosed block's duration to a phase"""
+    
+    __slots__ = ('timings', 'phase', 'started')
+    
+    def __init__(self, timings, phase):
+        self.timings = timings
+        self.phase = phase
+    
+    def __enter__(self):
+        self.started = perf_counter()
+    
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings.add(self.phase, perf_counter() - self.started)
+
+
+def current_timings():
+    """The current request's RequestTimings, or None when not timing"""
+    if not has_request_context():
+        return None
+    return request.environ.get(TIMINGS_ENVIRON_KEY)
+
+
+def phase(name):
+    """Count the enclosed block towards a phase of the current request"""
+    return _Measure(current_timings(), name)
+
+
+def timed(name):
+    """Decorator form of phase()"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            timings = current_timings()
+            if timings is None:
+                return fn(*args, **kwargs)
+            started = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timings.add(name, perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and current_timings() is not None:
+        context._hms_query_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_hms_query_started', None)
+    timings = current_timings()
+    if started is not None and timings is not None:
+        timings.add_query(statement, perf_counter() - started)
+
+
+def _install_sql_hooks():
+    """Time every statement of every engine (once per process)"""
+    global _sql_hooks_installed
+    
+    if not _sql_hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _sql_hooks_installed = True
+
+
+class RequestTimer:
+    """before/after_request hooks timing each request"""
+    
+    def __init__(self, app=None):
+        self.enabled = False
+        self.header = True
+        self.slow_ms = 1000
+        if app:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """
+        Read the timing settings and register the hooks
+        
+        Call before the other extensions register theirs: this before_request
+        hook then runs first and this after_request hook last.
+        """
+        self.enabled = app.config.get('REQUEST_TIMING_ENABLED', True)
+        self.header = app.config.get('SERVER_TIMING_HEADER', True)
+        self.slow_ms = app.config.get('SLOW_REQUEST_MS', 1000)
+        if not self.enabled:
+            return
+        
+        _install_sql_hooks()
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+    
+    def start_request(self):
+        # A batch sub-request arrives with its batch's timings already set
+        if TIMINGS_ENVIRON_KEY not in request.environ:
+            request.environ[TIMINGS_ENVIRON_KEY] = RequestTimings(owner=request.environ)
+    
+    def finish_request(self, response):
+        timings = request.environ.get(TIMINGS_ENVIRON_KEY)
+        if timings is None or timings.owner is not request.environ:
+            return response
+        
+        header = self.report(timings, method=request.method, path=request.path,
+                             endpoint=request.endpoint, status=response.status_code)
+        if header:
+            response.headers['Server-Timing'] = header
+        return response
+    
+    def report(self, timings, **request_info):
+        """
+        Log the request if it was slow; returns the Server-Timing value to
+        send, or None if the header is disabled
+        """
+        total = perf_counter() - timings.started
+        if self.slow_ms and total * 1000 >= self.slow_ms:
+            record = timings.record(total, **request_info)
+            logger.warning(f'Slow request {json.dumps(record)}', extra={'slow_request': record})
+        
+        return timings.server_timing(total) if self.header else None
+
+
+timer = RequestTimer()
@@ -0,0 +1,148 @@
+"""
+Waitlist utilities - matching freed appointment slots to waiting patients
+"""
+from datetime import datetime, date, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Appointment, Doctor, WaitlistEntry
+
+
+def _queue_head(query, exclude_patient_ids):
+    """Return the highest-priority waiting entry of an indexed queue"""
+    query = query.filter(WaitlistEntry.status == 'waiting')
+    if exclude_patient_ids:
+        query = query.filter(~WaitlistEntry.patient_id.in_(exclude_patient_ids))
+    return query.order_by(
+        WaitlistEntry.urgent.desc(),
+        WaitlistEntry.requested_at.asc()
+    ).first()
+
+
+def find_next_entry(doctor, exclude_patient_ids=None):
+    """
+    Find the next eligible waitlist entry for a doctor's freed slot.
+    
+    Looks at the head of the doctor's own queue and of the department queue
+    (entries that accept any doctor of that specialization) and picks the
+    better of the two, so only two index seeks are needed per slot.
+    """
+    exclude_patient_ids = exclude_patient_ids or []
+    
+    doctor_head = _queue_head(
+        WaitlistEntry.query.filter(WaitlistEntry.doctor_id == doctor.id),
+        exclude_patient_ids
+    )
+    department_head = _queue_head(
+        WaitlistEntry.query.filter(
+            WaitlistEntry.doctor_id.is_(None),
+            WaitlistEntry.department == doctor.specialization
+        ),
+        exclude_patient_ids
+    )
+    
+    candidates = [entry for entry in (doctor_head, department_head) if entry]
+    if not candidates:
+        return None
+    
+    return min(candidates, key=lambda entry: (not entry.urgent, entry.requested_at))
+
+
+def slot_is_held(doctor_id, appointment_date, appointment_time, ignore_entry_id=None):
+    """Check whether a slot is held by a pending waitlist offer"""
+    held = WaitlistEntry.query.filter(
+        WaitlistEntry.status == 'offered',
+        WaitlistEntry.offered_doctor_id == doctor_id,
+        WaitlistEntry.offered_date == appointment_date,
+        WaitlistEntry.offered_time == appointment_time,
+        WaitlistEntry.offer_expires_at > datetime.utcnow()
+    )
+    if ignore_entry_id:
+        held = held.filter(WaitlistEntry.id != ignore_entry_id)
+    
+    return held.first() is not None
+
+
+def slot_is_taken(doctor_id, appointment_date, appointment_time, ignore_entry_id=None):
+    """Check whether a slot is booked or currently held by another offer"""
+    booked = Appointment.query.filter_by(
+        doctor_id=doctor_id,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        status='scheduled'
+    ).first()
+    if booked:
+        return True
+    
+    return slot_is_held(doctor_id, appointment_date, appointment_time, ignore_entry_id)
+
+
+def offer_slot(doctor_id, appointment_date, appointment_time, exclude_patient_ids=None):
+    """
+    Offer a freed slot to the next eligible waitlisted patient.
+    
+    The entry is claimed with a conditional update (it must still be
+    waiting) and the slot by the unique index on held slots, so concurrent
+    offers never hold one slot for two patients or give one entry two
+    slots. A patient has at most one active entry per doctor or department.
+    Returns the offered entry, or None if the slot is gone or nobody is
+    waiting.
+    """
+    if appointment_date < date.today():
+        return None
+    
+    doctor = Doctor.query.get(doctor_id)
+    if not doctor:
+        return None
+    
+    hold_minutes = current_app.config.get('WAITLIST_HOLD_MINUTES', 30)
+    
+    while True:
+        if slot_is_taken(doctor_id, appointment_date, appointment_time):
+            return None
+        
+        entry = find_next_entry(doctor, exclude_patient_ids)
+        if not entry:
+            return None
+        
+        try:
+            claimed = WaitlistEntry.query.filter_by(id=entry.id, status='waiting').update({
+                'status': 'offered',
+                'offered_doctor_id': doctor.id,
+                'offered_date': appointment_date,
+                'offered_time': appointment_time,
+                'offer_expires_at': datetime.utcnow() + timedelta(minutes=hold_minutes)
+            }, synchronize_session=False)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return None  # another offer holds the slot
+        
+        if claimed:
+            return WaitlistEntry.query.get(entry.id)
+        # Another task offered this entry a different slot; try the next one
+
+
+def clear_offer(entry, status):
+    """Drop the held slot from an entry and move it to a new status"""
+    entry.status = status
+    entry.offered_doctor_id = None
+    entry.offered_date = None
+    entry.offered_time = None
+    entry.offer_expires_at = None
+
+
+def notify_slot_freed(doctor_id, appointment_date, appointment_time, exclude_patient_ids=None):
+    """Queue the async job that offers a freed slot to the waitlist"""
+    try:
+        from app.tasks.backend import submit
+        from app.tasks.celery_tasks import offer_freed_slot
+        
+        submit(offer_freed_slot, args=[
+            doctor_id,
+            appointment_date.isoformat(),
+            appointment_time,
+            exclude_patient_ids or []
+        ])
+    except Exception as e:
+        # A missing broker must never fail the cancellation itself
+        current_app.logger.warning(f'Failed to queue waitlist offer: {e}')
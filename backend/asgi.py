@@ -0,0 +1,15 @@
+"""
+Production ASGI entry point
+
+    uvicorn asgi:app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+Serves the async read routes natively and everything else through Flask
+(see app/asgi.py). FLASK_CONFIG selects the config class (production by
+default).
+"""
+import os
+from app import create_app
+from app.asgi import create_asgi_app
+
+app = create_asgi_app(create_app(os.environ.get('FLASK_CONFIG', 'production')))
@@ -0,0 +1,157 @@
+"""
+Async serving benchmark
+Seeds a scratch SQLite database (see bench_serving), then opens --concurrency
+keep-alive connections at once against each serving mode and drives the
+async read routes round-robin:
+  - gthread   gunicorn -c gunicorn.conf.py wsgi:app (the sync deployment)
+  - asgi      uvicorn asgi:app, async routes on the async engine
+  - asgi-sync uvicorn asgi:app with ASYNC_ROUTES_ENABLED=false, i.e. every
+              request through Flask on the fall-through thread pool
+Reports requests per second, p50/p99 latency and errors per mode.
+
+The client is a minimal asyncio HTTP/1.1 client so that a thousand
+connections fit in one process. It shares the machine with the server;
+compare modes with each other rather than reading the numbers as capacity.
+
+Usage:
+    python benchmarks/bench_async.py --concurrency 1000 --duration 15
+    python benchmarks/bench_async.py --modes gthread asgi --workers 4
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_serving import BACKEND_DIR, ENDPOINTS, seed
+
+MODES = {
+    'gthread': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], {}),
+    'asgi': ([sys.executable, '-m', 'uvicorn', 'asgi:app'], {'ASYNC_ROUTES_ENABLED': 'true'}),
+    'asgi-sync': ([sys.executable, '-m', 'uvicorn', 'asgi:app'], {'ASYNC_ROUTES_ENABLED': 'false'})
+}
+
+
+def start_server(mode, port, args, env):
+    command, extra_env = MODES[mode]
+    env = dict(env, **extra_env)
+    if command[2] == 'gunicorn':
+        env.update(GUNICORN_WORKER_CLASS='gthread', GUNICORN_BIND=f'127.0.0.1:{port}',
+                   GUNICORN_WORKERS=str(args.workers), GUNICORN_THREADS=str(args.threads),
+                   GUNICORN_ACCESS_LOG='')
+    else:
+        command = command + ['--port', str(port), '--workers', str(args.workers), '--backlog', '2048',
+                             '--no-access-log', '--log-level', 'warning']
+    
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                connection.close()
+                return process
+        except OSError:
+            time.sleep(0.2)
+    
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+async def fetch(reader, writer, path, token):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {token}\r\n'
+                 f'Accept-Encoding: identity\r\n\r\n'.encode('latin-1'))
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    
+    length = None
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    if length is None:
+        raise ConnectionError('response without Content-Length')
+    
+    await reader.readexactly(length)
+    return status
+
+
+async def drive(port, tokens, duration, concurrency):
+    """Hit ENDPOINTS round-robin from concurrency simultaneous keep-alive clients"""
+    latencies = []
+    errors = [0]
+    stop_at = time.monotonic() + duration
+    
+    async def client(offset):
+        i = offset
+        connection = None
+        while time.monotonic() < stop_at:
+            role, path = ENDPOINTS[i % len(ENDPOINTS)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection('127.0.0.1', port)
+                if await fetch(*connection, path, tokens[role]) != 200:
+                    errors[0] += 1
+                    continue
+            except (OSError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+                errors[0] += 1
+                if connection is not None:
+                    connection[1].close()
+                connection = None
+                await asyncio.sleep(0.05)
+                continue
+            latencies.append(time.perf_counter() - started)
+        if connection is not None:
+            connection[1].close()
+    
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    return sorted(latencies), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--workers', type=int, default=2, help='server processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gthread worker')
+    parser.add_argument('--duration', type=float, default=15, help='seconds per mode')
+    parser.add_argument('--concurrency', type=int, default=1000, help='simultaneous client connections')
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+    
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench-async.db')
+    tokens = seed(database_url)
+    env = dict(os.environ, DATABASE_URL=database_url, RATE_LIMIT_ENABLED='false', TASK_BACKEND='local')
+    
+    print(f'workers={args.workers} gthread threads={args.threads} '
+          f'clients={args.concurrency} duration={args.duration}s')
+    for mode in args.modes:
+        process = start_server(mode, args.port, args, env)
+        try:
+            asyncio.run(drive(args.port, tokens, 2, min(args.concurrency, 50)))  # warm up
+            latencies, errors = asyncio.run(drive(args.port, tokens, args.duration, args.concurrency))
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+        
+        if not latencies:
+            print(f'{mode:10s} no successful requests ({errors} errors)')
+            continue
+        
+        print(f'{mode:10s} {len(latencies) / args.duration:8.1f} req/s '
+              f'p50={statistics.median(latencies) * 1000:.1f}ms '
+              f'p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms '
+              f'errors={errors}')
+
+
+if __name__ == '__main__':
+    main()
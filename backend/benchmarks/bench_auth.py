@@ -0,0 +1,99 @@
+"""
+Per-request authentication overhead benchmark
+Seeds a scratch SQLite database with a doctor and a patient, logs both in,
+then times protected GETs through the Flask test client. Besides latency it
+counts, per request, how many times the access token was decoded and how
+many SQL statements ran, so the cost of the auth layer is visible apart
+from the handler's own queries.
+
+Usage:
+    python benchmarks/bench_auth.py --requests 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = (
+    ('patient', '/api/patient/departments'),
+    ('patient', '/api/patient/appointments'),
+    ('doctor', '/api/doctor/appointments'),
+    ('doctor', '/api/doctor/profile'),
+    ('patient', '/api/auth/me')
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per endpoint')
+    args = parser.parse_args()
+    
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench-auth.db')
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    from datetime import date
+    from flask_jwt_extended import view_decorators
+    from sqlalchemy import event
+    from app import create_app
+    from app.models import db, User, Doctor, Patient
+    from app.utils.passwords import hash_password
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        password_hash = hash_password('bench-password')
+        doctor_user = User(email='doctor@bench', password_hash=password_hash, role='doctor')
+        patient_user = User(email='patient@bench', password_hash=password_hash, role='patient')
+        db.session.add_all([doctor_user, patient_user])
+        db.session.flush()
+        db.session.add(Doctor(user_id=doctor_user.id, name='Bench Doctor', phone='555',
+                              specialization='Cardiology', qualification='MD', experience=10))
+        db.session.add(Patient(user_id=patient_user.id, name='Bench Patient', age=40, gender='F',
+                               phone='555', registration_date=date.today()))
+        db.session.commit()
+        
+        counts = {'decodes': 0, 'queries': 0}
+        decode = view_decorators._decode_jwt_from_request
+        
+        def counting_decode(*a, **kw):
+            counts['decodes'] += 1
+            return decode(*a, **kw)
+        
+        view_decorators._decode_jwt_from_request = counting_decode
+        
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*a):
+            counts['queries'] += 1
+    
+    client = app.test_client()
+    headers = {}
+    for role in ('doctor', 'patient'):
+        response = client.post('/api/auth/login', json={'email': f'{role}@bench', 'password': 'bench-password'})
+        headers[role] = {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+    
+    for role, path in ENDPOINTS:
+        # Warm up
+        for _ in range(20):
+            assert client.get(path, headers=headers[role]).status_code == 200
+        
+        counts.update(decodes=0, queries=0)
+        latencies = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            client.get(path, headers=headers[role])
+            latencies.append(time.perf_counter() - started)
+        
+        ordered = sorted(latencies)
+        print(f'{path:28s} mean={statistics.mean(ordered) * 1000:.3f}ms '
+              f'p50={statistics.median(ordered) * 1000:.3f}ms '
+              f'p99={ordered[int(len(ordered) * 0.99) - 1] * 1000:.3f}ms '
+              f'decodes/req={counts["decodes"] / args.requests:.1f} '
+              f'queries/req={counts["queries"] / args.requests:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Dashboard fan-out benchmark - separate requests vs /api/batch
+Seeds a scratch SQLite database with a patient, a few doctors and some
+appointments, then times the patient dashboard's initial calls issued one
+by one, as one sequential batch and as one parallel batch. Token decodes
+and SQL statements are counted per dashboard load.
+
+Usage:
+    python benchmarks/bench_batch.py --loads 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DASHBOARD = (
+    '/api/auth/me',
+    '/api/patient/departments',
+    '/api/patient/doctors',
+    '/api/patient/appointments',
+    '/api/patient/history'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loads', type=int, default=500, help='dashboard loads per mode')
+    args = parser.parse_args()
+    
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench-batch.db')
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    from datetime import date, timedelta
+    from flask_jwt_extended import view_decorators
+    from sqlalchemy import event
+    from app import create_app
+    from app.models import db, User, Doctor, Patient, Appointment
+    from app.utils.passwords import hash_password
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        password_hash = hash_password('bench-password')
+        patient_user = User(email='patient@bench', password_hash=password_hash, role='patient')
+        db.session.add(patient_user)
+        db.session.flush()
+        patient = Patient(user_id=patient_user.id, name='Bench Patient', age=40, gender='F',
+                          phone='555', registration_date=date.today())
+        db.session.add(patient)
+        for i in range(10):
+            doctor_user = User(email=f'doctor{i}@bench', password_hash=password_hash, role='doctor')
+            db.session.add(doctor_user)
+            db.session.flush()
+            doctor = Doctor(user_id=doctor_user.id, name=f'Doctor {i}', phone='555',
+                            specialization='Cardiology', qualification='MD', experience=10)
+            db.session.add(doctor)
+            db.session.flush()
+            db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id,
+                                       appointment_date=date.today() + timedelta(days=i),
+                                       appointment_time='10:00 AM', status='scheduled'))
+        db.session.commit()
+        
+        counts = {'decodes': 0, 'queries': 0}
+        decode = view_decorators._decode_jwt_from_request
+        
+        def counting_decode(*a, **kw):
+            counts['decodes'] += 1
+            return decode(*a, **kw)
+        
+        view_decorators._decode_jwt_from_request = counting_decode
+        
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*a):
+            counts['queries'] += 1
+    
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'email': 'patient@bench', 'password': 'bench-password'})
+    headers = {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+    batch = [{'path': path} for path in DASHBOARD]
+    
+    def separate():
+        for path in DASHBOARD:
+            assert client.get(path, headers=headers).status_code == 200
+    
+    def batched(parallel):
+        def load():
+            response = client.post('/api/batch', headers=headers, json={'requests': batch, 'parallel': parallel})
+            assert all(item['status'] == 200 for item in response.get_json()['responses'])
+        return load
+    
+    for label, load in (('separate', separate), ('batch', batched(False)), ('batch parallel', batched(True))):
+        # Warm up
+        for _ in range(20):
+            load()
+        
+        counts.update(decodes=0, queries=0)
+        latencies = []
+        for _ in range(args.loads):
+            started = time.perf_counter()
+            load()
+            latencies.append(time.perf_counter() - started)
+        
+        ordered = sorted(latencies)
+        print(f'{label:15s} mean={statistics.mean(ordered) * 1000:.3f}ms '
+              f'p50={statistics.median(ordered) * 1000:.3f}ms '
+              f'p99={ordered[int(len(ordered) * 0.99) - 1] * 1000:.3f}ms '
+              f'decodes/load={counts["decodes"] / args.loads:.1f} '
+              f'queries/load={counts["queries"] / args.loads:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Bulk export benchmark
+Seeds a scratch SQLite database with N appointments and treatments, then
+exports them serially and with a process pool (the same partition/shard code
+the Celery group runs), reporting throughput for each.
+
+Usage:
+    python benchmarks/bench_bulk_export.py --rows 1000000 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_app = None
+
+
+def _make_app(database_url, storage_dir):
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    
+    app = create_app()
+    app.config['EXPORT_STORAGE_DIR'] = storage_dir
+    app.config['EXPORT_CHUNK_SIZE'] = 5000
+    return app
+
+
+def _init_worker(database_url, storage_dir):
+    global _app
+    _app = _make_app(database_url, storage_dir)
+
+
+def _run_shard(args):
+    from app.utils.bulk_export import export_shard
+    
+    with _app.app_context():
+        return export_shard(*args)
+
+
+def seed(app, rows):
+    """Bulk insert rows appointments and rows treatments"""
+    from app.models import db, User, Doctor, Patient, Appointment, Treatment
+    
+    with app.app_context():
+        db.create_all()
+        if Appointment.query.count() >= rows:
+            return
+        
+        users = [{'email': f'user{i}@bench', 'password_hash': 'x', 'role': 'doctor' if i < 50 else 'patient'}
+                 for i in range(1050)]
+        db.session.execute(User.__table__.insert(), users)
+        db.session.execute(Doctor.__table__.insert(), [
+            {'user_id': i + 1, 'name': f'Dr {i}', 'phone': '1', 'specialization': 'Cardiology',
+             'qualification': 'MD', 'experience': 5} for i in range(50)
+        ])
+        db.session.execute(Patient.__table__.insert(), [
+            {'user_id': i + 51, 'name': f'Patient {i}', 'age': 40, 'gender': 'F', 'phone': '1'}
+            for i in range(1000)
+        ])
+        
+        start = date(2020, 1, 1)
+        batch = 50000
+        for offset in range(0, rows, batch):
+            count = min(batch, rows - offset)
+            db.session.execute(Appointment.__table__.insert(), [
+                {'patient_id': (i % 1000) + 1, 'doctor_id': (i % 50) + 1,
+                 'appointment_date': start + timedelta(days=i % 2000), 'appointment_time': '10:00 AM',
+                 'reason': 'Routine check-up', 'status': 'completed'}
+                for i in range(offset, offset + count)
+            ])
+            db.session.execute(Treatment.__table__.insert(), [
+                {'patient_id': (i % 1000) + 1, 'doctor_id': (i % 50) + 1,
+                 'visit_date': start + timedelta(days=i % 2000), 'symptoms': 'Fever and cough',
+                 'diagnosis': 'Viral infection', 'prescription': 'Rest, fluids'}
+                for i in range(offset, offset + count)
+            ])
+        db.session.commit()
+
+
+def plan(app, partition_size):
+    from app.utils.bulk_export import plan_partitions
+    
+    with app.app_context():
+        shards = []
+        for entity in ('appointments', 'treatments'):
+            for start, end in plan_partitions(entity, 'id', partition_size):
+                shards.append(('bench', entity, 'csv', 'id', start, end, len(shards)))
+        return shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='rows per table')
+    parser.add_argument('--partition-size', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--database', help='reuse an existing scratch SQLite file')
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='bench-export-')
+    database_url = 'sqlite:///' + (args.database or os.path.join(workdir, 'bench.db'))
+    app = _make_app(database_url, os.path.join(workdir, 'exports'))
+    
+    started = time.perf_counter()
+    seed(app, args.rows)
+    print(f'Seeded {args.rows:,} rows per table in {time.perf_counter() - started:.1f}s')
+    
+    shards = plan(app, args.partition_size)
+    total_rows = 2 * args.rows
+    
+    started = time.perf_counter()
+    _init_worker(database_url, os.path.join(workdir, 'exports'))
+    for shard in shards:
+        _run_shard(shard)
+    serial = time.perf_counter() - started
+    print(f'Serial:   {len(shards)} shards, {serial:.1f}s, {total_rows / serial:,.0f} rows/s')
+    
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker,
+                             initargs=(database_url, os.path.join(workdir, 'exports'))) as pool:
+        results = list(pool.map(_run_shard, shards))
+    parallel = time.perf_counter() - started
+    exported = sum(result['row_count'] for result in results)
+    print(f'Parallel: {len(shards)} shards, {args.workers} workers, {parallel:.1f}s, '
+          f'{exported / parallel:,.0f} rows/s ({serial / parallel:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+JSON encoding and response compression benchmark
+Seeds a scratch SQLite database with N appointments, then for the big list
+endpoints reports:
+  - encode time of the endpoint's payload with Flask's stdlib provider and
+    with the app's provider (orjson when installed)
+  - bytes on the wire and request latency for identity, gzip and (when the
+    brotli package is installed) brotli responses
+  - the same for the ?format=columnar and ?fields= representations
+
+Usage:
+    python benchmarks/bench_json.py --rows 20000
+    python benchmarks/bench_json.py --rows 20000 --gzip-level 1 --brotli-quality 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = (
+    ('admin', '/api/admin/appointments', 'id,patient_name,appointment_date,status'),
+    ('admin', '/api/admin/patients', 'id,name'),
+    ('doctor', '/api/doctor/appointments', 'id,patient_name,appointment_date,appointment_time')
+)
+
+
+def seed(app, rows):
+    """Bulk insert one doctor-heavy hospital with rows appointments"""
+    from app.models import db, User, Doctor, Patient, Appointment
+    
+    with app.app_context():
+        db.create_all()
+        patients = max(1, rows // 10)
+        db.session.execute(User.__table__.insert(), [
+            {'email': 'admin@bench', 'password_hash': 'x', 'role': 'admin'}
+        ] + [
+            {'email': f'user{i}@bench', 'password_hash': 'x', 'role': 'doctor' if i < 20 else 'patient'}
+            for i in range(20 + patients)
+        ])
+        db.session.execute(Doctor.__table__.insert(), [
+            {'user_id': i + 2, 'name': f'Dr {i}', 'phone': '555-0100', 'specialization': 'Cardiology',
+             'qualification': 'MD', 'experience': 5} for i in range(20)
+        ])
+        db.session.execute(Patient.__table__.insert(), [
+            {'user_id': i + 22, 'name': f'Patient {i}', 'age': 40, 'gender': 'F', 'phone': '555-0101',
+             'registration_date': date(2024, 1, 1)} for i in range(patients)
+        ])
+        start = date(2024, 1, 1)
+        db.session.execute(Appointment.__table__.insert(), [
+            {'patient_id': (i % patients) + 1, 'doctor_id': (i % 20) + 1,
+             'appointment_date': start + timedelta(days=i % 700), 'appointment_time': '10:00 AM',
+             'reason': 'Routine check-up', 'status': 'completed'}
+            for i in range(rows)
+        ])
+        db.session.commit()
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='appointments to seed')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--gzip-level', type=int, default=6)
+    parser.add_argument('--brotli-quality', type=int, default=4)
+    args = parser.parse_args()
+    
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench-json.db')
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    from flask.json.provider import DefaultJSONProvider
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from app.utils import compression, json_provider
+    from app.utils.auth import token_claims
+    from app.utils.compression import compressor
+    
+    app = create_app()
+    compressor.gzip_level = args.gzip_level
+    compressor.brotli_quality = args.brotli_quality
+    seed(app, args.rows)
+    
+    with app.app_context():
+        headers = {
+            'admin': {'Authorization': 'Bearer ' + create_access_token(1, additional_claims=token_claims('admin', None))},
+            'doctor': {'Authorization': 'Bearer ' + create_access_token(2, additional_claims=token_claims('doctor', 1))}
+        }
+    
+    print(f'orjson: {"yes" if json_provider.orjson else "no (stdlib fallback)"}, '
+          f'brotli: {"yes" if compression.brotli else "no"}, rows: {args.rows}')
+    
+    client = app.test_client()
+    encodings = ['identity', 'gzip'] + (['br'] if compression.brotli else [])
+    
+    for role, path, fields in ENDPOINTS:
+        payload = client.get(path, headers={**headers[role], 'Accept-Encoding': 'identity'}).get_json()
+        print(f'\n{path} ({len(payload)} items)')
+        
+        with app.app_context():
+            stdlib = DefaultJSONProvider(app)
+            stdlib_ms, stdlib_response = timed(lambda: stdlib.response(payload), args.repeat)
+            fast_ms, fast_response = timed(lambda: app.json.response(payload), args.repeat)
+        print(f'  encode  stdlib {stdlib_ms:8.1f}ms {len(stdlib_response.get_data()):>10} bytes')
+        print(f'  encode  app    {fast_ms:8.1f}ms {len(fast_response.get_data()):>10} bytes '
+              f'({stdlib_ms / fast_ms:.1f}x)')
+        
+        for label, query in (('full', ''), ('columnar', '?format=columnar'), ('fields', f'?fields={fields}')):
+            for encoding in encodings:
+                request_ms, response = timed(
+                    lambda: client.get(path + query, headers={**headers[role], 'Accept-Encoding': encoding}),
+                    args.repeat
+                )
+                print(f'  {label:8s} {encoding:8s} {request_ms:7.1f}ms {len(response.get_data()):>10} bytes '
+                      f'(Content-Encoding: {response.headers.get("Content-Encoding", "-")})')
+
+
+if __name__ == '__main__':
+    main()
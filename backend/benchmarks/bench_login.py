@@ -0,0 +1,104 @@
+"""
+Login throughput benchmark
+Seeds a scratch SQLite database with users, then fires concurrent logins
+through the Flask test client while a probe thread times a cheap endpoint
+(/api/health), reporting login throughput, login latency, 503 rejections
+and how much the login storm slows unrelated requests.
+
+Usage:
+    python benchmarks/bench_login.py --requests 200 --concurrency 16 --workers 4
+    python benchmarks/bench_login.py --method pbkdf2:sha256:600000 --workers 2 --max-pending 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * fraction) - 1)] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--method', default='scrypt:32768:8:1')
+    parser.add_argument('--workers', type=int, default=4, help='PASSWORD_HASH_WORKERS')
+    parser.add_argument('--max-pending', type=int, default=32, help='PASSWORD_HASH_MAX_PENDING')
+    args = parser.parse_args()
+    
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench-login.db')
+    from app import create_app
+    from app.models import db, User
+    from app.utils.passwords import hash_password
+    
+    app = create_app()
+    app.config.update(
+        PASSWORD_HASH_METHOD=args.method,
+        PASSWORD_HASH_WORKERS=args.workers,
+        PASSWORD_HASH_MAX_PENDING=args.max_pending
+    )
+    
+    with app.app_context():
+        db.create_all()
+        password_hash = hash_password('bench-password')
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'user{i}@bench', 'password_hash': password_hash, 'role': 'admin'}
+            for i in range(args.users)
+        ])
+        db.session.commit()
+    
+    def login(i):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/api/auth/login', json={
+            'email': f'user{i % args.users}@bench', 'password': 'bench-password'
+        })
+        return response.status_code, time.perf_counter() - started
+    
+    probe_latencies = []
+    done = threading.Event()
+    
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/api/health')
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.01)
+    
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(login, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    
+    done.set()
+    probe_thread.join()
+    
+    ok = [latency for status, latency in results if status == 200]
+    rejected = sum(1 for status, _ in results if status == 503)
+    
+    print(f'method={args.method} workers={args.workers} max_pending={args.max_pending} '
+          f'concurrency={args.concurrency} cpus={os.cpu_count()}')
+    print(f'logins:  {len(ok)} ok, {rejected} rejected (503) in {elapsed:.2f}s '
+          f'-> {len(ok) / elapsed:.1f} logins/s')
+    if ok:
+        print(f'latency: p50={statistics.median(ok) * 1000:.0f}ms p95={percentile(ok, 0.95) * 1000:.0f}ms')
+    print(f'health probe under load: p50={statistics.median(probe_latencies) * 1000:.1f}ms '
+          f'p95={percentile(probe_latencies, 0.95) * 1000:.1f}ms ({len(probe_latencies)} samples)')
+
+
+if __name__ == '__main__':
+    main()
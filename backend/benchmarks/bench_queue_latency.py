@@ -0,0 +1,89 @@
+"""
+Queue isolation benchmark
+Measures end-to-end latency of interactive tasks (patient history exports)
+while a bulk export saturates the workers.
+
+Needs Redis and running workers, e.g. (separate terminals):
+    celery -A run.celery worker -Q interactive -c 4 -n interactive@%h
+    celery -A run.celery worker -Q scheduled,bulk -c 4 -n batch@%h
+
+Usage:
+    python benchmarks/bench_queue_latency.py --samples 50
+    python benchmarks/bench_queue_latency.py --samples 50 --shared-queue
+
+--shared-queue sends the bulk shards to the interactive queue, reproducing
+the old single-queue setup for comparison.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run import app, celery  # noqa: E402
+
+
+def saturate(shards, partition_size, shared_queue):
+    """Queue a bulk export large enough to keep the workers busy"""
+    from app.tasks.celery_tasks import export_data_shard
+
+    queue = 'interactive' if shared_queue else 'bulk'
+    return [
+        export_data_shard.apply_async(
+            args=['bench-saturate', 'appointments', 'csv', 'id', i * partition_size, (i + 1) * partition_size, i],
+            queue=queue
+        )
+        for i in range(shards)
+    ]
+
+
+def measure(samples, patient_ids):
+    """Submit interactive exports one at a time and time each round trip"""
+    from app.tasks.celery_tasks import export_patient_history
+
+    latencies = []
+    for i in range(samples):
+        started = time.perf_counter()
+        export_patient_history.delay(patient_ids[i % len(patient_ids)]).get(timeout=600)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--bulk-shards', type=int, default=200)
+    parser.add_argument('--partition-size', type=int, default=50000)
+    parser.add_argument('--shared-queue', action='store_true')
+    args = parser.parse_args()
+
+    from app.models import Patient
+
+    with app.app_context():
+        patient_ids = [patient_id for (patient_id,) in Patient.query.with_entities(Patient.id).limit(100)]
+    if not patient_ids:
+        sys.exit('No patients found - run init_db.py or bench_bulk_export.py first')
+
+    baseline = measure(args.samples, patient_ids)
+
+    bulk = saturate(args.bulk_shards, args.partition_size, args.shared_queue)
+    time.sleep(2)  # let the bulk shards reach the workers
+    loaded = measure(args.samples, patient_ids)
+
+    for result in bulk:
+        result.revoke()
+
+    mode = 'shared queue' if args.shared_queue else 'dedicated queues'
+    for label, latencies in (('idle', baseline), (f'under bulk load ({mode})', loaded)):
+        ordered = sorted(latencies)
+        print(f'{label:40s} p50={statistics.median(ordered) * 1000:8.1f}ms '
+              f'p95={ordered[int(len(ordered) * 0.95) - 1] * 1000:8.1f}ms '
+              f'max={ordered[-1] * 1000:8.1f}ms')
+
+    celery.close()
+
+
+if __name__ == '__main__':
+    main()
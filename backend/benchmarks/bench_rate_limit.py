@@ -0,0 +1,86 @@
+"""
+Rate limiter overhead benchmark
+Times the limiter's per-request work (bucket key, token take) on the
+in-process fallback and, if reachable, on Redis through the Lua script,
+and checks it stays under the per-request budget.
+
+Usage:
+    python benchmarks/bench_rate_limit.py --iterations 20000
+    python benchmarks/bench_rate_limit.py --redis-url redis://localhost:6379/0
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BUDGET_MS = 1.0
+
+
+def measure(app, limiter, iterations, clients):
+    """Per-call latency of the before_request hook for a limited route"""
+    latencies = []
+    for i in range(iterations):
+        with app.test_request_context(
+            '/api/auth/login', method='POST',
+            environ_base={'REMOTE_ADDR': f'10.0.{i % clients // 256}.{i % 256}'}
+        ):
+            started = time.perf_counter()
+            limiter.check_request()
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label, latencies):
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered) * 1000
+    p99 = ordered[int(len(ordered) * 0.99) - 1] * 1000
+    status = 'OK' if p99 < BUDGET_MS else 'OVER BUDGET'
+    print(f'{label:12s} p50={p50:.3f}ms p99={p99:.3f}ms ({len(ordered)} calls) {status}')
+    return p99 < BUDGET_MS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=5000, help='distinct client IPs (buckets)')
+    parser.add_argument('--redis-url', help='also benchmark the Redis Lua path')
+    args = parser.parse_args()
+    
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench-rate-limit.db')
+    if args.redis_url:
+        os.environ['REDIS_URL'] = args.redis_url
+    
+    from app import create_app
+    from app.utils.cache import cache
+    from app.utils.rate_limit import limiter
+    
+    app = create_app()
+    # Generous limit so every call takes the full "allowed" path
+    limiter.limits['auth.login'] = (10 ** 9, 10 ** 6)
+    
+    with app.test_request_context('/api/auth/login', method='POST'):
+        from flask import request
+        assert request.endpoint == 'auth.login'
+    
+    ok = True
+    redis_client = cache.redis_client
+    
+    with app.app_context():
+        if redis_client is not None:
+            ok &= report('redis', measure(app, limiter, args.iterations, args.clients))
+        else:
+            print('redis        skipped (not reachable)')
+        
+        cache.redis_client = None
+        ok &= report('in-process', measure(app, limiter, args.iterations, args.clients))
+        cache.redis_client = redis_client
+    
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Gunicorn worker class throughput benchmark
+Seeds a scratch SQLite database, then for each worker class starts
+`gunicorn -c gunicorn.conf.py wsgi:app` on a local port and drives the hot
+read endpoints from client threads holding keep-alive connections. Reports
+requests per second, latency percentiles and errors per worker class.
+
+Needs gunicorn installed; gevent is skipped when the package is missing.
+The load generator runs on the same machine, so compare classes with each
+other rather than reading the numbers as capacity.
+
+Usage:
+    python benchmarks/bench_serving.py --duration 10 --concurrency 32 --workers 4
+    python benchmarks/bench_serving.py --classes sync gthread --threads 8
+"""
+import argparse
+import http.client
+import importlib.util
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ENDPOINTS = (
+    ('patient', '/api/patient/doctors'),
+    ('patient', '/api/patient/departments'),
+    ('patient', '/api/patient/appointments'),
+    ('doctor', '/api/doctor/appointments'),
+    ('patient', '/api/auth/me')
+)
+
+
+def seed(database_url):
+    """Create the schema and a small hospital, returning access tokens per role"""
+    os.environ['DATABASE_URL'] = database_url
+    from datetime import date, timedelta
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from app.models import db, User, Doctor, Patient, Appointment, Department
+    from app.utils.auth import token_claims
+    
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Department(name=name, icon='+', description=name) for name in ('Cardiology', 'Neurology')])
+        patient_user = User(email='patient@bench', password_hash='x', role='patient')
+        db.session.add(patient_user)
+        db.session.flush()
+        patient = Patient(user_id=patient_user.id, name='Bench Patient', age=40, gender='F',
+                          phone='555', registration_date=date.today())
+        db.session.add(patient)
+        
+        doctors = []
+        for i in range(20):
+            user = User(email=f'doctor{i}@bench', password_hash='x', role='doctor')
+            db.session.add(user)
+            db.session.flush()
+            doctor = Doctor(user_id=user.id, name=f'Doctor {i}', phone='555', specialization='Cardiology',
+                            qualification='MD', experience=10)
+            db.session.add(doctor)
+            db.session.flush()
+            doctors.append((user, doctor))
+        
+        for i in range(50):
+            db.session.add(Appointment(patient_id=patient.id, doctor_id=doctors[i % 20][1].id,
+                                       appointment_date=date.today() + timedelta(days=i),
+                                       appointment_time='10:00 AM', status='scheduled'))
+        db.session.commit()
+        
+        doctor_user, doctor = doctors[0]
+        return {
+            'patient': create_access_token(patient_user.id, additional_claims=token_claims('patient', patient.id)),
+            'doctor': create_access_token(doctor_user.id, additional_claims=token_claims('doctor', doctor.id))
+        }
+
+
+def start_server(worker_class, port, args, env):
+    env = dict(env,
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_BIND=f'127.0.0.1:{port}',
+               GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_THREADS=str(args.threads if worker_class == 'gthread' else 1),
+               GUNICORN_KEEPALIVE=str(args.keepalive),
+               GUNICORN_ACCESS_LOG='')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                connection.close()
+                return process
+        except OSError:
+            time.sleep(0.2)
+    
+    process.kill()
+    raise RuntimeError(f'gunicorn ({worker_class}) did not start')
+
+
+def drive(port, tokens, duration, concurrency):
+    """Hit ENDPOINTS round-robin from concurrency keep-alive clients"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    
+    def client(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, failed, i = [], 0, offset
+        while time.monotonic() < stop_at:
+            role, path = ENDPOINTS[i % len(ENDPOINTS)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Authorization': f'Bearer {tokens[role]}'})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                continue
+            local.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+    
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    return sorted(latencies), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--keepalive', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per worker class')
+    parser.add_argument('--concurrency', type=int, default=16, help='client connections')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+    
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench-serving.db')
+    tokens = seed(database_url)
+    env = dict(os.environ, DATABASE_URL=database_url, RATE_LIMIT_ENABLED='false', TASK_BACKEND='local')
+    
+    print(f'workers={args.workers} threads={args.threads} keepalive={args.keepalive}s '
+          f'clients={args.concurrency} duration={args.duration}s')
+    for worker_class in args.classes:
+        if worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print(f'{worker_class:8s} skipped (gevent not installed)')
+            continue
+        
+        process = start_server(worker_class, args.port, args, env)
+        try:
+            drive(args.port, tokens, 1, args.concurrency)  # warm up
+            latencies, errors = drive(args.port, tokens, args.duration, args.concurrency)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+        
+        if not latencies:
+            print(f'{worker_class:8s} no successful requests ({errors} errors)')
+            continue
+        
+        print(f'{worker_class:8s} {len(latencies) / args.duration:8.1f} req/s '
+              f'p50={statistics.median(latencies) * 1000:.2f}ms '
+              f'p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms '
+              f'errors={errors}')
+
+
+if __name__ == '__main__':
+    main()
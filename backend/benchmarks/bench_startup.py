@@ -0,0 +1,105 @@
+"""
+Application startup benchmark and budget check
+Boots the app in fresh interpreters, as a restarted worker would, and
+reports per run:
+  - import: `import app` (models, extensions, blueprints' modules)
+  - create: create_app() on top of that
+Every run points DATABASE_URL at a database file that does not exist and
+REDIS_URL at an unroutable address, and checks that startup has no side
+effects: no database file appears, nothing waits on Redis, and Celery is
+not built.
+
+Exits non-zero when a check fails or the median import + create time is
+over --budget-ms, so CI can run it as a gate.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --budget-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line
+CHILD = '''
+import json, os, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app_instance = app.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'celery_built': 'celery' in app_instance.extensions or 'celery.app.base' in sys.modules,
+    'database_created': os.path.exists(os.environ['STARTUP_DATABASE_FILE'])
+}))
+'''
+
+# TEST-NET-1: packets go nowhere, so a connect attempt would hang until timeout
+UNREACHABLE_REDIS = 'redis://192.0.2.1:6379/0'
+
+
+def boot(database_file, timeout):
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + database_file,
+               STARTUP_DATABASE_FILE=database_file,
+               REDIS_URL=UNREACHABLE_REDIS,
+               REVOCATION_REDIS_URL=UNREACHABLE_REDIS,
+               TASK_BACKEND='celery',
+               CELERY_BROKER_URL=UNREACHABLE_REDIS,
+               CELERY_RESULT_BACKEND=UNREACHABLE_REDIS)
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=timeout, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1000, help='median import + create_app budget')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds before a boot counts as hung')
+    args = parser.parse_args()
+    
+    failures = []
+    runs = []
+    for n in range(args.runs):
+        database_file = os.path.join(tempfile.mkdtemp(), 'startup.db')
+        try:
+            run = boot(database_file, args.timeout)
+        except subprocess.TimeoutExpired:
+            failures.append(f'run {n + 1}: no app after {args.timeout}s (blocking on Redis?)')
+            continue
+        except subprocess.CalledProcessError as e:
+            failures.append(f'run {n + 1}: startup failed\n{e.stderr}')
+            continue
+        
+        runs.append(run)
+        print(f'run {n + 1:2d}  import {run["import_ms"]:7.1f}ms  create_app {run["create_ms"]:6.1f}ms')
+        if run['database_created']:
+            failures.append(f'run {n + 1}: startup created the database file')
+        if run['celery_built']:
+            failures.append(f'run {n + 1}: startup built the Celery app')
+    
+    if runs:
+        totals = [run['import_ms'] + run['create_ms'] for run in runs]
+        median = statistics.median(totals)
+        print(f'median import {statistics.median(r["import_ms"] for r in runs):.1f}ms, '
+              f'create_app {statistics.median(r["create_ms"] for r in runs):.1f}ms, '
+              f'total {median:.1f}ms (budget {args.budget_ms:.0f}ms, max {max(totals):.1f}ms)')
+        if median > args.budget_ms:
+            failures.append(f'median startup {median:.1f}ms is over the {args.budget_ms:.0f}ms budget')
+    
+    for failure in failures:
+        print(f'FAIL {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -24,13 +24,134 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
-    # Redis
+    # Token revocation (per-process Bloom filter in front of the Redis blocklist)
+    JWT_REVOCATION_BLOOM_CAPACITY = int(os.environ.get('JWT_REVOCATION_BLOOM_CAPACITY', 100000))
+    JWT_REVOCATION_BLOOM_ERROR_RATE = float(os.environ.get('JWT_REVOCATION_BLOOM_ERROR_RATE', 0.001))
+    JWT_REVOCATION_RESYNC_SECONDS = int(os.environ.get('JWT_REVOCATION_RESYNC_SECONDS', 3600))
+    # Own database: the cache one is flushed and evicted, which would un-revoke tokens
+    REVOCATION_REDIS_URL = os.environ.get('REVOCATION_REDIS_URL') or 'redis://localhost:6379/3'
+    
+    # Rate limiting: token buckets per endpoint ('auth.login') or blueprint ('auth') as
+    # '<count>/<second|minute|hour|day>'; endpoint entries override their blueprint's.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    RATE_LIMITS = {
+        'auth.login': os.environ.get('RATE_LIMIT_LOGIN', '10/minute'),
+        'auth.register': os.environ.get('RATE_LIMIT_REGISTER', '5/hour'),
+        'patient.book_appointment': os.environ.get('RATE_LIMIT_BOOKING', '20/minute')
+    }
+    
+    # Reverse proxies in front of the app: how many of them append to X-Forwarded-For /
+    # X-Forwarded-Proto. Only those hops are trusted, so rate limits key on the real client
+    # IP and external URLs use the client's scheme. 0 = no proxy, use the socket address.
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    PROXY_FIX_X_PROTO = int(os.environ.get('PROXY_FIX_X_PROTO', 0))
+    
+    # Response compression: gzip, or brotli when installed and accepted by the client.
+    # Bodies smaller than COMPRESS_MIN_SIZE bytes are sent as-is.
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'True').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))  # 1-9
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))  # 0-11
+    COMPRESS_MIMETYPES = ['application/json', 'text/csv', 'text/plain']
+    
+    # Batch endpoint: sub-requests per batch, and threads for parallel read-only batches
+    BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+    
+    # ASGI serving (asgi:app): hot read routes run on an async engine, the rest through
+    # Flask on ASYNC_WSGI_THREADS threads. ASYNC_DATABASE_URL defaults to DATABASE_URL
+    # with its async driver (aiosqlite, asyncpg or aiomysql).
+    ASYNC_ROUTES_ENABLED = os.environ.get('ASYNC_ROUTES_ENABLED', 'True').lower() == 'true'
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+    ASYNC_WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 8))
+    
+    # Request timing: Server-Timing header (auth, db, cache, json, compress, total) and a JSON
+    # log record with query count and slowest statement for requests over SLOW_REQUEST_MS (0: off)
+    REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING_ENABLED', 'True').lower() == 'true'
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'True').lower() == 'true'
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))
+    
+    # Request profiling: PROFILE_SAMPLE_RATES lists '<endpoint or blueprint>=<percent>' entries
+    # ('doctor.get_doctor_appointments=5,patient=1'); admins can also profile one request by
+    # sending PROFILE_HEADER. PROFILE_MODE is 'sampler' (collapsed stacks) or 'cprofile' (pstats).
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+    PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sampler')
+    PROFILE_SAMPLE_RATES = os.environ.get('PROFILE_SAMPLE_RATES', '')
+    PROFILE_HEADER = os.environ.get('PROFILE_HEADER', 'X-Profile')
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(basedir, 'profiles')
+    
+    # Password hashing: scrypt:<n>:<r>:<p>, pbkdf2:sha256:<iterations> or argon2 (needs argon2-cffi).
+    # Hashes made with other parameters are upgraded on the next successful login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))  # concurrent hashes per process
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))  # beyond this logins get 503
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # seconds
+    
+    # Redis (cache, broker and results use separate databases so each can be
+    # sized, flushed and evicted independently)
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 1))  # seconds; Redis is connected on first use
+    REDIS_RETRY_SECONDS = int(os.environ.get('REDIS_RETRY_SECONDS', 30))  # while unreachable, caching is off this long
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
+    PROFILE_CACHE_TIMEOUT = int(os.environ.get('PROFILE_CACHE_TIMEOUT', 3600))  # /me and login profile, invalidated on update
     
     # Celery
-    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
-    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/1'
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/2'
+    CELERY_RESULT_EXPIRES = int(os.environ.get('CELERY_RESULT_EXPIRES', 86400))  # seconds
+    TASK_RESULT_MAX_BYTES = int(os.environ.get('TASK_RESULT_MAX_BYTES', 65536))  # larger results spill to storage
+    JANITOR_INTERVAL_MINUTES = int(os.environ.get('JANITOR_INTERVAL_MINUTES', 60))
+    CELERY_ACKS_LATE = os.environ.get('CELERY_ACKS_LATE', 'True').lower() == 'true'
+    CELERY_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_PREFETCH_MULTIPLIER', 1))
+    # (soft, hard) time limits in seconds per queue
+    CELERY_TIME_LIMITS = {
+        'interactive': (120, 150),
+        'scheduled': (900, 960),
+        'bulk': (3600, 3900)
+    }
+    
+    # Task backend: 'celery' (broker + workers) or 'local' (in-process thread pool, no broker)
+    TASK_BACKEND = os.environ.get('TASK_BACKEND', 'celery')
+    TASK_LOCAL_CONCURRENCY = int(os.environ.get('TASK_LOCAL_CONCURRENCY', 2))
+    TASK_LOCAL_RESULT_BACKEND = os.environ.get('TASK_LOCAL_RESULT_BACKEND') or \
+        'db+sqlite:///' + os.path.join(basedir, 'task-results.db')
+    
+    # Notifications: 'log', 'webhook' or a dotted path to a Notifier class
+    NOTIFIER = os.environ.get('NOTIFIER', 'log')
+    NOTIFIER_WEBHOOK_URL = os.environ.get('NOTIFIER_WEBHOOK_URL')
+    
+    # Reminders
+    REMINDER_HOURS_BEFORE = int(os.environ.get('REMINDER_HOURS_BEFORE', 0))  # 0 = single daily sweep at 9 AM
+    REMINDER_SCAN_MINUTES = int(os.environ.get('REMINDER_SCAN_MINUTES', 15))
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 100))
+    REMINDER_RATE_LIMIT = os.environ.get('REMINDER_RATE_LIMIT', '30/m')  # batches per worker
+    # Claims older than this are treated as lost and rescanned; keep it above the ~16 min retry backoff
+    REMINDER_CLAIM_TIMEOUT_MINUTES = int(os.environ.get('REMINDER_CLAIM_TIMEOUT_MINUTES', 60))
+    
+    # Export storage
+    EXPORT_STORAGE_DIR = os.environ.get('EXPORT_STORAGE_DIR') or os.path.join(basedir, 'exports')
+    EXPORT_URL_EXPIRES = int(os.environ.get('EXPORT_URL_EXPIRES', 3600))  # seconds a download link stays valid
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+    EXPORT_CACHE_TIMEOUT = int(os.environ.get('EXPORT_CACHE_TIMEOUT', 86400))  # how long an export is reused for unchanged data
+    EXPORT_PENDING_TIMEOUT = int(os.environ.get('EXPORT_PENDING_TIMEOUT', 600))  # a queued export still pending after this is presumed lost
+    EXPORT_RETENTION_HOURS = int(os.environ.get('EXPORT_RETENTION_HOURS', 48))  # janitor deletes older files
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true'
+    
+    # Task progress streaming (Server-Sent Events)
+    SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', 300))
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_TICKET_EXPIRES = int(os.environ.get('SSE_TICKET_EXPIRES', 60))  # seconds a stream ticket can be redeemed in
+    
+    # Reports
+    MONTHLY_REPORT_CHUNK_SIZE = int(os.environ.get('MONTHLY_REPORT_CHUNK_SIZE', 50))
+    
+    # Waitlist
+    WAITLIST_HOLD_MINUTES = int(os.environ.get('WAITLIST_HOLD_MINUTES', 30))
+    
+    # Calendar feeds
+    APPOINTMENT_DURATION_MINUTES = int(os.environ.get('APPOINTMENT_DURATION_MINUTES', 30))
+    CALENDAR_FEED_CACHE_TIMEOUT = int(os.environ.get('CALENDAR_FEED_CACHE_TIMEOUT', 86400))
     
     # CORS
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
@@ -44,6 +165,8 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
+    # Per-phase timings and query counts tell any client about the backend; opt in
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'False').lower() == 'true'
 
 
 config = {
@@ -0,0 +1,72 @@
+"""
+Gunicorn configuration for serving the API in production
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden from the environment:
+    GUNICORN_BIND                address to listen on (0.0.0.0:5000)
+    GUNICORN_WORKER_CLASS        sync, gthread or gevent (gthread)
+    GUNICORN_WORKERS             worker processes (2 x CPUs + 1)
+    GUNICORN_THREADS             threads per gthread worker (4 + GUNICORN_SSE_STREAMS)
+    GUNICORN_SSE_STREAMS         event streams a gthread worker should hold open at once (8)
+    GUNICORN_WORKER_CONNECTIONS  concurrent clients per gevent worker (1000)
+    GUNICORN_KEEPALIVE           seconds an idle keep-alive connection is held (5)
+    GUNICORN_TIMEOUT             seconds before a silent worker is restarted (60)
+    GUNICORN_MAX_REQUESTS        requests before a worker is recycled, 0 = never (0)
+    GUNICORN_PRELOAD             build the app once in the master (true)
+    GUNICORN_ACCESS_LOG          access log file, '-' for stdout, empty to disable (-)
+
+Worker classes:
+    sync     one request per process, no keep-alive. Fine behind a buffering
+             proxy for short requests, but an SSE client holds a whole worker.
+    gthread  a thread pool per process. Idle keep-alive connections wait on
+             a selector instead of a thread, so this is the default. An SSE
+             stream still holds a thread for as long as it is open (up to
+             SSE_MAX_SECONDS), so threads are sized for GUNICORN_SSE_STREAMS
+             streams on top of the request threads.
+    gevent   greenlets (needs the gevent package). Most connections per
+             process, for many long-lived streams. The standard library is
+             monkey-patched below, before the app is imported.
+"""
+import multiprocessing
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    # Must run before the preloaded app imports socket/threading users
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Gunicorn turns a sync worker with more than one thread into gthread
+sse_streams = int(os.environ.get('GUNICORN_SSE_STREAMS', 8))
+threads = int(os.environ.get('GUNICORN_THREADS', 4 + sse_streams if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Keep-alive should outlast the client's pause between dashboard calls but
+# stay below the idle timeout of any load balancer in front (often 60s)
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+
+# Recycling bounds slow leaks; jitter keeps workers from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Build the app once in the master so workers start fast and share its
+# memory copy-on-write; post_fork below gives each one its own connections
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    
+    from wsgi import app
+    from app.utils.forking import reset_after_fork
+    reset_after_fork(app)
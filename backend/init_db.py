@@ -4,7 +4,7 @@ Creates tables and seeds initial data including admin user
 """
 from app import create_app
 from app.models import db, User, Doctor, Patient, Department
-from app.utils.auth import hash_password
+from app.utils.passwords import hash_password
 from datetime import datetime
 
 app = create_app()
@@ -3,10 +3,17 @@ Application entry point
 """
 import os
 from app import create_app
-from app.tasks.celery_config import make_celery
+from app.tasks.backend import get_celery
 
 app = create_app()
-celery = make_celery(app)
+
+
+def __getattr__(name):
+    # run.celery for `celery -A run.celery`, built only when asked for
+    if name == 'celery':
+        return get_celery(app)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
     # Only enable debug mode in development
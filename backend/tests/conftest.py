@@ -0,0 +1,61 @@
+"""
+Shared fixtures: an app on a throwaway SQLite database with seeded users
+"""
+import os
+import tempfile
+from datetime import date
+import pytest
+
+# Config reads the environment at import, so set it before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ['REQUEST_TIMING_ENABLED'] = 'false'
+os.environ['TASK_BACKEND'] = 'local'
+
+from app import create_app
+from app.models import db, User, Doctor, Patient
+from app.utils.passwords import hash_password
+
+PASSWORD = 'password'
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        
+        doctor_user = User(email='doctor@test', password_hash=hash_password(PASSWORD), role='doctor')
+        patient_users = [
+            User(email=f'patient{n}@test', password_hash=hash_password(PASSWORD), role='patient')
+            for n in (1, 2)
+        ]
+        db.session.add_all([doctor_user, *patient_users])
+        db.session.flush()
+        
+        db.session.add(Doctor(user_id=doctor_user.id, name='Dr Test', phone='1', specialization='Cardiology',
+                              qualification='MD', experience=5))
+        for n, user in enumerate(patient_users, start=1):
+            db.session.add(Patient(user_id=user.id, name=f'Patient {n}', age=30, gender='F', phone='1',
+                                   registration_date=date.today()))
+        db.session.commit()
+        
+        yield app
+        
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Return Authorization headers for a seeded user's email"""
+    def login(email):
+        response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+    return login
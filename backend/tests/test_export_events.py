@@ -0,0 +1,43 @@
+"""
+Export event stream access
+"""
+import uuid
+import pytest
+
+
+@pytest.fixture
+def task_id(app):
+    # Streams end at once; an unknown task is simply pending
+    app.config['SSE_MAX_SECONDS'] = 0
+    return str(uuid.uuid4())
+
+
+def _events(client, task_id, **params):
+    return client.get(f'/api/tasks/export-history/{task_id}/events', query_string=params)
+
+
+def test_stream_opens_with_a_ticket(client, login, task_id):
+    response = client.post(f'/api/tasks/export-history/{task_id}/events-ticket', headers=login('patient1@test'))
+    assert response.status_code == 200
+    
+    response = _events(client, task_id, ticket=response.get_json()['ticket'])
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+
+def test_stream_refuses_the_access_token(client, login, task_id):
+    token = login('patient1@test')['Authorization'].split()[1]
+    
+    assert _events(client, task_id, jwt=token).status_code == 401
+    assert _events(client, task_id, ticket=token).status_code == 401
+
+
+def test_ticket_only_opens_its_own_task(client, login, task_id):
+    headers = login('patient1@test')
+    ticket = client.post(f'/api/tasks/export-history/{task_id}/events-ticket', headers=headers).get_json()['ticket']
+    
+    assert _events(client, str(uuid.uuid4()), ticket=ticket).status_code == 401
+
+
+def test_ticket_requires_a_patient(client, task_id):
+    assert client.post(f'/api/tasks/export-history/{task_id}/events-ticket').status_code == 401
@@ -0,0 +1,56 @@
+"""
+Reminder claiming and delivery
+"""
+from datetime import date, datetime, timedelta
+import pytest
+from app.models import db, Appointment
+from app.tasks import celery_tasks
+from app.tasks.celery_tasks import claim_reminders, deliver_reminder_batch
+
+
+@pytest.fixture
+def appointment(app):
+    appointment = Appointment(patient_id=1, doctor_id=1, appointment_date=date.today() + timedelta(days=1),
+                              appointment_time='09:00 AM', status='scheduled')
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+
+def _reminder(appointment):
+    return {
+        'appointment_id': appointment.id,
+        'appointment_date': appointment.appointment_date.isoformat(),
+        'appointment_time': appointment.appointment_time,
+        'patient_name': 'Patient 1',
+        'patient_email': 'patient1@test',
+        'doctor_name': 'Dr Test'
+    }
+
+
+def test_unexpected_delivery_error_releases_the_claim(appointment, monkeypatch):
+    class BrokenNotifier:
+        def send(self, *args):
+            raise RuntimeError('template error')
+    
+    monkeypatch.setattr(celery_tasks, 'get_notifier', BrokenNotifier)
+    assert claim_reminders([appointment.id]) == {appointment.id}
+    
+    result = deliver_reminder_batch.apply(args=[[_reminder(appointment)]]).result
+    
+    assert result['errors'] == 1
+    db.session.refresh(appointment)
+    assert appointment.reminder_queued_at is None
+    assert claim_reminders([appointment.id]) == {appointment.id}
+
+
+def test_stale_claim_is_claimed_again(app, appointment):
+    assert claim_reminders([appointment.id]) == {appointment.id}
+    assert claim_reminders([appointment.id]) == set()
+    
+    # The batch for the first claim never ran
+    timeout = app.config['REMINDER_CLAIM_TIMEOUT_MINUTES']
+    appointment.reminder_queued_at = datetime.utcnow() - timedelta(minutes=timeout + 1)
+    db.session.commit()
+    
+    assert claim_reminders([appointment.id]) == {appointment.id}
@@ -0,0 +1,48 @@
+"""
+Startup budget and side-effect checks
+
+Boots the app in fresh interpreters as benchmarks/bench_startup.py does,
+with the database file missing and every Redis URL unroutable.
+STARTUP_BUDGET_MS overrides the median budget on slow CI machines.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from bench_startup import boot
+
+RUNS = 3
+BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 1000))
+# A boot blocked on Redis runs into its connect timeouts long before this
+TIMEOUT_SECONDS = 30
+
+
+@pytest.fixture(scope='module')
+def runs():
+    results = []
+    for _ in range(RUNS):
+        database_file = os.path.join(tempfile.mkdtemp(), 'startup.db')
+        try:
+            results.append(boot(database_file, TIMEOUT_SECONDS))
+        except subprocess.TimeoutExpired:
+            pytest.fail(f'no app after {TIMEOUT_SECONDS}s (blocking on Redis?)')
+        except subprocess.CalledProcessError as e:
+            pytest.fail(f'startup failed\n{e.stderr}')
+    return results
+
+
+def test_startup_within_budget(runs):
+    median = statistics.median(run['import_ms'] + run['create_ms'] for run in runs)
+    assert median <= BUDGET_MS, f'median startup {median:.1f}ms is over the {BUDGET_MS:.0f}ms budget'
+
+
+def test_startup_creates_no_database(runs):
+    assert not any(run['database_created'] for run in runs)
+
+
+def test_startup_does_not_build_celery(runs):
+    assert not any(run['celery_built'] for run in runs)
@@ -0,0 +1,81 @@
+"""
+Waitlist joins and slot offers
+"""
+from datetime import date, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.models import db, WaitlistEntry
+from app.utils import waitlist
+from app.utils.waitlist import offer_slot
+
+
+def _join(client, headers, **body):
+    return client.post('/api/patient/waitlist', headers=headers, json=body)
+
+
+def test_patient_joins_a_doctor_waitlist_once(client, login):
+    headers = login('patient1@test')
+    
+    assert _join(client, headers, doctor_id=1).status_code == 201
+    assert _join(client, headers, doctor_id=1).status_code == 409
+    # A separate department-wide entry is still allowed, once
+    assert _join(client, headers, department='Cardiology').status_code == 201
+    assert _join(client, headers, department='Cardiology').status_code == 409
+    
+    assert WaitlistEntry.query.filter_by(patient_id=1).count() == 2
+
+
+def test_patient_can_rejoin_after_leaving(client, login):
+    headers = login('patient1@test')
+    entry_id = _join(client, headers, doctor_id=1).get_json()['waitlist_entry']['id']
+    
+    assert client.delete(f'/api/patient/waitlist/{entry_id}', headers=headers).status_code == 200
+    assert _join(client, headers, doctor_id=1).status_code == 201
+
+
+def test_unique_index_rejects_concurrent_duplicate(app):
+    # What a join racing past the route's check would insert
+    db.session.add(WaitlistEntry(patient_id=1, doctor_id=1, department='Cardiology', status='waiting'))
+    db.session.commit()
+    
+    db.session.add(WaitlistEntry(patient_id=1, doctor_id=1, department='Cardiology', status='waiting'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_each_freed_slot_goes_to_a_different_patient(client, login):
+    _join(client, login('patient1@test'), doctor_id=1)
+    _join(client, login('patient2@test'), doctor_id=1)
+    day = date.today() + timedelta(days=2)
+    
+    first = offer_slot(1, day, '09:00 AM')
+    second = offer_slot(1, day, '10:00 AM')
+    third = offer_slot(1, day, '11:00 AM')
+    
+    assert {first.patient_id, second.patient_id} == {1, 2}
+    assert third is None
+
+
+def test_concurrent_offer_skips_an_entry_claimed_meanwhile(app, client, login, monkeypatch):
+    _join(client, login('patient1@test'), doctor_id=1)
+    _join(client, login('patient2@test'), doctor_id=1)
+    day = date.today() + timedelta(days=2)
+    first = offer_slot(1, day, '09:00 AM')
+    
+    # A concurrent task read the queue before the first offer committed, so
+    # it sees the already-offered entry as the head of the queue once
+    find_next_entry = waitlist.find_next_entry
+    stale = [db.session.get(WaitlistEntry, first.id)]
+    monkeypatch.setattr(waitlist, 'find_next_entry',
+                        lambda *args: stale.pop() if stale else find_next_entry(*args))
+    
+    second = offer_slot(1, day, '10:00 AM')
+    
+    assert second is not None and second.patient_id != first.patient_id
+    assert db.session.get(WaitlistEntry, first.id).offered_time == '09:00 AM'
+    
+    # And a slot held by one offer is never held for a second patient
+    db.session.add(WaitlistEntry(patient_id=1, department='Cardiology', status='waiting'))
+    db.session.commit()
+    assert offer_slot(1, day, '10:00 AM') is None
@@ -170,6 +170,15 @@ export default {
     },
     getExportStatus(taskId) {
       return apiClient.get(`/tasks/export-history/${taskId}`)
+    },
+    // Server-Sent Events stream of export status changes ('status' events).
+    // EventSource cannot send the Authorization header, so a single-use
+    // ticket is fetched first; call again to reconnect after the stream ends.
+    async watchExportStatus(taskId) {
+      const { data } = await apiClient.post(`/tasks/export-history/${taskId}/events-ticket`)
+      return new EventSource(
+        `${API_BASE_URL}/tasks/export-history/${taskId}/events?ticket=${encodeURIComponent(data.ticket)}`
+      )
     }
   }
 }